@@ -0,0 +1,204 @@
+"""
+Arbiter sharing one instrument among threads testing different DUTs,
+e.g. one 34972A and one supply wired to two fixture sockets.
+Every driver call is atomic, transaction() makes a sequence of calls
+atomic (close relay, read, open relay). The lock is reentrant and fair:
+waiting threads get the instrument in order of arrival, so one socket
+can not starve the other.
+Use: dmm = arbiter.Arbiter(cdaq34972.Daq34972(rm, '34972A'))
+     with dmm.transaction():
+         dmm.controlSwitch(101, True)
+         volt = dmm.read()
+         dmm.controlSwitch(101, False)
+arbiter.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'arbiter.py (C) J.M.,rev.18-Oct-26'
+
+import sys, threading
+import clock
+
+class FairLock:
+    """
+    Reentrant lock granted in order of arrival (ticket lock)
+    """
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.nextTicket = 0     #ticket of the next thread arriving
+        self.serving = 0        #ticket allowed to own the lock
+        self.owner = None       #owning thread
+        self.depth = 0          #nested acquisitions of the owner
+        self.abandoned = set()  #tickets of waits interrupted
+
+    def acquire(self):
+        """
+        Waits until all threads arrived before released the lock.
+        A wait interrupted by an exception gives its ticket up.
+        Return: True if acquired, False if only nested deeper
+        """
+        me = threading.current_thread()
+        with self.cond:
+            if self.owner is me:
+                self.depth += 1
+                return False
+            ticket = self.nextTicket
+            self.nextTicket += 1
+            try:
+                while self.serving != ticket:
+                    self.cond.wait()
+            except BaseException:
+                if self.serving == ticket:      #turn came, hand it over
+                    self.advance()
+                else:
+                    self.abandoned.add(ticket)  #skipped when served
+                raise
+            self.owner = me
+            self.depth = 1
+            return True
+
+    def advance(self):
+        """
+        Serves the next ticket not abandoned, called with cond locked
+        Return: none
+        """
+        self.serving += 1
+        while self.serving in self.abandoned:
+            self.abandoned.discard(self.serving)
+            self.serving += 1
+        self.cond.notify_all()
+
+    def release(self):
+        """
+        Releases one level, passes the lock to the next ticket at the last
+        """
+        with self.cond:
+            if self.owner is not threading.current_thread():
+                print('FairLock.release() by a thread not owning it !')
+                raise RuntimeError('FairLock not owned')
+            self.depth -= 1
+            if self.depth == 0:
+                self.owner = None
+                self.advance()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
+        return False
+
+class Arbiter:
+    """
+    Wraps a driver instance, its methods are called under a FairLock.
+    Other attributes are passed through.
+    """
+    def __init__(self, driver):
+        """
+        Input:  driver - driver class instance, e.g. Daq34972, SrcHameg
+        """
+        self.__dict__['driver'] = driver
+        self.__dict__['lock'] = FairLock()
+        self.__dict__['waitTime'] = 0.  #total time spent waiting for lock
+        self.__dict__['grants'] = 0     #number of lock acquisitions,
+                                        #nested transactions not counted
+
+    def __getattr__(self, name):
+        attr = getattr(self.driver, name)
+        if not callable(attr):
+            return attr
+        def call(*args, **kwargs):
+            with self.transaction():
+                return attr(*args, **kwargs)
+        call.__name__ = name
+        return call
+
+    def __setattr__(self, name, value):
+        with self.transaction():
+            setattr(self.driver, name, value)
+
+    def transaction(self):
+        """
+        Context manager holding the instrument for a sequence of calls
+        Return: the arbiter locked until the with block exits
+        """
+        return Transaction(self)
+
+class Transaction:
+    """
+    Context of Arbiter.transaction(), accounts time spent waiting
+    """
+    def __init__(self, arbiter):
+        self.arbiter = arbiter
+
+    def __enter__(self):
+        startTime = clock.time()
+        if self.arbiter.lock.acquire():
+            self.arbiter.__dict__['grants'] += 1
+        self.arbiter.__dict__['waitTime'] += clock.time() - startTime
+        return self.arbiter
+
+    def __exit__(self, excType, excValue, traceback):
+        self.arbiter.lock.release()
+        return False
+
+
+# Self test - two sockets read their channels on a shared DAQ
+# ===========================================================
+if __name__ == '__main__':
+    import visasim, cdaq34972
+    print(copyr)
+    sim = visasim.ResourceManager(verbose = False)
+    dmm = Arbiter(cdaq34972.Daq34972(sim, '34972A'))
+    dmm.open()
+    dmm.configScan('101,102', 'VOLT:DC', 10, 1)
+    sim.devices['34972A'].setSignal(101, 1.)
+    sim.devices['34972A'].setSignal(102, 2.)
+    wrong = []
+
+    def socket(switch, expected):
+        for i in range(20):
+            with dmm.transaction():
+                dmm.controlSwitch(switch, True)
+                volt = dmm.read()
+                dmm.controlSwitch(switch, False)
+            if volt != expected:
+                wrong.append((switch, volt))
+
+    threads = [threading.Thread(target = socket, args = (101, 1.)),
+               threading.Thread(target = socket, args = (102, 2.))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dmm.close()
+    print('%d grants, %.3f s waiting' % (dmm.grants, dmm.waitTime))
+    lock = FairLock()                   #interrupted wait gives ticket up
+    wait = lock.cond.wait
+    def interruptible(timeout = None):
+        if threading.current_thread().name == 'interrupted':
+            raise KeyboardInterrupt
+        return wait(timeout)
+    lock.cond.wait = interruptible
+    acquired = []
+    def waiter():
+        try:
+            with lock:
+                acquired.append(threading.current_thread().name)
+        except KeyboardInterrupt:
+            pass
+    lock.acquire()
+    threads = [threading.Thread(target = waiter, name = 'interrupted'),
+               threading.Thread(target = waiter, name = 'next')]
+    for thread in threads:
+        thread.start()
+        clock.sleep(.05)                #tickets taken in this order
+    lock.release()
+    threads[1].join(2.)
+    if threads[1].is_alive() or acquired != ['next']:
+        wrong.append(('FairLock', acquired))
+    if wrong:
+        print(wrong)
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
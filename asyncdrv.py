@@ -0,0 +1,91 @@
+"""
+Asyncio counterparts of driver methods. Each instrument gets its own
+single-thread executor, which is its serialized command queue: calls
+to one instrument execute in order, calls to different instruments run
+concurrently, the event loop is never blocked by VISA I/O.
+Use: dmm = asyncdrv.AsyncInstrument(cdaq34972.Daq34972(rm, '34972A'))
+     src = asyncdrv.AsyncInstrument(csrc2722.Src2722(rm, 'U2722A'))
+     await asyncio.gather(src.configVoltSrc(1, 5., .1),
+                          dmm.configScan('101', 'VOLT:DC', 10, 1))
+     volt = await dmm.readSwitch(101)
+asyncdrv.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'asyncdrv.py (C) J.M.,rev.18-Oct-26'
+
+import sys, asyncio, functools
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncInstrument:
+    """
+    Wraps a driver instance, its methods return coroutines executed in
+    the instrument queue. Other attributes are passed through.
+    """
+    def __init__(self, driver, name = None):
+        """
+        Input:  driver - driver class instance, e.g. Daq34972
+                name - queue thread name, default driver visaName
+        """
+        if name == None:
+            name = getattr(driver, 'visaName', type(driver).__name__)
+        self.driver = driver
+        self.name = name
+        self.queue = ThreadPoolExecutor(max_workers = 1,
+                                        thread_name_prefix = name)
+
+    def __getattr__(self, name):
+        attr = getattr(self.driver, name)
+        if not callable(attr):
+            return attr
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.queue,
+                                    functools.partial(attr, *args, **kwargs))
+        call.__name__ = name
+        return call
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs any blocking function in the instrument queue, e.g. several
+        driver calls which must not be interleaved with other callers
+        Input:  function - called with args and kwargs
+        Returns: function result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.queue,
+                                functools.partial(function, *args, **kwargs))
+
+    def shutdown(self, wait = True):
+        """
+        Stops the queue thread, the driver is not closed
+        Input:  wait - wait for queued calls to finish
+        """
+        self.queue.shutdown(wait = wait)
+
+
+# Self test - configures simulated supply and DAQ concurrently
+# ============================================================
+if __name__ == '__main__':
+    import visasim, cdaq34972, csrc2722
+    print(copyr)
+    sim = visasim.ResourceManager(verbose = False)
+    dmm = AsyncInstrument(cdaq34972.Daq34972(sim, '34972A'))
+    src = AsyncInstrument(csrc2722.Src2722(sim, 'U2722A'))
+
+    async def test():
+        await asyncio.gather(dmm.open(), src.open())
+        sim.devices['34972A'].setSignal(101, 4.98)
+        await asyncio.gather(src.configVoltSrc(1, 5., .1),
+                             dmm.configScan('101', 'VOLT:DC', 10, 1))
+        volts = await asyncio.gather(*[dmm.readSwitch(101) for i in range(3)])
+        await asyncio.gather(dmm.close(), src.close())
+        return volts
+
+    volts = asyncio.run(test())
+    dmm.shutdown()
+    src.shutdown()
+    print(volts)
+    if volts != [4.98] * 3:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,92 @@
+"""
+Registry of instrument back-ends loaded on first use. Driver modules
+do not import the vendor VISA stack, a back-end is imported only when
+its resource manager is requested, so log analysis and dry runs start
+instantly without VISA installed.
+Back-end selected by name, default from VISA_BACKEND environment
+variable or 'visa':
+    visa    - vendor VISA library
+    sim     - visasim emulators
+    replay  - visarec replay of a recorded log
+    record  - visarec recording of the vendor VISA traffic
+    socket  - scpisock raw SCPI over TCP for LAN instruments
+Use: rm = backend.resourceManager()        #or resourceManager('sim')
+     dvm = cdaq34972.Daq34972(rm, '34972A')
+backend.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'backend.py (C) J.M.,rev.18-Oct-26'
+
+import os, sys, importlib
+
+# {back-end name : (module name, keyword arguments of ResourceManager)}
+backends = {'visa' : ('visa', {}),
+            'sim' : ('visasim', {}),
+            'replay' : ('visarec', {'recMode' : 'replay'}),
+            'record' : ('visarec', {'recMode' : 'record'}),
+            'socket' : ('scpisock', {})}
+default = os.environ.get('VISA_BACKEND', 'visa')
+
+def register(name, moduleName, **kwargs):
+    """
+    Adds or replaces a back-end
+    Input:  name - back-end name
+            moduleName - module providing ResourceManager class
+            kwargs - passed to ResourceManager()
+    Return: none
+    """
+    backends[name] = (moduleName, kwargs)
+
+def setDefault(name):
+    """
+    Selects back-end used by resourceManager() without a name
+    """
+    global default
+    if name not in backends:
+        print('backend.setDefault() unknown back-end ' + name + ' !')
+        raise KeyError(name)
+    default = name
+
+def load(name = None):
+    """
+    Imports back-end module
+    Input:  name - back-end name, None default
+    Returns: module
+    """
+    if name == None:
+        name = default
+    if name not in backends:
+        print('backend.load() unknown back-end ' + name + ' !')
+        raise KeyError(name)
+    try:
+        return importlib.import_module(backends[name][0])
+    except ImportError:
+        print('backend.load() ' + backends[name][0] + ' not installed !')
+        raise
+
+def resourceManager(name = None):
+    """
+    Creates resource manager of a back-end, imported at first use
+    Input:  name - back-end name, None default
+    Returns: ResourceManager instance
+    """
+    if name == None:
+        name = default
+    module = load(name)
+    return module.ResourceManager(**backends[name][1])
+
+
+# Self test - no back-end imported until requested
+# ================================================
+if __name__ == '__main__':
+    print(copyr)
+    import cdaq34972, csrc2722, error
+    if 'visa' in sys.modules or 'visasim' in sys.modules:
+        print('Done with error - back-end imported by drivers !')
+        sys.exit(2)
+    rm = resourceManager('sim')
+    dvm = cdaq34972.Daq34972(rm, '34972A')
+    dvm.open()
+    print(dvm.read())
+    dvm.close()
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,204 @@
+"""
+Batching of commands and queries to one bus transaction. Writes and
+queries collected in a with block are sent as one message when the
+block ends, SCPI commands joined by ';:' and their responses split back
+by ';', TSP statements joined by ' ' and their printed lines read one
+by one. Each query returns a Future resolved with the parsed response.
+Drivers get batch() from the Batching mixin.
+Use: with dvm.batch() as b:
+         b.write('SAMP:COUN 1')
+         b.write('TRIG:SOUR BUS')
+         count = b.ask('SAMP:COUN?', int)
+     print(count.result())
+batch.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'batch.py (C) J.M.,rev.18-Oct-26'
+
+import sys
+from concurrent.futures import Future
+from snapshot import joinCommands
+
+def splitResponse(response):
+    """
+    Splits a compound SCPI response to responses of individual queries,
+    ';' in quoted strings and in definite-length blocks kept
+    Input:  response - string read
+    Returns: list of response strings
+    """
+    parts = []
+    start = 0
+    pos = 0
+    quote = None
+    while pos < len(response):
+        char = response[pos]
+        if quote != None:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '#' and pos == start and pos + 1 < len(response) \
+             and response[pos + 1] in '123456789':
+            digits = int(response[pos + 1])
+            length = int(response[pos + 2:pos + 2 + digits])
+            pos += 2 + digits + length
+            continue
+        elif char == ';':
+            parts.append(response[start:pos])
+            start = pos + 1
+        pos += 1
+    parts.append(response[start:])
+    return parts
+
+class Batch:
+    """
+    Commands and queries of one message
+    """
+    def __init__(self, handle, separator = None, setpoints = None):
+        """
+        Input:  handle - opened device handle
+                separator - None or ';' responses of the message joined
+                            by ';', otherwise each query response read
+                            separately, see snapshot.joinCommands()
+                setpoints - setcache.SetpointCache of the driver,
+                            invalidated when the message is sent
+        """
+        self.handle = handle
+        self.separator = separator
+        self.setpoints = setpoints
+        self.commands = []
+        self.queries = []       #[(Future, parser)] in message order
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType == None:
+            self.flush()
+        else:
+            self.cancel()
+        return False
+
+    def write(self, cmd):
+        """
+        Adds a command
+        Return: none
+        """
+        self.commands.append(cmd)
+
+    def ask(self, cmd, parser = str):
+        """
+        Adds a query
+        Input:  cmd - query string
+                parser - function converting the response string,
+                         e.g. float, int
+        Returns: Future resolved by flush()
+        """
+        future = Future()
+        self.commands.append(cmd)
+        self.queries.append((future, parser))
+        return future
+
+    def cancel(self):
+        """
+        Drops collected commands, queries not resolved yet are cancelled
+        """
+        for (future, parser) in self.queries:
+            future.cancel()
+        self.commands = []
+        self.queries = []
+
+    def flush(self):
+        """
+        Sends collected commands as one message and resolves the queries
+        Return: none, raises exception if the transfer failed
+        """
+        (commands, queries) = (self.commands, self.queries)
+        self.commands = []
+        self.queries = []
+        if len(commands) == 0:
+            return
+        if self.setpoints != None:      #commands bypass the cache
+            self.setpoints.invalidate()
+        message = joinCommands(commands, self.separator)
+        try:
+            self.handle.write(message)
+            if len(queries) == 0:
+                return
+            if self.separator in (None, ';'):
+                responses = splitResponse(self.handle.read().strip())
+            else:
+                responses = [self.handle.read().strip() for query in queries]
+        except Exception as exc:
+            print('Batch.flush() "' + message + '" failed !')
+            for (future, parser) in queries:
+                future.set_exception(exc)
+            raise
+        if len(responses) != len(queries):
+            print('Batch.flush() %d responses to %d queries !'
+                  % (len(responses), len(queries)))
+            exc = IOError('Batch.flush() response count mismatch')
+            for (future, parser) in queries:
+                future.set_exception(exc)
+            raise exc
+        for ((future, parser), response) in zip(queries, responses):
+            try:
+                future.set_result(parser(response.strip()))
+            except Exception as exc:
+                future.set_exception(exc)
+
+class Batching:
+    """
+    Mixin giving drivers batch()
+    """
+    batchSeparator = None   #SCPI, set by drivers of other command languages
+    setpoints = None        #SetpointCache of drivers caching setpoints
+
+    def batch(self):
+        """
+        Collects commands and queries sent as one message at the end
+        of a with block, see Batch, the setpoint cache is invalidated
+        when they are sent
+        Returns: Batch instance
+        """
+        return Batch(self.handle, self.batchSeparator, self.setpoints)
+
+
+# Self test - batches on simulated supply and 3706
+# ================================================
+if __name__ == '__main__':
+    import clock, visasim, csrc2722, cdaq3706
+    print(copyr)
+    clock.setClock(clock.VirtualClock())
+    if splitResponse('+1.0;"a;b";#15ab;de;3') != ['+1.0', '"a;b"', '#15ab;de',
+                                                   '3']:
+        print('Done with error - splitResponse() !')
+        sys.exit(2)
+    sim = visasim.ResourceManager(verbose = False)
+    src = csrc2722.Src2722(sim, 'U2722A')
+    k3706 = cdaq3706.Daq3706(sim, 'K3706')
+    src.open()
+    k3706.open()
+    with src.batch() as b:
+        b.write('VOLT 2.5, (@1)')
+        volt = b.ask('VOLT? (@1)', float)
+        idn = b.ask('*IDN?')
+        error = b.ask('SYST:ERR?')
+    with k3706.batch() as b:
+        b.write('dmm.nplc = 2')
+        nplc = b.ask('print(dmm.nplc)', float)
+        count = b.ask('print(errorqueue.count)', int)
+    bad = src.batch()
+    bad.write('VOLT 3, (@1)')
+    number = bad.ask('*IDN?', float)
+    bad.flush()
+    print(volt.result(), idn.result(), error.result(), nplc.result(),
+          count.result())
+    src.close()
+    k3706.close()
+    if volt.result() != 2.5 or not error.result().startswith('+0') or \
+       nplc.result() != 2. or count.result() != 0 or \
+       not isinstance(number.exception(), ValueError):
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
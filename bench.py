@@ -0,0 +1,266 @@
+"""
+Micro-benchmarks of driver methods on simulated instruments.
+Each case runs a driver method against visasim with its timing model on
+a virtual clock and counts bus messages, bytes, simulated and host time
+per call. Results are compared with bench_baseline.json, more messages
+or slower simulated time than the baseline is a regression.
+Use: python bench.py [--update] [case name parts]
+     --update stores current results as the baseline
+     exit code 2 if any case regressed
+bench.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'bench.py (C) J.M.,rev.18-Oct-26'
+
+import sys, json, itertools
+import time as systime
+import clock, visasim, businstr
+import cdaq34972, cdaq3706, cdvm34411, cgen33220, chmp4030, cpl303
+import csrc2722, csrcHameg
+import scpiparse     #drivers import it at the first read, numpy load not timed
+
+baselineName = 'bench_baseline.json'
+repeat = 5              #calls of each case
+simTolerance = .02      #allowed relative increase of simulated time
+wallFactor = 5.         #host time budget relative to baseline
+wallMin = .002          #host time budget floor in s
+
+def overlapped(drv, count):
+    drv.startOverlapped(.01, count * .01)
+    return drv.waitOverlappedDone(count, 5)
+
+def varying(call, values):
+    """
+    Returns: case call passing the next of values on each call, repeated
+             setpoints are cache hits, changing ones benchmark the writes
+    """
+    values = itertools.cycle(values)
+    return lambda drv: call(drv, next(values))
+
+# (case name, driver class, VISA name, setup, call)
+cases = [
+    ('Daq34972.configScan', cdaq34972.Daq34972, '34972A', None,
+     lambda drv: drv.configScan('101:110', 'VOLT:DC', 10, 1)),
+    ('Daq34972.readSwitch', cdaq34972.Daq34972, '34972A',
+     lambda drv: drv.configScan('101', 'VOLT:DC', 10, 1),
+     lambda drv: drv.readSwitch(101)),
+    ('Daq34972.readSwitch.settle', cdaq34972.Daq34972, '34972A',
+     lambda drv: (drv.configScan('101', 'VOLT:DC', 10, 1),
+                  drv.setSettle(.01, 1.)),
+     lambda drv: drv.readSwitch(101)),
+    ('Daq34972.read', cdaq34972.Daq34972, '34972A',
+     lambda drv: drv.configScan('101', 'VOLT:DC', 10, 1),
+     lambda drv: drv.read()),
+    ('Daq34972.readRange', cdaq34972.Daq34972, '34972A',
+     lambda drv: drv.configScan('101', 'VOLT:DC', 'AUTO', 1),
+     lambda drv: drv.readRange('101')),
+    ('Daq34972.controlSwitch', cdaq34972.Daq34972, '34972A', None,
+     lambda drv: drv.controlSwitch(101, True)),
+    ('Daq34972.configAcFilter', cdaq34972.Daq34972, '34972A', None,
+     lambda drv: drv.configAcFilter('101', 20)),
+    ('Daq34972.waitOverlappedDone', cdaq34972.Daq34972, '34972A',
+     lambda drv: drv.configScan('101', 'VOLT:DC', 10, .02),
+     lambda drv: overlapped(drv, 10)),
+    ('Dvm34411.config', cdvm34411.Dvm34411, '34411A', None,
+     lambda drv: drv.config('VOLT:DC', 10, 1)),
+    ('Dvm34411.read', cdvm34411.Dvm34411, '34411A',
+     lambda drv: drv.config('VOLT:DC', 10, 1),
+     lambda drv: drv.read()),
+    ('Dvm34411.waitOverlappedDone', cdvm34411.Dvm34411, '34411A',
+     lambda drv: drv.config('VOLT:DC', 10, .02),
+     lambda drv: overlapped(drv, 10)),
+    ('Daq3706.scanSlots', cdaq3706.Daq3706, 'K3706', None,
+     lambda drv: drv.scanSlots()),
+    ('Daq3706.configDmm', cdaq3706.Daq3706, 'K3706', None,
+     lambda drv: drv.configDmm('dcvolts', 10, 1)),
+    ('Daq3706.read', cdaq3706.Daq3706, 'K3706',
+     lambda drv: drv.configDmm('dcvolts', 10, 1),
+     lambda drv: drv.read()),
+    ('Daq3706.readSwitch', cdaq3706.Daq3706, 'K3706',
+     lambda drv: (drv.scanSlots(), drv.configDmm('dcvolts', 10, 1)),
+     lambda drv: drv.readSwitch(1001)),
+    ('Src2722.configVoltSrc', csrc2722.Src2722, 'U2722A', None,
+     lambda drv: drv.configVoltSrc(1, 3., .02)),
+    ('Src2722.readVoltage', csrc2722.Src2722, 'U2722A',
+     lambda drv: drv.configVoltSrc(1, 3., .02),
+     lambda drv: drv.readVoltage(1)),
+    ('SrcHameg.configVoltSrc', csrcHameg.SrcHameg, 'HMP2030', None,
+     lambda drv: drv.configVoltSrc(1, 3., .5)),
+    ('SrcHameg.configVoltSrc.varying', csrcHameg.SrcHameg, 'HMP2030', None,
+     varying(lambda drv, volt: drv.configVoltSrc(1, volt, .5), (3., 4.))),
+    ('SrcHameg.enableOutputs', csrcHameg.SrcHameg, 'HMP2030', None,
+     lambda drv: drv.enableOutputs(5, True)),
+    ('SrcHameg.readVoltage', csrcHameg.SrcHameg, 'HMP2030', None,
+     lambda drv: drv.readVoltage(1)),
+    ('Hmp4030.setVoltage', chmp4030.Hmp4030, 'HMP4030', None,
+     lambda drv: drv.setVoltage(1, 3.)),
+    ('Hmp4030.setVoltage.varying', chmp4030.Hmp4030, 'HMP4030', None,
+     varying(lambda drv, volt: drv.setVoltage(1, volt), (3., 4.))),
+    ('Hmp4030.enableOutputs', chmp4030.Hmp4030, 'HMP4030', None,
+     lambda drv: drv.enableOutputs(5, True)),
+    ('Pl303.setVoltage', cpl303.Pl303, 'PL303', None,
+     lambda drv: drv.setVoltage(1, 3.)),
+    ('Pl303.setVoltage.varying', cpl303.Pl303, 'PL303', None,
+     varying(lambda drv, volt: drv.setVoltage(1, volt), (3., 4.))),
+    ('Pl303.getVoltage', cpl303.Pl303, 'PL303', None,
+     lambda drv: drv.getVoltage(1)),
+    ('Gen33220.setFrequency', cgen33220.Gen33220, '33220A', None,
+     lambda drv: drv.setFrequency(1e3)),
+    ('Gen33220.setVoltage', cgen33220.Gen33220, '33220A', None,
+     lambda drv: drv.setVoltage(1., 0.)),
+    ('Gen33220.selectFunction', cgen33220.Gen33220, '33220A', None,
+     lambda drv: drv.selectFunction('SIN')),
+    ('Gen33220.setFrequency.varying', cgen33220.Gen33220, '33220A', None,
+     varying(lambda drv, freq: drv.setFrequency(freq), (1e3, 2e3))),
+    ('Gen33220.setVoltage.varying', cgen33220.Gen33220, '33220A', None,
+     varying(lambda drv, volt: drv.setVoltage(volt, 0.), (1., 2.))),
+    ('Gen33220.selectFunction.varying', cgen33220.Gen33220, '33220A', None,
+     varying(lambda drv, function: drv.selectFunction(function),
+             ('SIN', 'SQU'))),
+]
+
+def totals(stats):
+    """
+    Returns: (messages, bytes) accounted so far
+    """
+    messages = 0
+    transferred = 0
+    for data in stats.summary().values():
+        for st in data['commands'].values():
+            messages += st['count']
+            transferred += st['sent'] + st['received']
+    return (messages, transferred)
+
+def runCase(driverClass, visaName, setup, call):
+    """
+    Runs one case on a fresh simulator and virtual clock
+    Input:  driverClass, visaName - driver to be created and opened
+            setup - function preparing the driver before each call or None
+            call - function with the benchmarked call
+    Returns: dictionary of per call 'messages', 'bytes', 'simTime',
+             'wallTime' and 'errors' reported by the simulator
+    """
+    clk = clock.VirtualClock()
+    clock.setClock(clk)
+    sim = visasim.ResourceManager(clk, verbose = False)
+    stats = businstr.BusStats()
+    rm = businstr.InstrumentedManager(sim, stats)
+    drv = driverClass(rm, visaName)
+    drv.open()
+    messages = transferred = 0
+    simTime = wallTime = 0.
+    try:
+        for i in range(repeat):
+            if setup != None:
+                setup(drv)
+            (startMessages, startBytes) = totals(stats)
+            startSim = clk.time()
+            startWall = systime.perf_counter()
+            call(drv)
+            wallTime += systime.perf_counter() - startWall
+            simTime += clk.time() - startSim
+            (endMessages, endBytes) = totals(stats)
+            messages += endMessages - startMessages
+            transferred += endBytes - startBytes
+        errors = len(getattr(sim.devices[visaName], 'errors', []))
+    finally:
+        drv.close()
+        rm.close()
+        clock.setClock(clock.SystemClock())
+    return {'messages' : messages / float(repeat),
+            'bytes' : transferred / float(repeat),
+            'simTime' : round(simTime / repeat, 9),
+            'wallTime' : round(wallTime / repeat, 9),
+            'errors' : errors}
+
+def loadBaseline(fileName = baselineName):
+    """
+    Returns: baseline dictionary {case name : results}, empty if not found
+    """
+    try:
+        baseFile = open(fileName, 'r')
+    except OSError:
+        print('bench: ' + fileName + ' not found - no baseline !')
+        return {}
+    baseline = json.load(baseFile)
+    baseFile.close()
+    return baseline
+
+def saveBaseline(results, fileName = baselineName):
+    """
+    Stores results as the baseline
+    """
+    try:
+        baseFile = open(fileName, 'w')
+        json.dump(results, baseFile, indent = 1, sort_keys = True)
+        baseFile.close()
+    except Exception:
+        print('bench: writing ' + fileName + ' failed !')
+        raise
+
+def compare(result, base):
+    """
+    Checks result of one case against its baseline
+    Returns: list of regression descriptions, empty if OK
+    """
+    faults = []
+    if result['errors'] > 0:
+        faults.append('%d SCPI errors' % result['errors'])
+    if base == None:
+        return faults
+    if result['messages'] > base['messages']:
+        faults.append('messages %g > %g' % (result['messages'],
+                                            base['messages']))
+    if result['simTime'] > base['simTime'] * (1 + simTolerance) + 1e-9:
+        faults.append('simulated %.6f s > %.6f s' % (result['simTime'],
+                                                     base['simTime']))
+    budget = max(base['wallTime'] * wallFactor, wallMin)
+    if result['wallTime'] > budget:
+        faults.append('host %.6f s > budget %.6f s' % (result['wallTime'],
+                                                       budget))
+    return faults
+
+def run(names = (), update = False):
+    """
+    Runs selected cases and reports them
+    Input:  names - parts of case names to be run, all if empty
+            update - store results as the new baseline
+    Returns: number of regressed cases
+    """
+    baseline = loadBaseline()
+    results = {}
+    regressed = 0
+    print('%-32s %8s %8s %12s %12s' % ('case', 'msgs', 'bytes', 'sim [ms]',
+                                       'host [ms]'))
+    for (name, driverClass, visaName, setup, call) in cases:
+        if names and not [part for part in names if part in name]:
+            continue
+        result = runCase(driverClass, visaName, setup, call)
+        results[name] = result
+        faults = compare(result, baseline.get(name))
+        line = '%-32s %8g %8g %12.3f %12.3f' % (name, result['messages'],
+                result['bytes'], result['simTime'] * 1e3,
+                result['wallTime'] * 1e3)
+        if faults:
+            regressed += 1
+            line += '  REGRESSION: ' + ', '.join(faults)
+        print(line)
+    if update:
+        baseline.update(results)
+        saveBaseline(baseline)
+        print('Baseline ' + baselineName + ' updated.')
+    return regressed
+
+
+# Run the benchmarks
+# ==================
+if __name__ == '__main__':
+    print(copyr)
+    args = sys.argv[1:]
+    update = '--update' in args
+    names = [arg for arg in args if arg != '--update']
+    regressed = run(names, update)
+    if regressed and not update:
+        print('%d cases regressed !' % regressed)
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,296 @@
+"""
+Opt-in instrumentation of instrument bus traffic. Wraps handles of all
+drivers via a resource manager wrapper and counts, per instrument and
+command mnemonic, calls, bytes sent and received and latency histogram.
+Sleeps done through the clock module are accounted separately to the
+instrument used last. Summary exported as JSON or CSV at close().
+Use: rm = businstr.InstrumentedManager(visa.ResourceManager(),
+                                       exportPath = 'bus.json')
+     and pass rm to drivers as usual
+businstr.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'businstr.py (C) J.M.,rev.18-Oct-26'
+
+import sys, re, json, threading
+import clock
+
+# upper edges of latency histogram buckets in s, the last bucket unlimited
+latencyEdges = (1e-4, 3e-4, 1e-3, 3e-3, .01, .03, .1, .3, 1., 3.)
+
+tokenPattern = re.compile(r'\s*([*:]?[A-Za-z][\w.:*\[\]]*\??)')
+
+def mnemonic(cmd):
+    """
+    Command mnemonic used as statistics key: SCPI headers without
+    parameters, TSP function or variable names, joined by ';' if the
+    message contains more commands
+    Input:  cmd - command string
+    Returns: mnemonic string
+    """
+    names = []
+    for unit in cmd.strip().split(';'):
+        unit = unit.strip()
+        if unit == '':
+            continue
+        if unit.startswith('print(') and unit.endswith(')'):
+            names.append('print(' + mnemonic(unit[6:-1]) + ')')
+            continue
+        match = tokenPattern.match(unit)
+        if match == None:
+            names.append('?')
+        elif '.' in match.group(1):
+            names.append(match.group(1))            #TSP is case sensitive
+        else:
+            names.append(match.group(1).upper().lstrip(':'))
+    return ';'.join(names)
+
+class CommandStats:
+    """
+    Counters of one command mnemonic
+    """
+    def __init__(self):
+        self.count = 0
+        self.sent = 0           #bytes
+        self.received = 0       #bytes
+        self.total = 0.         #time spent in s
+        self.max = 0.
+        self.histogram = [0] * (len(latencyEdges) + 1)
+
+    def add(self, sent, received, latency):
+        self.count += 1
+        self.sent += sent
+        self.received += received
+        self.total += latency
+        self.max = max(self.max, latency)
+        for (i, edge) in enumerate(latencyEdges):
+            if latency <= edge:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def summary(self):
+        """
+        Returns: dictionary for export
+        """
+        return {'count' : self.count, 'sent' : self.sent,
+                'received' : self.received, 'total' : self.total,
+                'max' : self.max, 'histogram' : list(self.histogram)}
+
+class BusStats:
+    """
+    Statistics of all instruments, shared by their instrumented handles
+    """
+    def __init__(self, exportPath = None):
+        """
+        Input:  exportPath - file written at close(), '.csv' extension
+                             selects CSV, JSON otherwise, None no export
+        """
+        self.exportPath = exportPath
+        self.commands = {}      #{instrument : {mnemonic : CommandStats}}
+        self.sleeps = {}        #{instrument : [count, total time]}
+        self.lock = threading.Lock()
+        self.local = threading.local()  #instrument used last by a thread
+        clock.addListener(self.sleep)
+
+    def record(self, instrument, cmd, sent, received, latency):
+        """
+        Accounts one bus transaction
+        Input:  instrument - instrument name
+                cmd - command sent, '' for read
+                sent, received - bytes
+                latency - time of the transaction in s
+        """
+        name = mnemonic(cmd)
+        if name == '':
+            name = 'read'
+        with self.lock:
+            stats = self.commands.setdefault(instrument, {})
+            if name not in stats:
+                stats[name] = CommandStats()
+            stats[name].add(sent, received, latency)
+        self.local.instrument = instrument
+
+    def sleep(self, seconds):
+        """
+        Clock listener accounting sleeps to the instrument used last
+        """
+        instrument = getattr(self.local, 'instrument', 'script')
+        with self.lock:
+            stats = self.sleeps.setdefault(instrument, [0, 0.])
+            stats[0] += 1
+            stats[1] += seconds
+
+    def summary(self):
+        """
+        Returns: dictionary {instrument : {'commands' : {mnemonic : stats},
+                             'sleeps' : {'count', 'total'}}}
+        """
+        result = {}
+        with self.lock:
+            for (instrument, stats) in self.commands.items():
+                commands = {}
+                for (name, cmdStats) in stats.items():
+                    commands[name] = cmdStats.summary()
+                result[instrument] = {'commands' : commands}
+            for (instrument, (count, total)) in self.sleeps.items():
+                result.setdefault(instrument, {'commands' : {}})
+                result[instrument]['sleeps'] = {'count' : count,
+                                                'total' : total}
+        return result
+
+    def exportJson(self, path):
+        """
+        Writes summary as JSON
+        """
+        try:
+            outFile = open(path, 'w')
+            json.dump(self.summary(), outFile, indent = 1, sort_keys = True)
+            outFile.close()
+        except Exception:
+            print('BusStats.exportJson() writing ' + path + ' failed !')
+            raise
+
+    def exportCsv(self, path):
+        """
+        Writes summary as CSV, one line per instrument and mnemonic,
+        sleeps as mnemonic 'sleep'
+        """
+        edges = ['<=%g' % edge for edge in latencyEdges] + ['>%g' %
+                                                            latencyEdges[-1]]
+        try:
+            outFile = open(path, 'w')
+            outFile.write('instrument;mnemonic;count;sent;received;total;'
+                          'max;' + ';'.join(edges) + '\n')
+            for (instrument, data) in sorted(self.summary().items()):
+                for (name, st) in sorted(data['commands'].items()):
+                    outFile.write('%s;%s;%d;%d;%d;%.6f;%.6f;%s\n' %
+                        (instrument, name, st['count'], st['sent'],
+                         st['received'], st['total'], st['max'],
+                         ';'.join([str(n) for n in st['histogram']])))
+                if 'sleeps' in data:
+                    outFile.write('%s;sleep;%d;0;0;%.6f;;\n' % (instrument,
+                        data['sleeps']['count'], data['sleeps']['total']))
+            outFile.close()
+        except Exception:
+            print('BusStats.exportCsv() writing ' + path + ' failed !')
+            raise
+
+    def export(self, path = None):
+        """
+        Writes summary to exportPath or given path, format by extension
+        """
+        if path == None:
+            path = self.exportPath
+        if path == None:
+            return
+        if path.lower().endswith('.csv'):
+            self.exportCsv(path)
+        else:
+            self.exportJson(path)
+
+    def printSummary(self):
+        """
+        Displays instruments and commands sorted by time spent
+        """
+        for (instrument, data) in sorted(self.summary().items()):
+            print(instrument)
+            commands = data['commands']
+            for name in sorted(commands, key = lambda n: -commands[n]['total']):
+                st = commands[name]
+                print('    %-30s %6d x %9.4f s' % (name, st['count'],
+                                                   st['total']))
+            if 'sleeps' in data:
+                print('    %-30s %6d x %9.4f s' % ('sleep',
+                      data['sleeps']['count'], data['sleeps']['total']))
+
+    def close(self):
+        """
+        Stops accounting sleeps and exports the summary
+        """
+        clock.removeListener(self.sleep)
+        self.export()
+
+class InstrumentedHandle:
+    """
+    Wraps a device handle, accounts its traffic to BusStats
+    """
+    def __init__(self, handle, instrument, stats):
+        self.__dict__['handle'] = handle
+        self.__dict__['instrument'] = instrument
+        self.__dict__['stats'] = stats
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.handle, name, value)   #VISA attributes like timeout
+
+    def write(self, cmd):
+        startTime = clock.time()
+        self.handle.write(cmd)
+        self.stats.record(self.instrument, cmd, len(cmd), 0,
+                          clock.time() - startTime)
+
+    def read(self):
+        startTime = clock.time()
+        response = self.handle.read()
+        self.stats.record(self.instrument, '', 0, len(response),
+                          clock.time() - startTime)
+        return response
+
+    def ask(self, cmd):
+        startTime = clock.time()
+        response = self.handle.ask(cmd)
+        self.stats.record(self.instrument, cmd, len(cmd), len(response),
+                          clock.time() - startTime)
+        return response
+
+    def close(self):
+        self.handle.close()
+        self.stats.export()
+
+class InstrumentedManager:
+    """
+    Resource manager wrapper handing out instrumented handles
+    """
+    def __init__(self, rm, stats = None, exportPath = None):
+        """
+        Input:  rm - resource manager to be wrapped
+                stats - BusStats to be used, new one if None
+                exportPath - export file of new BusStats
+        """
+        if stats == None:
+            stats = BusStats(exportPath)
+        self.rm = rm
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.rm, name)
+
+    def get_instrument(self, visaName, **kwargs):
+        handle = self.rm.get_instrument(visaName, **kwargs)
+        return InstrumentedHandle(handle, visaName, self.stats)
+
+    def close(self):
+        self.rm.close()
+        self.stats.close()
+
+
+# Self test - instruments simulated 34972A driver
+# ===============================================
+if __name__ == '__main__':
+    import visasim, cdaq34972
+    print(copyr)
+    clock.setClock(clock.VirtualClock())
+    rm = InstrumentedManager(visasim.ResourceManager(verbose = False))
+    dvm = cdaq34972.Daq34972(rm, '34972A')
+    dvm.open()
+    dvm.configScan('101', 'VOLT:DC', 10, 1)
+    for i in range(10):
+        dvm.readSwitch(101)
+    dvm.close()
+    rm.close()
+    rm.stats.printSummary()
+    print('OK')
+    sys.exit(0)
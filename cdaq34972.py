@@ -4,12 +4,28 @@ cdaq34972.py (C) J.M.,rev.1-Apr-16
 """
 copyr = 'cdaq34972.py (C) J.M.,rev.1-Apr-16'
 
-import sys, visa, time
+import sys
+import clock
+from batch import Batching
 
-class Daq34972:
+class Daq34972(Batching):
     """
     Class supporting creation of any number of independent device instances
     """
+    # ranges available for fixed range selection, ascending
+    rangeSteps = {'CURR:DC' : (.01, .1, 1.),
+                  'CURR:AC' : (.01, .1, 1.),
+                  'FRES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+                  'RES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+                  'VOLT:DC' : (.1, 1., 10., 100., 300.),
+                  'VOLT:AC' : (.1, 1., 10., 100., 300.)}
+    overload = 9.9e37       #reading returned if out of range
+    memorySlots = (1, 2, 3, 4, 5)   #*SAV/*RCL locations
+
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', '*TRG', 'ABOR', 'INIT:IMM', 'ROUT:CLOS',
+                 'ROUT:OPEN'}
+
     def __init__(self, rm, visaName, timeout = 5):
         """
         Constructor registers required visa name and resource manager handle
@@ -21,6 +37,14 @@ class Daq34972:
         self.visaName = visaName
         self.handle = None
         self.timeout = timeout       #timeout value
+        self.func = 'VOLT:DC'        #last configured function
+        self.rng = 'AUTO'            #last configured range
+        self.nplc = 1                #last configured NPLC
+        self.channelConfig = {}      #{channel : (func, rng, nplc)}
+        self.settle = None           #adaptive settle off, see setSettle()
+        self.settleTimes = {}        #{switch : settle time used}
+        self.lastSettle = None       #settle time of the last readSwitch()
+        self.closed = set()          #switches closed by controlSwitch()
     
     def open(self):
         """
@@ -32,11 +56,29 @@ class Daq34972:
         try:
             self.handle = self.rm.get_instrument(self.visaName,
                                                  timeout = self.timeout)
-            self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
         except Exception:
             print('Exception in Daq34972.open() !')
             raise
+        return self.reset()
+
+    def reset(self):
+        """
+        Bring the device to default state using *RST on the opened
+        session, wait until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        try:
+            self.handle.write('*RST')   #reset device to default
+            self.handle.ask('*OPC?')
+        except Exception:
+            print('Daq34972.reset() failed !')
+            raise
+        self.func = 'VOLT:DC'           #*RST configuration
+        self.rng = 'AUTO'
+        self.nplc = 1
+        self.channelConfig = {}
+        self.closed = set()
         return True
 
     def close(self):
@@ -55,6 +97,40 @@ class Daq34972:
                 raise
         return True
 
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: opens switches closed
+        by controlSwitch(), clears status and verifies no error is
+        pending. Configuration can't be undone, *RST is needed if
+        commands other than transient ones were written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        try:
+            if len(self.closed) != 0:
+                cmd = 'ROUT:OPEN (@' + ','.join([str(sw) for sw in
+                                                 sorted(self.closed)]) + ')'
+                self.handle.write(cmd)
+                self.closed = set()
+            self.handle.write('*CLS')
+        except Exception:
+            print('Exception in Daq34972.softReset() !')
+            raise
+        if changed == None or [m for m in changed if m not in self.transient]:
+            return False        #configuration written, *RST restores it
+        try:
+            if self.handle.ask('*OPC?').strip() != '1':
+                return False
+            errors = self.handle.ask('SYST:ERR?').strip()
+        except Exception:
+            print('Daq34972.softReset() verification failed !')
+            return False
+        return errors.startswith('+0') or errors.startswith('0')
+
     def controlSwitch(self, switch, state):
         """
         Control a mux switch
@@ -77,6 +153,10 @@ class Daq34972:
         except Exception:
             print('Exception in Daq34972.controlSwitch() !')            
             raise            
+        if state:
+            self.closed.add(switch)
+        else:
+            self.closed.discard(switch)
         return True
     
     def configAcFilter(self, scanList, freq):
@@ -169,6 +249,7 @@ class Daq34972:
             print('Daq34972.configScan() illegal scan list !')
             return False
         else:
+            channels = self.listChannels(scanList)
             scanList = '(@' + scanList + ')'
                         
         #Checks OK - send setting commands
@@ -187,12 +268,94 @@ class Daq34972:
         except Exception:
             print('Exception in Daq34972.configScan() !')
             raise
+        self.func = func
+        self.rng = rng
+        self.nplc = nplc
+        for channel in channels:
+            self.channelConfig[channel] = (func, rng, nplc)
         return True
 
+    def setSettle(self, tolerance, maxTime, nplc = .02):
+        """
+        Enable adaptive settling in readSwitch(). After closing the switch
+        fast readings are taken until two consecutive ones agree within
+        tolerance or maxTime expires, then the final reading is done with
+        configured NPLC. Settle time used is stored in settleTimes.
+        Input:  tolerance - max difference of consecutive readings in SI,
+                            None switches adaptive settling off
+                maxTime - max settling time in s
+                nplc - NPLC of settling readings
+        Returns: None
+        """
+        if tolerance == None:
+            self.settle = None
+        else:
+            self.settle = (tolerance, maxTime, nplc)
+
+    def waitSettled(self, switch):
+        """
+        Take fast readings on closed switch until consecutive readings
+        agree within tolerance set by setSettle() or max time expires
+        Input:   switch - closed switch number
+        Returns: settle time in s,
+                 raises exception if fails
+        """
+        (tolerance, maxTime, nplc) = self.settle
+        scanList = '(@' + str(switch) + ')'
+        hasNplc = ('VOLT:DC', 'CURR:DC', 'RES', 'FRES', 'TEMP')
+        (func, rng, chNplc) = self.channelConfig.get(int(switch),
+                                                     ('VOLT:DC', 'AUTO', 1))
+        try:
+            if func in hasNplc:
+                cmd = func + ':NPLC ' + str(nplc) + ',' + scanList
+                self.handle.write(cmd)
+            startTime = clock.time()
+            last = float(self.handle.ask('READ?'))
+            while True:
+                reading = float(self.handle.ask('READ?'))
+                if abs(reading - last) <= tolerance:
+                    break
+                if clock.time() - startTime > maxTime:
+                    print('Daq34972.waitSettled() switch %d not settled !'
+                          % switch)
+                    break
+                last = reading
+            settleTime = clock.time() - startTime
+            if func in hasNplc:     #back to NPLC configured for the channel
+                cmd = func + ':NPLC ' + str(chNplc) + ',' + scanList
+                self.handle.write(cmd)
+        except Exception:
+            print('Exception in Daq34972.waitSettled() !')
+            raise
+        self.settleTimes[switch] = settleTime
+        return settleTime
+
+    def readRange(self, scanList, func = None):
+        """
+        Read range used by the channel, e.g. the one autorange settled on
+        Input:  scanList - single channel as string
+                func - function, default the last configured one
+        Returns: range as float if OK,
+                 raises exception if fails
+        """
+        if func == None:
+            func = self.func
+        try:
+            cmd = 'SENS:' + func.upper() + ':RANG? (@' + scanList + ')'
+            reading = self.handle.ask(cmd)
+            rng = float(reading)
+        except Exception:
+            print('Exception in Daq34972.readRange() !')
+            raise
+        return rng
+
     def readSwitch(self, switch, delay = 0):
         """
         Read one sample including closing a switch, open switch afterwards     
+        If adaptive settling is set by setSettle(), waits after the delay
+        until the reading settles, settle time stored in lastSettle
         Input:   switch number
+                 delay - fixed waiting after closing switch, default 0
         Returns: float reading if OK, False if scan list bad
                  raises exception if fails
         """
@@ -201,11 +364,14 @@ class Daq34972:
             return False
         else:
             scanList = '(@' + str(switch) + ')'
+        self.lastSettle = None
         try:
             cmd = 'ROUT:CLOS ' + scanList          
             self.handle.write(cmd)                #one sample per trigger
             if delay != 0:
-                time.sleep(delay)
+                clock.sleep(delay)
+            if self.settle != None:
+                self.lastSettle = self.waitSettled(switch)
             reading = self.handle.ask('READ?')
             cmd = 'ROUT:OPEN ' + scanList          
             self.handle.write(cmd)                #one sample per trigger
@@ -268,11 +434,11 @@ class Daq34972:
         Input:    inst instrument handle
                   count number of samples to be taken
                   timeout - time within which the measurement shall be finished
-        Return:   measurement results as a list of float
+        Return:   measurement results as list of float
                   False if timeout or readi data format error
                   raises exception if fails
         """
-        startTime = time.time()
+        startTime = clock.time()
         while True:         #wait until measuring flag goes to 0
             try:
                 measured = self.handle.ask(":DATA:POIN?;")
@@ -284,33 +450,22 @@ class Daq34972:
                 print('Exception in Daq34972.waitOverlappedDone() polling !')
                 raise
             
-            if time.time() - startTime > timeout:
+            if clock.time() - startTime > timeout:
                 print('Daq34972.waitOverlappedDone() timeout !')
                 return False
             
-        samples = []        
-        for i in range(0, count):
-            try:
-                reading = self.handle.ask('R? 1;')     #definite-Length block format
-            except Exception: 
-                print('Daq34972.Reading results failed !')
-                raise;
-            #DLB: '#' followed by number od decimal digits to follow
-            #the decimal number is length of data in bytes
-            if reading[0] != '#':
-                print('Daq34972.DLB format error - # expected !')
-                return False
-            digits = int(reading[1])
-            reading = reading[2 + digits:]
-            reading = reading.strip()
-            try:
-                rdg = float(reading)
-            except Exception:
-                print('Daq34972.waitOverlappedDone() Exception in conversion to float !')
-                raise
-            samples.append(rdg)
-    
-        return samples
+        try:        #all samples in one definite-length block
+            reading = self.handle.ask('R? %d;' % count)
+        except Exception:
+            print('Daq34972.Reading results failed !')
+            raise
+        import scpiparse    #numpy only when samples are read
+        try:
+            samples = scpiparse.parse(reading)
+        except ValueError as exc:
+            print('Daq34972.waitOverlappedDone() format error - %s !' % exc)
+            return False
+        return samples.tolist()
     
     def setTimeout(self, timeout):
         """
@@ -346,10 +501,28 @@ class Daq34972:
                     print('Daq34972:checkList() invalid channel number !')
                     return False
         return True
+
+    def listChannels(self, chlist):
+        """
+        Expand channel list to channel numbers
+        Input:  chlist - channel list as a string without leading
+                    '(@' and final ')', checked by checkList()
+        Returns: list of channel numbers as int
+        """
+        channels = []
+        for item in chlist.split(','):
+            item = item.strip()
+            if item.find(':') != -1:    #range
+                (fromCh, toCh) = item.split(':')
+                channels += list(range(int(fromCh), int(toCh) + 1))
+            else:
+                channels.append(int(item))
+        return channels
     
 # Selftest
 #==================================================================
 if __name__ == '__main__':      #self test   
+    import backend      #VISA_BACKEND=sim runs on emulators
 
 #    visaName = '34972LAN'     #default VISA name for selftest - LAN
     visaName = '34972A'     #default VISA name for selftest - USB
@@ -365,7 +538,7 @@ if __name__ == '__main__':      #self test
     """
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -379,9 +552,9 @@ if __name__ == '__main__':      #self test
     reslt = False
     try:
         dvm.controlSwitch(101, True)
-        time.sleep(.1)        
+        clock.sleep(.1)        
         dvm.controlSwitch(101, False)
-        time.sleep(.1)        
+        clock.sleep(.1)        
 
         if dvm.configScan('101', 'volt:dc', 10, 1):  #fnc, channel, rng, NPLC
             v = dvm.read()
@@ -7,12 +7,40 @@ cdaq3706.py (C) J.M.,rev.22-Jan-16
 
 copyr = 'cdaq3706.py (C) J.M.,rev.22-Jan-16'
 
-import sys, visa, time
+import sys
+import clock
+from batch import Batching
 
-class Daq3706:
+class Daq3706(Batching):
     """
     Class supporting creation of any number of independent device instances
     """
+    # dmm.func names of SCPI function names used by the other meters
+    scpiFunctions = {'VOLT:DC' : 'dcvolts', 'VOLT:AC' : 'acvolts',
+                     'CURR:DC' : 'dccurrent', 'CURR:AC' : 'accurrent',
+                     'RES' : 'twowireohms', 'FRES' : 'fourwireohms',
+                     'FREQ' : 'frequency', 'PER' : 'period',
+                     'TEMP' : 'temperature'}
+    # functions measured with dmm.nplc, not AC, frequency or period
+    nplcFunctions = ('dcvolts', 'dccurrent', 'twowireohms', 'fourwireohms',
+                     'commonsideohms', 'temperature')
+    # ranges available for fixed range selection, ascending,
+    # keyed by SCPI function names as in Daq34972 and Dvm34411
+    ohmSteps = (1., 10., 100., 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+    rangeSteps = {'CURR:AC' : (1e-3, .01, .1, 1., 3.),
+                  'VOLT:AC' : (.1, 1., 10., 100., 300.),
+                  'CURR:DC' : (1e-5, 1e-4, 1e-3, .01, .1, 1., 3.),
+                  'VOLT:DC' : (.1, 1., 10., 100., 300.),
+                  'FRES' : ohmSteps,
+                  'RES' : ohmSteps}
+    overload = 9.9e37       #reading returned if out of range
+    batchSeparator = ' '    #TSP statements in one message
+
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*RST', 'channel.close', 'channel.open', 'errorqueue.clear',
+                 'BUFFER', 'dmm.measurecount',      #set by every read()
+                 'beeper.enable', 'beeper.beep'}
+
     def __init__(self, rm, visaName, timeout = 5):
         """
         Constructor registers required visa name and resource manager handle
@@ -26,6 +54,12 @@ class Daq3706:
         self.timeout = timeout       #timeout value
         self.opened = False
         self.slots = []              #no slot detected
+        self.func = 'dcvolts'        #last configured function
+        self.rng = 'auto'            #last configured range
+        self.nplc = 1                #last configured NPLC
+        self.settle = None           #adaptive settle off, see setSettle()
+        self.settleTimes = {}        #{switch : settle time used}
+        self.lastSettle = None       #settle time of the last readSwitch()
         
     def open(self):
         """
@@ -39,8 +73,7 @@ class Daq3706:
         try:
             self.handle = self.rm.get_instrument(self.visaName,
                                                  timeout = self.timeout)
-            self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
+            self.reset()
             cmd = 'beeper.enable = beeper.ON'    
             self.handle.write(cmd)
             cmd = 'beeper.beep(.1, 4800)'    
@@ -52,6 +85,24 @@ class Daq3706:
         print('K3706 opened !')
         return True
 
+    def reset(self):
+        """
+        Bring the device to default state using *RST on the opened
+        session, wait until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        try:
+            self.handle.write('*RST')   #reset device to default
+            self.handle.ask('*OPC?')
+        except Exception:
+            print('Daq3706.reset() failed !')
+            raise
+        self.func = 'dcvolts'           #*RST configuration
+        self.rng = 'auto'
+        self.nplc = 1
+        return True
+
     def scanSlots(self):
         """
         Reads IDs of cards inserted into slots and stores to a list
@@ -100,6 +151,35 @@ class Daq3706:
             self.opened = False
         return True
 
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: opens all channels,
+        clears the error queue and verifies no error is pending.
+        DMM configuration can't be undone, *RST is needed if commands
+        other than transient ones were written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        try:
+            if changed == None or 'channel.close' in changed:
+                self.handle.write('channel.open("allslots")')
+            count = self.handle.ask('print(errorqueue.count)').strip()
+            self.handle.write('errorqueue.clear()')
+        except Exception:
+            print('Exception in Daq3706.softReset() !')
+            return False
+        if changed == None or [m for m in changed if m not in self.transient]:
+            return False        #configuration written, *RST restores it
+        try:
+            return float(count) == 0
+        except ValueError:
+            print('Daq3706.softReset() unexpected error count !')
+            return False
+
     def controlSwitch(self, switch, state):
         """
         Control a mux switch
@@ -162,7 +242,7 @@ class Daq3706:
         Input:  func - function: 'accurrent', 'acvolts', 'commonsideohms',
                                  'dcvolts' (default), 'fourwireohms',
                                  'frequency', 'period', 'temperature',
-                                 'twowireohms'
+                                 'twowireohms' or SCPI name, e.g. 'RES'
                 rng - range as float in SI (default 'auto').
                       ignored if function doesn't support ranges
                 nplc - float, ignored if function doesn't support 
@@ -181,7 +261,9 @@ class Daq3706:
                     'period' : (),
                     'temperature' : (),
                     'twowireohms' : (0, 120e6)}
-        func = func.lower()
+        func = self.tspFunction(func)
+        if rng == 'AUTO':
+            rng = 'auto'
         if func in list(ranges.keys()) == False:
             print('Daq3706.configDmm() - illegal function !')
             return False;
@@ -221,23 +303,104 @@ class Daq3706:
         except Exception:
             print('Exception in Daq3706.configDmm() !')
             raise
+        self.func = func
+        self.rng = rng
+        self.nplc = nplc
         return True
 
+    def tspFunction(self, func):
+        """
+        Returns: dmm.func name of a SCPI or dmm.func function name
+        """
+        return self.scpiFunctions.get(func.upper(), func.lower())
+
+    def setSettle(self, tolerance, maxTime, nplc = .2):
+        """
+        Enable adaptive settling in readSwitch(). After closing the switch
+        fast readings are taken until two consecutive ones agree within
+        tolerance or maxTime expires, then the final reading is done with
+        configured NPLC. Settle time used is stored in settleTimes.
+        Input:  tolerance - max difference of consecutive readings in SI,
+                            None switches adaptive settling off
+                maxTime - max settling time in s
+                nplc - NPLC of settling readings
+        Returns: None
+        """
+        if tolerance == None:
+            self.settle = None
+        else:
+            self.settle = (tolerance, maxTime, nplc)
+
+    def waitSettled(self, switch):
+        """
+        Take fast readings on closed switch until consecutive readings
+        agree within tolerance set by setSettle() or max time expires
+        Input:   switch - closed switch number
+        Returns: settle time in s,
+                 raises exception if fails
+        """
+        (tolerance, maxTime, nplc) = self.settle
+        hasNplc = self.nplc != None and self.func in self.nplcFunctions
+        try:
+            if hasNplc:
+                self.handle.write('dmm.nplc=' + str(nplc))
+            startTime = clock.time()
+            last = self.read()
+            while True:
+                reading = self.read()
+                if abs(reading - last) <= tolerance:
+                    break
+                if clock.time() - startTime > maxTime:
+                    print('Daq3706.waitSettled() switch %d not settled !'
+                          % switch)
+                    break
+                last = reading
+            settleTime = clock.time() - startTime
+            if hasNplc:                 #back to configured NPLC
+                self.handle.write('dmm.nplc=' + str(self.nplc))
+        except Exception:
+            print('Exception in Daq3706.waitSettled() !')
+            raise
+        self.settleTimes[switch] = settleTime
+        return settleTime
+
+    def readRange(self, scanList = None, func = None):
+        """
+        Read range used by the DMM, e.g. the one autorange settled on
+        Input:  scanList, func - ignored, the DMM has one configuration
+                                 for all channels
+        Returns: range as float if OK,
+                 raises exception if fails
+        """
+        try:
+            reading = self.handle.ask('print(dmm.range)')
+            rng = float(reading)
+        except Exception:
+            print('Exception in Daq3706.readRange() !')
+            raise
+        return rng
+
     def readSwitch(self, switch, delay = 0):
         """
         Read one sample including closing a switch, open switch afterwards     
+        If adaptive settling is set by setSettle(), waits after the delay
+        until the reading settles, settle time stored in lastSettle
         Input:   switch number
+                 delay - fixed waiting after closing switch, default 0
         Returns: float reading if OK, False if scan list bad
                  raises exception if fails
         """
         if not self.checkSwitchNumber(switch):
             print('Daq3706.readSwitch() illegal switch number !')
             return False
+        self.lastSettle = None
         try:
             cmd = 'channel.close("' + str(switch) + '")'
             self.handle.write(cmd)                #one sample per trigger
             if delay != 0:
-                time.sleep(delay)
+                clock.sleep(delay)
+            if self.settle != None:
+                self.lastSettle = self.waitSettled(switch)
             
             reading = self.read()                 #perform reading
 
@@ -256,25 +419,18 @@ class Daq3706:
                  raises exception if fails
         """
         try:
-            cmd = 'buffer = dmm.makebuffer(1)'
-            self.handle.write(cmd)
-            
-            cmd = 'dmm.measurecount = 1'
-            self.handle.write(cmd)
-    
-            cmd = 'print(dmm.measure(buffer))'
-            reslt = self.handle.ask(cmd)
+            with self.batch() as b:     #one message
+                b.write('buffer = dmm.makebuffer(1)')
+                b.write('dmm.measurecount = 1')
+                reslt = b.ask('print(dmm.measure(buffer))', float)
+                b.write('buffer=nil')   #delete buffer
         except:
             print('Daq3706.read() failed !')
             raise
-        try:
-            cmd = 'buffer=nil'          #delete buffer
-            self.handle.write(cmd)
-            reading = float(reslt)
-        except:
+        if reslt.exception() != None:
             print('Daq3706.read() reading conversion to float failed !')
             return False
-        return reading
+        return reslt.result()
 
     def setTimeout(self, timeout):
         """
@@ -370,6 +526,7 @@ class Daq3706:
             
 #==================================================================
 if __name__ == '__main__':      #self test   
+    import backend      #VISA_BACKEND=sim runs on emulators
 
     visaName = 'K3706'     #default VISA name for selftest
 
@@ -384,7 +541,7 @@ if __name__ == '__main__':      #self test
     """
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -399,9 +556,9 @@ if __name__ == '__main__':      #self test
     reslt = False
     try:
         dvm.controlSwitch(1001, True)
-        time.sleep(.1)        
+        clock.sleep(.1)        
         dvm.controlSwitch(1001, False)
-        time.sleep(.1)        
+        clock.sleep(.1)        
 
         if dvm.configDmm('dcvolts', 10, 1):  #fnc, rng, NPLC
             v = dvm.readSwitch(1001)
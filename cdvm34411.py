@@ -5,12 +5,28 @@ cdvm34411.py (C) J.M.,rev.30-Jan-16
 copyr = 'cdvm34411.py (C) J.M.,rev.30-Jan-16'
 visaName = '34411A'     #default VISA name for selftest
 
-import sys, visa, time
+import sys
+import clock
+from batch import Batching
 
-class Dvm34411:
+class Dvm34411(Batching):
     """
     Class supporting creation of any number of independent device instances
     """
+    # ranges available for fixed range selection, ascending
+    rangeSteps = {'CAP' : (1e-9, 1e-8, 1e-7, 1e-6, 1e-5),
+                  'CURR:DC' : (1e-4, 1e-3, .01, .1, 1., 3.),
+                  'CURR:AC' : (1e-4, 1e-3, .01, .1, 1., 3.),
+                  'FRES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+                  'RES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+                  'VOLT:DC' : (.1, 1., 10., 100., 1000.),
+                  'VOLT:AC' : (.1, 1., 10., 100., 750.)}
+    overload = 9.9e37       #reading returned if out of range
+    memorySlots = (1, 2, 3, 4)      #*SAV/*RCL locations
+
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', '*TRG', 'ABOR', 'INIT:IMM'}
+
     def __init__(self, rm, visaName):
         """
         Constructor registers required visa name and resource manager handle
@@ -22,6 +38,9 @@ class Dvm34411:
         self.visaName = visaName
         self.handle = None
         self.timeout = 5       #default timeout value
+        self.func = 'VOLT:DC'  #last configured function
+        self.rng = 'AUTO'      #last configured range
+        self.nplc = None       #last configured NPLC, None - *RST default
     
     def open(self):
         """
@@ -32,12 +51,28 @@ class Dvm34411:
         """
         try:
             self.handle = self.rm.get_instrument(self.visaName)
+        except Exception:
+            print('Dvm34411.open() failed !')
+            raise
+        return self.reset()
+
+    def reset(self):
+        """
+        Bring the device to default state using *RST on the opened
+        session, wait until the reset is done, set ASCII output format
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        try:
             self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
+            self.handle.ask('*OPC?')
             self.handle.write(':FORM:DATA ASC')   #return ASCII
         except Exception:
-            print('Dvm34411.open() failed !')
+            print('Dvm34411.reset() failed !')
             raise
+        self.func = 'VOLT:DC'
+        self.rng = 'AUTO'
+        self.nplc = None
         return True
 
     def close(self):
@@ -55,6 +90,37 @@ class Dvm34411:
             raise
         return True
 
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: aborts pending
+        measurement, clears status and verifies no error is pending.
+        Configuration can't be undone, *RST is needed if commands other
+        than transient ones were written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        try:
+            if changed == None or [m for m in changed if m.startswith('INIT')]:
+                self.handle.write('ABOR')
+            self.handle.write('*CLS')
+        except Exception:
+            print('Dvm34411.softReset() failed !')
+            raise
+        if changed == None or [m for m in changed if m not in self.transient]:
+            return False        #configuration written, *RST restores it
+        try:
+            if self.handle.ask('*OPC?').strip() != '1':
+                return False
+            errors = self.handle.ask('SYST:ERR?').strip()
+        except Exception:
+            print('Dvm34411.softReset() verification failed !')
+            return False
+        return errors.startswith('+0') or errors.startswith('0')
+
     def config(self, func = 'VOLT:DC', rng = 'AUTO', nplc = 1, aZero = True):
         """
         DVM configuration - sets function, range and NPLC.
@@ -94,13 +160,14 @@ class Dvm34411:
         noRange = ('CON', 'DIOD', 'FREQ', 'PER', 'TEMP')
         if (func in noRange) == False:   #range selection supported
             if rng == 'AUTO':
-                rng = ':AUTO'
+                strRng = ':AUTO'
             else:
                 (minR, maxR) = ranges[func]     #min and max range 
                 if rng < minR or rng > maxR:
                     print('Dvm34411.config() illegal range !')
                     return False
-            rng = ' ' + str(rng)     #convert to string
+                strRng = rng
+            strRng = ' ' + str(strRng)     #convert to string
         
         hasNplc = ('VOLT:DC', 'CURR:DC', 'RES', 'FRES', 'TEMP')
         if (func in hasNplc) == True:
@@ -112,12 +179,12 @@ class Dvm34411:
         try:#switch function
             cmd = 'FUNC:ON "' + func + '"'
             self.handle.write(cmd)
-            time.sleep(.2)
+            clock.sleep(.2)
             #set range if supported
             if (func in noRange) == False:
-                cmd = func + ':RANGE' + rng            
+                cmd = func + ':RANGE' + strRng            
                 self.handle.write(cmd)
-                time.sleep(.2)
+                clock.sleep(.2)
             #set NPLC if supported
             if (func in hasNplc) == True:
                 cmd = func + ':NPLC ' + str(nplc)            
@@ -131,8 +198,30 @@ class Dvm34411:
         except Exception:
             print('Dvm34411.config() sending configuration failed !')
             raise
+        self.func = func
+        self.rng = rng
+        self.nplc = nplc
         return True
 
+    def readRange(self, scanList = None, func = None):
+        """
+        Read range used by the function, e.g. the one autorange
+        settled on
+        Input:  scanList - ignored, the DVM has no switches
+                func - function, default the last configured one
+        Returns: range as float if OK,
+                 raises exception if fails
+        """
+        if func == None:
+            func = self.func
+        try:
+            reading = self.handle.ask(func.upper() + ':RANGE?')
+            rng = float(reading)
+        except Exception:
+            print('Dvm34411.readRange() failed !')
+            raise
+        return rng
+
     def read(self):
         """
         Do a single reading.
@@ -142,13 +231,13 @@ class Dvm34411:
                  raises exception if fails
         """
         try:
-            cmd = 'SAMP:COUN 1'          
-            self.handle.write(cmd)                #one sample per trigger
-            self.handle.write('TRIG:SOUR BUS')  #triggered by command
-            self.handle.write('TRIG:COUN 1')    #one trigger to return to wait for trg
-            self.handle.write('INIT:IMM')       #DVM to "wait for trigger" 
-            self.handle.write('*TRG')
-            startTime = time.time()
+            with self.batch() as b:         #setup sent as one message
+                b.write('SAMP:COUN 1')      #one sample per trigger
+                b.write('TRIG:SOUR BUS')    #triggered by command
+                b.write('TRIG:COUN 1')      #one trigger to return to wait for trg
+                b.write('INIT:IMM')         #DVM to "wait for trigger"
+                b.write('*TRG')
+            startTime = clock.time()
             while True:                     #wait until measuring flag goes to 0
                 try:
                     measured = self.handle.ask("DATA:POIN?")
@@ -160,22 +249,25 @@ class Dvm34411:
                     print('Dvm34411:read() polling failed !')
                     raise
                 
-                if time.time() - startTime > self.timeout:
+                if clock.time() - startTime > self.timeout:
                     print('Dvm34411:read() timeout !')
                     return False
                 
-            time.sleep(1)  
+            clock.sleep(1)  
             reading = self.handle.ask('R? 1;')     #definite-Length block format
         except Exception:
             print('Dvm34411.read() failed !')
             raise
-        if reading[0] != '#':
-            print('Dvm34411.read() DLB format error - # expected !')
+        import scpiparse    #numpy only when samples are read
+        try:
+            rdg = scpiparse.parse(reading)
+        except ValueError as exc:
+            print('Dvm34411.read() format error - %s !' % exc)
+            return False
+        if len(rdg) != 1:
+            print('Dvm34411.read() %d readings returned !' % len(rdg))
             return False
-        digits = int(reading[1])
-        reading = reading[2 + digits:]
-        rdg = float(reading)
-        return rdg
+        return float(rdg[0])
     
     def startOverlapped(self, period, total):
         """ 
@@ -207,11 +299,11 @@ class Dvm34411:
         Input:    inst instrument handle
                   count number of samples to be taken
                   timeout - time within which the measurement shall be finished
-        Return:   measurement results as a list of float if OK
+        Return:   measurement results as list of float if OK
                   False if timeout or data format error 
                   rases exception if fails
         """
-        startTime = time.time()
+        startTime = clock.time()
         while True:         #wait until measuring flag goes to 0
             try:
                 measured = self.handle.ask(":DATA:POIN?;")
@@ -223,27 +315,22 @@ class Dvm34411:
                 print('Dvm34411.waitOverlappedDone() polling failed !')
                 raise
             
-            if time.time() - startTime > timeout:
+            if clock.time() - startTime > timeout:
                 print('Dvm34411.waitOverlappedDone() timeout !')
                 return False
             
-        samples = []        
-        for i in range(0, count):
-            try:
-                reading = self.handle.ask('R? 1;')     #definite-Length block format
-            except Exception: 
-                print('Dvm34411.Reading results failed !')
-                raise;
-            #DLB: '#' followed by number od decimal digits to follow
-            #the decimal number is length of data in bytes
-            if reading[0] != '#':
-                print('Dvm34411.DLB format error - # expected !')
-                return False
-            digits = int(reading[1])
-            reading = reading[2 + digits:]
-            samples.append(reading.strip())
-    
-        return samples
+        try:        #all samples in one definite-length block
+            reading = self.handle.ask('R? %d;' % count)
+        except Exception:
+            print('Dvm34411.Reading results failed !')
+            raise
+        import scpiparse    #numpy only when samples are read
+        try:
+            samples = scpiparse.parse(reading)
+        except ValueError as exc:
+            print('Dvm34411.waitOverlappedDone() format error - %s !' % exc)
+            return False
+        return samples.tolist()
     
     def setTimeout(self, timeout):
         """
@@ -256,9 +343,10 @@ class Dvm34411:
 # Selftest
 #==================================================================
 if __name__ == '__main__':      #self test   
+    import backend      #VISA_BACKEND=sim runs on emulators
     print(copyr)    
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -6,17 +6,24 @@ cgen33220.py (C) J.M.,rev.15-Jan-16
 copyr = 'cgen33220.py (C) J.M.,rev.15-Jan-16'
 genName = '33220A'    #default VISA name for self test
 
-import sys, time
-import visa
-# import visasim as visa     #simulator 
+import sys
+from batch import Batching
+from setcache import SetpointCache
 
-class Gen33220:
+class Gen33220(Batching):
     functions = ['SIN', 'SQU', 'RAMP', 'PULS', 'NOIS', 'DC', 'USER']
+    memorySlots = (1, 2, 3, 4)      #*SAV/*RCL locations
     
     """
     Class implementing SCPI control of Agilent U2722A source meter
     control via Agilent IO Libraries and VISA interface
     """
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', 'OUTP'}
+    # *RST values softReset() writes back, {mnemonic : command}
+    rstValues = {'FUNC' : 'FUNC SIN', 'FREQ' : 'FREQ 1000',
+                 'VOLT' : 'VOLT 0.1', 'VOLT:OFFSET' : 'VOLT:OFFSET 0'}
+
     def __init__(self, rm, visaName):
         """
         Constructor registers the visa name and resource manager handle
@@ -31,6 +38,7 @@ class Gen33220:
         self.handle = None
         self.maxV = 10          #max voltage for high impedance load
         self.function = 'SIN'   #default function
+        self.setpoints = SetpointCache()    #skips repeated settings
         
     def open(self):
         """
@@ -41,11 +49,26 @@ class Gen33220:
         """
         try:
             self.handle = self.rm.get_instrument(self.visaName)
-            self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
         except Exception:
             print('Gen33220.open() failed !')
             raise
+        return self.reset()
+
+    def reset(self):
+        """
+        Brings the device to default state using *RST on the opened
+        session, waits until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        self.setpoints.invalidate()
+        try:
+            self.handle.write('*RST')   #reset device to default
+            self.handle.ask('*OPC?')
+        except Exception:
+            print('Gen33220.reset() failed !')
+            raise
+        self.function = 'SIN'
         return True
 
     def close(self):
@@ -55,6 +78,7 @@ class Gen33220:
         Input:   None
         Returns: True if OK, raises exception if fails   
         """
+        self.setpoints.invalidate()
         if self.handle != None:
             try:
                 self.handle.write('*RST')
@@ -65,6 +89,48 @@ class Gen33220:
                 raise
         return True
     
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: switches output off,
+        writes *RST values back to the changed function, frequency and
+        voltages, clears status and verifies no error is pending. *RST
+        is needed if commands other than those were written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        self.setpoints.invalidate()
+        try:
+            if changed == None or [m for m in changed if m.startswith('OUTP')]:
+                self.handle.write('OUTP OFF')
+            restore = [cmd for (m, cmd) in sorted(self.rstValues.items())
+                       if changed == None or m in changed]
+            if len(restore) > 0:
+                with self.batch() as b:     #one message
+                    for cmd in restore:
+                        b.write(cmd)
+            if changed == None or 'FUNC' in changed:
+                self.function = 'SIN'
+            self.handle.write('*CLS')
+        except Exception:
+            print('Gen33220.softReset() failed !')
+            raise
+        if changed == None or [m for m in changed
+                               if m not in self.transient
+                               and m not in self.rstValues]:
+            return False        #configuration written, *RST restores it
+        try:
+            if self.handle.ask('*OPC?').strip() != '1':
+                return False
+            errors = self.handle.ask('SYST:ERR?').strip()
+        except Exception:
+            print('Gen33220.softReset() verification failed !')
+            return False
+        return errors.startswith('+0') or errors.startswith('0')
+
     def setVoltage(self, ppAmp, offs):
         """ 
         Set output pp voltage and DC offset to given values.
@@ -83,10 +149,10 @@ class Gen33220:
             
         try:
             cmd = 'VOLT ' + str(ppAmp)
-            self.handle.write(cmd)     #sets sampling period
-            
+            self.setpoints.write(self.handle, ('VOLT', None), cmd)
+
             cmd = 'VOLT:OFFSET ' + str(offs)
-            self.handle.write(cmd)     #sets sampling period
+            self.setpoints.write(self.handle, ('VOLT:OFFS', None), cmd)
         except Exception:
             print('Gen33220.setVoltage() failed !')
             raise
@@ -120,7 +186,7 @@ class Gen33220:
         
         try:
             cmd = 'FREQ ' + str(freq)
-            self.handle.write(cmd)     #sets frequency
+            self.setpoints.write(self.handle, ('FREQ', None), cmd)
         except Exception:
             print('Gen33220.setFrequency() failed !')
             raise
@@ -138,7 +204,7 @@ class Gen33220:
         else:
             cmd = 'OUTP OFF, '
         try:
-            self.handle.write(cmd)
+            self.handle.write(cmd)  #not cached, protection may switch off
         except Exception:
             print('Gen33220.enableOutput() set state failed !')        
             raise    
@@ -155,8 +221,9 @@ class Gen33220:
         if function in self.functions:
             self.function = function        #memorize it
             cmd = 'FUNC ' + function 
-            try:
-                self.handle.write(cmd)
+            try:        #function change may limit frequency and amplitude
+                self.setpoints.write(self.handle, ('FUNC', None), cmd,
+                                     clears = True)
             except Exception:
                 print('Gen33220.selectFunction() function selection failed !')
                 raise
@@ -184,10 +251,11 @@ class Gen33220:
 # Class self test to be run from command line
 #============================================
 if __name__ == '__main__':      #if run from cmd line
+    import backend      #VISA_BACKEND=sim runs on emulators
     print(copyr)
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -6,13 +6,23 @@ csrcHmp4030.py (C) J.M.,rev.13-Jan-1
 copyr = 'csrcHmp4030.py (C) J.M.,rev.13-Jan-16'
 srcName = 'HMP4030'    #default VISA name for selftest
 
-import sys, visa, time
+import sys
+import clock
+from batch import Batching
+from setcache import SetpointCache
 
-class Hmp4030:
+class Hmp4030(Batching):
     """
     Class implementing SCPI control of Hameg HMP4030 power source
     control via Agilent IO Libraries and VISA interface
     """
+    memorySlots = (1, 2, 3, 4, 5, 6, 7, 8, 9)   #*SAV/*RCL locations
+
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', 'INST', 'OUTP:GEN', 'OUTP:SEL'}
+    # *RST values softReset() writes back to each channel, {mnemonic : command}
+    rstValues = {'VOLT' : 'VOLT 0', 'CURR' : 'CURR 0.1'}
+
     def __init__(self, rm, visaName):
         """
         Constructor registers the visa name and resource manager handle
@@ -26,6 +36,7 @@ class Hmp4030:
         self.rm = rm
         self.visaName = visaName
         self.handle = None
+        self.setpoints = SetpointCache()    #skips repeated settings
         
     def open(self):
         """
@@ -36,11 +47,25 @@ class Hmp4030:
         """
         try:
             self.handle = self.rm.get_instrument(self.visaName)
-            self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
         except Exception:
             print('Hmp4030.open() failed !')
             raise
+        return self.reset()
+
+    def reset(self):
+        """
+        Brings the device to default state using *RST on the opened
+        session, waits until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        self.setpoints.invalidate()
+        try:
+            self.handle.write('*RST')   #reset device to default
+            self.handle.ask('*OPC?')
+        except Exception:
+            print('Hmp4030.reset() failed !')
+            raise
         return True
 
     def close(self):
@@ -50,6 +75,7 @@ class Hmp4030:
         Input:  None
         Return: True if OK, raises exception if fails
         """
+        self.setpoints.invalidate()
         try:
             self.handle.write('*RST')
             self.handle.close()
@@ -59,6 +85,49 @@ class Hmp4030:
             raise
         return True
     
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: switches outputs off,
+        writes *RST values back to the changed voltage and current
+        setpoints of all channels, clears status and verifies no error
+        is pending. *RST is needed if commands other than those were
+        written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        self.setpoints.invalidate()
+        try:
+            if changed == None or [m for m in changed if m.startswith('OUTP')]:
+                self.handle.write('OUTP:GEN OFF;')
+            restore = [cmd for (m, cmd) in sorted(self.rstValues.items())
+                       if changed == None or m in changed]
+            if len(restore) > 0:
+                with self.batch() as b:     #one message
+                    for channel in (1, 2, 3):
+                        b.write('INST OUT%d' % channel)
+                        for cmd in restore:
+                            b.write(cmd)
+            self.handle.write('*CLS')
+        except Exception:
+            print('Hmp4030.softReset() failed !')
+            raise
+        if changed == None or [m for m in changed
+                               if m not in self.transient
+                               and m not in self.rstValues]:
+            return False        #configuration written, *RST restores it
+        try:
+            if self.handle.ask('*OPC?').strip() != '1':
+                return False
+            errors = self.handle.ask('SYST:ERR?').strip()
+        except Exception:
+            print('Hmp4030.softReset() verification failed !')
+            return False
+        return errors.startswith('+0') or errors.startswith('0')
+
     def setVoltage(self, channel, voltage):
         """ 
         Set channel voltage to given value
@@ -71,9 +140,9 @@ class Hmp4030:
         try:
             cmd = 'OUT%d' % channel
             cmd = 'INST ' + cmd + ';'
-            self.handle.write(cmd)     #selects source channel
+            self.setpoints.write(self.handle, ('INST', None), cmd)
             cmd = 'VOLT %f;' % voltage
-            self.handle.write(cmd)     
+            self.setpoints.write(self.handle, ('VOLT', channel), cmd)
         except Exception:
             print('HMP4030.setVoltage() failed !')
             raise
@@ -91,11 +160,10 @@ class Hmp4030:
         try:
             cmd = 'OUT%d' % (channel)
             cmd = 'INST ' + cmd + ';'
-            self.handle.write(cmd)     #selects source channel
-            time.sleep(.1)
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(.2)     #selects source channel
             cmd = 'CURR %f;' % (current)
-            time.sleep(.1)
-            self.handle.write(cmd)    
+            self.setpoints.write(self.handle, ('CURR', channel), cmd)
         except Exception:
             print('HMP4030:setCurrent() !')
             raise
@@ -116,16 +184,15 @@ class Hmp4030:
         """
         try:
             for i in range(0, 3):
-                cmd = 'INST '
-                cmd = cmd + ('OUT%d;' % (i + 1))
-                self.handle.write(cmd)     #selects sequentially all channels
-                time.sleep(0.1)
-                cmd = 'OUTP:SEL '    
+                cmd = 'OUTP:SEL '
                 if (mask & 1<<i) != 0:
                     cmd = cmd + '1;'        #activate
                 else:
                     cmd = cmd + '0;'        #deactivate
-                self.handle.write(cmd)     #on/off selected channel
+                select = 'INST OUT%d;' % (i + 1)
+                if self.setpoints.write(self.handle, ('INST', None), select):
+                    clock.sleep(0.1)        #selects sequentially channels
+                self.handle.write(cmd)      #not cached, fuse trip deselects
         except Exception:
             print('HMP4030:setOutput() selection failed !')
             raise
@@ -136,7 +203,7 @@ class Hmp4030:
         else:
             cmd = cmd + 'OFF;'
         try:
-            self.handle.write(cmd)
+            self.handle.write(cmd)      #not cached, trip switches it off
         except Exception:
             print('HMP4030.setOutput() set state failed !')        
             raise    
@@ -147,6 +214,7 @@ class Hmp4030:
         Send command to the source
         Input: cmd - SCPI string
         """
+        self.setpoints.invalidate()     #unknown effect
         try:
             self.handle.write(cmd)
         except Exception:
@@ -156,10 +224,11 @@ class Hmp4030:
 # Class self test to be run from command line
 #=========================
 if __name__ == '__main__':      #if run from cmd line
+    import backend      #VISA_BACKEND=sim runs on emulators
     print(copyr)
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -175,7 +244,7 @@ if __name__ == '__main__':      #if run from cmd line
         src.setCurrent(1, .5)       #channel 1 current to 0.5A
         src.enableOutputs(5, True)  #enable channels 1 and 3
                     
-        time.sleep(3)
+        clock.sleep(3)
 
         src.enableOutputs(5, False) #disable them again 
     except Exception:
@@ -0,0 +1,174 @@
+"""
+Pluggable clock used by drivers and test sequences for sleeping and
+timeouts. System clock by default, virtual clock for dry runs: sleeps
+only advance simulated time, so a whole board sequence runs in
+milliseconds and elapsed() still tells the time it would take.
+Threads sleeping concurrently overlap in virtual time as in real time,
+the thread which joined them calls sync() to continue after the latest.
+Use: clock.setClock(clock.VirtualClock()) before drivers are used
+clock.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'clock.py (C) J.M.,rev.18-Oct-26'
+
+import sys
+import threading
+import time as systime
+
+class SystemClock:
+    """
+    Real time and real sleeping
+    """
+    def time(self):
+        """
+        Returns: time in s
+        """
+        return systime.time()
+
+    def sleep(self, seconds):
+        """
+        Input:  seconds - time to wait
+        """
+        if seconds > 0:
+            systime.sleep(seconds)
+
+    def sync(self):
+        """
+        Nothing to do, real time is common to all threads
+        """
+        pass
+
+class VirtualClock:
+    """
+    Simulated time in seconds. Advances only when time is spent,
+    sleeping does not wait. Each thread has its own time, a new thread
+    starts at the time of the main thread, so sleeps of concurrent
+    threads overlap instead of adding up.
+    """
+    def __init__(self):
+        self.now = 0.                       #latest time of all threads
+        self.mainNow = 0.                   #time of the main thread
+        self.threads = threading.local()    #time of the calling thread
+        self.lock = threading.Lock()
+
+    def time(self):
+        """
+        Returns: simulated time of the calling thread in s
+        """
+        return getattr(self.threads, 'now', self.mainNow)
+
+    def setTime(self, now):
+        """
+        Sets time of the calling thread, the lock has to be held
+        """
+        self.threads.now = now
+        if threading.current_thread() is threading.main_thread():
+            self.mainNow = now
+        self.now = max(self.now, now)
+
+    def sleep(self, seconds):
+        """
+        Advances simulated time of the calling thread instead of waiting
+        Input:  seconds - time spent
+        """
+        if seconds > 0:
+            with self.lock:
+                self.setTime(self.time() + seconds)
+
+    def sync(self):
+        """
+        Brings the calling thread to the latest time of all threads,
+        e.g. after waiting for threads which slept
+        """
+        with self.lock:
+            self.setTime(self.now)
+
+active = SystemClock()          #clock used by time() and sleep()
+startTime = active.time()       #reference of elapsed()
+listeners = []                  #functions called with time of each sleep()
+
+def setClock(clk):
+    """
+    Select clock used by drivers, restarts elapsed()
+    Input:  clk - SystemClock or VirtualClock instance
+    Return: none
+    """
+    global active, startTime
+    active = clk
+    startTime = clk.time()
+
+def getClock():
+    """
+    Return: active clock
+    """
+    return active
+
+def time():
+    """
+    Return: time of active clock in s
+    """
+    return active.time()
+
+def sleep(seconds):
+    """
+    Wait on active clock, report the sleep to listeners
+    Input:  seconds - time to wait
+    """
+    for listener in listeners:
+        listener(seconds)
+    active.sleep(seconds)
+
+def sync():
+    """
+    Continue after the latest time of threads using the active clock,
+    called by the thread which waited for them
+    Return: none
+    """
+    active.sync()
+
+def addListener(listener):
+    """
+    Register function accounting sleeps
+    Input:  listener - function called with seconds of each sleep()
+    Return: none
+    """
+    listeners.append(listener)
+
+def removeListener(listener):
+    """
+    Unregister function registered by addListener()
+    """
+    if listener in listeners:
+        listeners.remove(listener)
+
+def elapsed():
+    """
+    Return: time since setClock() or import in s, simulated with
+            virtual clock
+    """
+    return active.time() - startTime
+
+
+# Self test
+# ==========
+if __name__ == '__main__':
+    print(copyr)
+    setClock(VirtualClock())
+    for i in range(100):
+        sleep(.5)
+    print('Simulated %.1f s' % elapsed())
+    if elapsed() != 50.:
+        print('Done with error !')
+        sys.exit(2)
+    threads = [threading.Thread(target = sleep, args = (t,))
+               for t in (1., 2., 3.)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sync()
+    print('Concurrent sleeps %.1f s' % elapsed())
+    if elapsed() != 53.:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
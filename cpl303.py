@@ -6,13 +6,24 @@ cpl303.py (C) J.M.,rev.19-Jan-16
 copyr = 'cpl303.py (C) J.M.,rev.19-Jan-16'
 srcName = 'ASRL4'    #default VISA name for selftest
 
-import sys, visa, time
+import sys
+import clock
+from batch import Batching
+from setcache import SetpointCache
 
-class Pl303:
+class Pl303(Batching):
     """
     Class implementing SCPI control of TTI PL303 power source
     control via Agilent IO Libraries and VISA interface
     """
+    batchSeparator = ';'    #commands are not SCPI tree, no ':' prefix
+
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', 'OP1', 'OP2'}
+    # *RST values softReset() writes back, {mnemonic : command}
+    rstValues = {'V1' : 'V1 0', 'V2' : 'V2 0',
+                 'I1' : 'I1 0.1', 'I2' : 'I2 0.1'}
+
     def __init__(self, rm, visaName):
         """
         Constructor registers the visa name and resource manager handle
@@ -26,6 +37,7 @@ class Pl303:
         self.rm = rm
         self.visaName = visaName
         self.handle = None
+        self.setpoints = SetpointCache()    #skips repeated settings
         
     def open(self):
         """
@@ -36,11 +48,25 @@ class Pl303:
         """
         try:
             self.handle = self.rm.get_instrument(self.visaName)
-            self.handle.write('*RST\n')   #reset device to default
-            time.sleep(.5)
         except Exception:
             print('Pl303.open() failed !')
             raise
+        return self.reset()
+
+    def reset(self):
+        """
+        Brings the device to default state using *RST on the opened
+        session, waits until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        self.setpoints.invalidate()
+        try:
+            self.handle.write('*RST\n')   #reset device to default
+            self.handle.ask('*OPC?\n')
+        except Exception:
+            print('Pl303.reset() failed !')
+            raise
         return True
 
     def close(self):
@@ -50,6 +76,7 @@ class Pl303:
         Input:  None
         Return: True if OK, raises exception if fails
         """
+        self.setpoints.invalidate()
         try:
             self.handle.write('*RST\n')
             self.handle.close()
@@ -59,6 +86,44 @@ class Pl303:
             raise
         return True
     
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: switches outputs off,
+        writes *RST values back to the changed voltage and current
+        setpoints, clears status and verifies the supply responds.
+        *RST is needed if commands other than those were written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        self.setpoints.invalidate()
+        try:
+            for channel in (1, 2):
+                if changed == None or 'OP%d' % channel in changed:
+                    self.handle.write('OP%d 0\n' % channel)
+            restore = [cmd for (m, cmd) in sorted(self.rstValues.items())
+                       if changed == None or m in changed]
+            if len(restore) > 0:
+                with self.batch() as b:     #one message
+                    for cmd in restore:
+                        b.write(cmd)
+            self.handle.write('*CLS\n')
+        except Exception:
+            print('Pl303.softReset() failed !')
+            raise
+        if changed == None or [m for m in changed
+                               if m not in self.transient
+                               and m not in self.rstValues]:
+            return False        #configuration written, *RST restores it
+        try:
+            return self.handle.ask('*OPC?\n').strip() == '1'
+        except Exception:
+            print('Pl303.softReset() verification failed !')
+            return False
+
     def setVoltage(self, channel, voltage):
         """ 
         Set channel voltage to given value
@@ -70,7 +135,7 @@ class Pl303:
         """
         try:
             cmd = 'V%d %f\n' % (channel, voltage)
-            self.handle.write(cmd)    
+            self.setpoints.write(self.handle, ('V', channel), cmd)
         except Exception:
             print('Pl303.setVoltage() failed !')
             raise
@@ -106,7 +171,7 @@ class Pl303:
         """
         try:
             cmd = 'OVP%d %f\n' % (channel, voltage)
-            self.handle.write(cmd)    
+            self.setpoints.write(self.handle, ('OVP', channel), cmd)
         except Exception:
             print('Pl303.setVoltage() failed !')
             raise
@@ -123,7 +188,7 @@ class Pl303:
         """
         try:
             cmd = 'I%d %f\n' % (channel, current)
-            self.handle.write(cmd)     
+            self.setpoints.write(self.handle, ('I', channel), cmd)
         except Exception:
             print('Pl303:setCurrent() !')
             raise
@@ -159,7 +224,7 @@ class Pl303:
         """
         try:
             cmd = 'OCP%d %f\n' % (channel, current)
-            self.handle.write(cmd)     
+            self.setpoints.write(self.handle, ('OCP', channel), cmd)
         except Exception:
             print('Pl303:setCurrent() !')
             raise
@@ -181,7 +246,7 @@ class Pl303:
             state = 0
         try:
             cmd = 'OP%d %d\n' % (channel, state)
-            self.handle.write(cmd)     #on/off selected channel
+            self.handle.write(cmd)  #not cached, trip switches output off
         except Exception:
             print('Pl303:enableOutput() selection failed !')
             raise
@@ -190,10 +255,11 @@ class Pl303:
 # Class self test to be run from command line
 #=========================
 if __name__ == '__main__':      #if run from cmd line
+    import backend      #VISA_BACKEND=sim runs on emulators
     print(copyr)
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -208,7 +274,7 @@ if __name__ == '__main__':      #if run from cmd line
         print('V = %f V' % v)
         i = src.getCurrent(1)
         print('I = %f A' % i)
-        time.sleep(3)
+        clock.sleep(3)
 
         src.enableOutput(1, False) #disable them again 
     except Exception:
@@ -6,15 +6,25 @@ csrc2722.py (C) J.M.,rev.5-Feb-16
 copyr = 'csrc2722.py (C) J.M.,rev.5-Feb-16'
 srcName = '2722A'    #default VISA name for self test
 
-import sys, time
-import visa
-# import visasim as visa     #simulator 
+import sys
+import clock
+from batch import Batching
+from setcache import SetpointCache
 
-class Src2722:
+class Src2722(Batching):
     """
     Class implementing SCPI control of Agilent U2722A source meter
     control via Agilent IO Libraries and VISA interface
     """
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', 'OUTP'}
+    # *RST values softReset() writes back to each channel, {mnemonic : command}
+    rstValues = {'CURR' : 'CURR 0.1, (@%d)',
+                 'CURR:LIM' : 'CURR:LIM 0.1, (@%d)',
+                 'CURR:RANG' : 'CURR:RANG R120mA, (@%d)',
+                 'VOLT' : 'VOLT 0, (@%d)', 'VOLT:LIM' : 'VOLT:LIM 20, (@%d)',
+                 'VOLT:RANG' : 'VOLT:RANG R20V, (@%d)'}
+
     def __init__(self, rm, visaName):
         """
         Constructor registers the visa name and resource manager handle
@@ -27,6 +37,7 @@ class Src2722:
         self.rm = rm
         self.visaName = visaName
         self.handle = None
+        self.setpoints = SetpointCache()    #skips repeated settings
         
     def open(self):
         """
@@ -37,11 +48,25 @@ class Src2722:
         """
         try:
             self.handle = self.rm.get_instrument(self.visaName)
-            self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
         except Exception:
             print('Src2722.open() failed !')
             raise
+        return self.reset()
+
+    def reset(self):
+        """
+        Brings the device to default state using *RST on the opened
+        session, waits until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        self.setpoints.invalidate()
+        try:
+            self.handle.write('*RST')   #reset device to default
+            self.handle.ask('*OPC?')
+        except Exception:
+            print('Src2722.reset() failed !')
+            raise
         return True
 
     def close(self):
@@ -51,6 +76,7 @@ class Src2722:
         Input:   None
         Returns: True if OK, raises exception if fails   
         """
+        self.setpoints.invalidate()
         if self.handle != None:
             try:
                 self.handle.write('*RST')
@@ -61,6 +87,48 @@ class Src2722:
                 raise
         return True
     
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: switches outputs off,
+        writes *RST values back for the changed settings of all channels,
+        clears status and verifies no error is pending. *RST is needed
+        if commands other than those were written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        self.setpoints.invalidate()
+        try:
+            if changed == None or [m for m in changed if m.startswith('OUTP')]:
+                self.handle.write('OUTP 0, (@1:3)')
+            restore = [cmd for (m, cmd) in sorted(self.rstValues.items())
+                       if changed == None or m in changed or
+                       (m == 'VOLT' and 'CURR' in changed)]  #voltage mode
+            if len(restore) > 0:
+                with self.batch() as b:     #one message
+                    for channel in (1, 2, 3):
+                        for cmd in restore:
+                            b.write(cmd % channel)
+            self.handle.write('*CLS')
+        except Exception:
+            print('Src2722.softReset() failed !')
+            raise
+        if changed == None or [m for m in changed
+                               if m not in self.transient
+                               and m not in self.rstValues]:
+            return False        #configuration written, *RST restores it
+        try:
+            if self.handle.ask('*OPC?').strip() != '1':
+                return False
+            errors = self.handle.ask('SYST:ERR?').strip()
+        except Exception:
+            print('Src2722.softReset() verification failed !')
+            return False
+        return errors.startswith('+0') or errors.startswith('0')
+
     def setVoltage(self, channel, voltage):
         """ 
         Set channel voltage to given value. Keeps actual channel configuration.
@@ -75,7 +143,7 @@ class Src2722:
             return False
         try:
             cmd = 'VOLT ' + str(voltage) + ', ' + strChnl
-            self.handle.write(cmd)     #sets sampling period
+            self.setpoints.write(self.handle, ('VOLT', channel), cmd)
         except Exception:
             print('Src2722.setVoltage() failed !')
             raise
@@ -95,7 +163,7 @@ class Src2722:
             return False
         try:
             cmd = 'CURR ' + str(current) + ', ' + strChnl
-            self.handle.write(cmd)     #sets sampling period
+            self.setpoints.write(self.handle, ('CURR', channel), cmd)
         except Exception:
             print('Src2722:setCurrent() failed !')
             raise
@@ -119,7 +187,7 @@ class Src2722:
             cmd = 'OUTP 0, '
         cmd = cmd + strChnl
         try:
-            self.handle.write(cmd)
+            self.handle.write(cmd)  #not cached, protection may switch off
         except Exception:
             print('Src2722.setOutput() set state failed !')        
             raise    
@@ -151,21 +219,22 @@ class Src2722:
             return False
         #Checks OK - send setting commands
         try:
-            if abs(volt) <= 2.:
-                cmd = 'VOLT:RANG R2V, '
-            else:
-                cmd = 'VOLT:RANG R20V, '
-            cmd += strChnl
-            self.handle.write(cmd)
-            
-            cmd = "VOLT " + str(volt) + ',' + strChnl
-            self.handle.write(cmd)
+            with self.batch() as b:     #one message
+                if abs(volt) <= 2.:
+                    cmd = 'VOLT:RANG R2V, '
+                else:
+                    cmd = 'VOLT:RANG R20V, '
+                cmd += strChnl
+                b.write(cmd)
 
-            cmd = "CURR:RANG " + strRange + ',' + strChnl            
-            self.handle.write(cmd)
+                cmd = "VOLT " + str(volt) + ',' + strChnl
+                b.write(cmd)
 
-            cmd = "CURR:LIM " + str(currLimit) + ',' + strChnl            
-            self.handle.write(cmd)
+                cmd = "CURR:RANG " + strRange + ',' + strChnl
+                b.write(cmd)
+
+                cmd = "CURR:LIM " + str(currLimit) + ',' + strChnl
+                b.write(cmd)
         except Exception:
             print('Src2722.config() sending configuration failed !')
             raise
@@ -194,6 +263,7 @@ class Src2722:
             print('Src2722.configSrc() invalid current range !')
             return False
         #Checks OK - send setting commands
+        self.setpoints.invalidate(channel)
         try:
             cmd = "CURR:RANG " + strRange + ',' + strChnl            
             self.handle.write(cmd)
@@ -302,10 +372,10 @@ class Src2722:
         Input:    inst instrument handle
                   count number of samples to be taken
                   timeout - time within which the measurement shall be finished
-        Return:   measurement results as a list
+        Return:   measurement results as list of float
                   False if error
         """
-        startTime = time.time()
+        startTime = clock.time()
         while True:         #wait until measuring flag goes to 0
             try:
                 measured = self.handle.ask(":DATA:POIN?;")
@@ -317,35 +387,31 @@ class Src2722:
                 print('Src2722.waitOverlappedDone() polling failed !')
                 return False
             
-            if time.time() - startTime > timeout:
+            if clock.time() - startTime > timeout:
                 print('Src2722.waitOverlappedDone() timeout !')
                 return False
             
-        samples = []        
-        for i in range(0, count):
-            try:
-                reading = self.handle.ask('R? 1;')     #definite-Length block format
-            except Exception: 
-                print('Src2722.Reading results failed !')
-                return False;
-            #DLB: '#' followed by number od decimal digits to follow
-            #the decimal number is length of data in bytes
-            if reading[0] != '#':
-                print('Src2722.DLB format error - # expected !')
-                return False
-            digits = int(reading[1])
-            reading = reading[2 + digits:]
-            samples.append(reading.strip())
-    
-        return samples
+        try:        #all samples in one definite-length block
+            reading = self.handle.ask('R? %d;' % count)
+        except Exception:
+            print('Src2722.Reading results failed !')
+            return False
+        import scpiparse    #numpy only when samples are read
+        try:
+            samples = scpiparse.parse(reading)
+        except ValueError as exc:
+            print('Src2722.waitOverlappedDone() format error - %s !' % exc)
+            return False
+        return samples.tolist()
     
 # Class self test to be run from command line
 #=========================
 if __name__ == '__main__':      #if run from cmd line
+    import backend      #VISA_BACKEND=sim runs on emulators
     print(copyr)
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -9,13 +9,23 @@ copyr = 'csrcHameg.py (C) J.M.,rev.16-Oct-15'
 srcName = 'ASRL10'      #VISA name for USB
 #srcName = 'HMP4030'     #VISA name for LAN
 
-import sys, visa, time
+import sys
+import clock
+from batch import Batching
+from setcache import SetpointCache
 
-class SrcHameg:
+class SrcHameg(Batching):
     """
     Class implementing SCPI control of Hameg HMP4030 power source
     control via Agilent IO Libraries and VISA interface
     """
+    memorySlots = (1, 2, 3, 4, 5, 6, 7, 8, 9)   #*SAV/*RCL locations
+
+    # mnemonics of commands softReset() undoes or leaving no setting
+    transient = {'*CLS', '*RST', 'INST', 'OUTP:GEN', 'OUTP:SEL'}
+    # *RST values softReset() writes back to each channel, {mnemonic : command}
+    rstValues = {'VOLT' : 'VOLT 0', 'CURR' : 'CURR 0.1'}
+
     def __init__(self, rm, visaName, nrOfChannels = 3):
         """
         Constructor registers the visa name and resource manager handle
@@ -32,6 +42,7 @@ class SrcHameg:
         self.handle = None
         self.channels = nrOfChannels
         self.opened = False
+        self.setpoints = SetpointCache()    #skips repeated settings
         
     def open(self):
         """
@@ -43,15 +54,30 @@ class SrcHameg:
         try:
             self.handle = self.rm.get_instrument(self.visaName)
             self.handle.term_chars = '\n'
-            self.handle.write('*RST')   #reset device to default
-            time.sleep(.5)
         except Exception:
             print('SrcHameg.open() failed !')
             raise
+        self.reset()
         print("%s opened !" % self.visaName)
         self.opened = True
         return True
 
+    def reset(self):
+        """
+        Brings the device to default state using *RST on the opened
+        session, waits until the reset is done
+        Input:  none
+        Output: True if OK, raises exception if failed
+        """
+        self.setpoints.invalidate()
+        try:
+            self.handle.write('*RST')   #reset device to default
+            self.handle.ask('*OPC?')
+        except Exception:
+            print('SrcHameg.reset() failed !')
+            raise
+        return True
+
     def close(self):
         """
         Brings the device back to default state using *RST,
@@ -59,6 +85,7 @@ class SrcHameg:
         Input:  None
         Return: True if OK, raises exception if fails
         """
+        self.setpoints.invalidate()
         if self.opened:
             try:
                 self.handle.write('*RST')
@@ -69,6 +96,51 @@ class SrcHameg:
                 raise
         return True
     
+    def softReset(self, changed = None):
+        """
+        Fast alternative to *RST between boards: switches outputs off,
+        writes *RST values back to the changed voltage and current
+        setpoints of all channels, clears status and verifies no error
+        is pending. *RST is needed if commands other than those were
+        written.
+        Input:  changed - mnemonics of commands written since the last
+                          reset, None - unknown, undo what can be
+                          undone and return False
+        Returns: True if instrument clean, False if *RST needed
+        """
+        if changed != None and len(changed) == 0:
+            return True
+        self.setpoints.invalidate()
+        try:
+            if changed == None or [m for m in changed if m.startswith('OUTP')]:
+                self.handle.write('OUTP:GEN 0')
+            restore = [cmd for (m, cmd) in sorted(self.rstValues.items())
+                       if changed == None or m in changed]
+            for channel in range(1, self.channels + 1):
+                if len(restore) == 0:
+                    break
+                with self.batch() as b:     #one message per channel
+                    b.write('INST OUTP%d' % channel)
+                    for cmd in restore:
+                        b.write(cmd)
+                clock.sleep(0.1)
+            self.handle.write('*CLS')
+        except Exception:
+            print('SrcHameg.softReset() failed !')
+            raise
+        if changed == None or [m for m in changed
+                               if m not in self.transient
+                               and m not in self.rstValues]:
+            return False        #configuration written, *RST restores it
+        try:
+            if self.handle.ask('*OPC?').strip() != '1':
+                return False
+            errors = self.handle.ask('SYST:ERR?').strip()
+        except Exception:
+            print('SrcHameg.softReset() verification failed !')
+            return False
+        return errors.startswith('+0') or errors.startswith('0')
+
     def setVoltage(self, channel, voltage):
         """ 
         Set channel voltage to given value
@@ -82,13 +154,13 @@ class SrcHameg:
             print('SrcHameg.setVoltage() - illegal channel !')
             raise
         try:
-            cmd = 'INST OUTP%d' % channel
-            self.handle.write(cmd)     #selects source channel
-            time.sleep(0.1)
+            cmd = 'INST OUTP%d' % channel   #selects source channel
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(0.1)
             
             cmd = 'VOLT %.3f' % voltage
-            self.handle.write(cmd)     
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('VOLT', channel), cmd):
+                clock.sleep(0.1)
         except Exception:
             print('SrcHameg.setVoltage() failed !')
             raise
@@ -109,12 +181,12 @@ class SrcHameg:
         try:
             cmd = 'OUTP%d' % (channel)
             cmd = 'INST ' + cmd + ';'
-            self.handle.write(cmd)     #selects source channel
-            time.sleep(.1)
-            
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(.1)     #selects source channel
+
             cmd = 'CURR %.3f' % (current)
-            self.handle.write(cmd)    
-            time.sleep(.1)
+            if self.setpoints.write(self.handle, ('CURR', channel), cmd):
+                clock.sleep(.1)
         except Exception:
             print('SrcHameg.setCurrent() !')
             raise
@@ -136,23 +208,23 @@ class SrcHameg:
         try:
             bit = 1
             for i in range(1, self.channels + 1):
-                cmd = 'INST OUTP%d' % i
-                self.handle.write(cmd)     
-                time.sleep(0.1)
                 if (mask & bit != 0):
                     cmd = 'OUTP:SEL 1'
                 else:
                     cmd = 'OUTP:SEL 0'
-                self.handle.write(cmd)
-                time.sleep(0.1)
+                select = 'INST OUTP%d' % i
+                if self.setpoints.write(self.handle, ('INST', None), select):
+                    clock.sleep(0.1)
+                self.handle.write(cmd)  #not cached, fuse trip deselects
+                clock.sleep(0.1)
                 bit *= 2
             cmd = 'OUTP:GEN '
             if state == True:
                 cmd = cmd + '1'
             else:
                 cmd = cmd + '0'
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            self.handle.write(cmd)      #not cached, trip switches it off
+            clock.sleep(0.1)
         except Exception:
             print('SrcHameg.setOutput() failed !')        
             raise    
@@ -173,16 +245,16 @@ class SrcHameg:
 
         try:
             cmd = "INST OUTP%d" % channel   #select channel
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(0.1)
             
             cmd = "VOLT:PROT %f" % volt
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('VOLT:PROT', channel), cmd):
+                clock.sleep(0.1)
 
             cmd = "CURR %f" % currLimit
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('CURR', channel), cmd):
+                clock.sleep(0.1)
         except Exception:
             print('SrcHameg.configVoltSrc() sending configuration failed !')
             raise
@@ -203,16 +275,16 @@ class SrcHameg:
 
         try:
             cmd = "INST OUTP%d" % channel   #select channel
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(0.1)
 
             cmd = "VOLT:PROT %f" % voltLimit
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('VOLT:PROT', channel), cmd):
+                clock.sleep(0.1)
 
             cmd = "CURR %f" + current            
             self.handle.write(cmd)
-            time.sleep(0.1)
+            clock.sleep(0.1)
 
         except Exception:
             print('SrcHameg.configCurrSrc() sending configuration failed !')
@@ -233,8 +305,8 @@ class SrcHameg:
 
         try:
             cmd = "INST OUTP%d" % channel   #select channel
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(0.1)
 
             cmd = 'MEAS:CURR?' 
             rdg = self.handle.ask(cmd)
@@ -262,8 +334,8 @@ class SrcHameg:
 
         try:
             cmd = 'INST OUTP%d' % channel   #select channel
-            self.handle.write(cmd)
-            time.sleep(0.1)
+            if self.setpoints.write(self.handle, ('INST', None), cmd):
+                clock.sleep(0.1)
 
             cmd = 'MEAS:VOLT?'           
             rdg = self.handle.ask(cmd)
@@ -282,6 +354,7 @@ class SrcHameg:
         Send command to the source
         Input: cmd - SCPI string
         """
+        self.setpoints.invalidate()     #unknown effect
         try:
             self.handle.write(cmd + '\n')
         except Exception:
@@ -291,10 +364,11 @@ class SrcHameg:
 # Class self test to be run from command line
 #=========================
 if __name__ == '__main__':      #if run from cmd line
+    import backend      #VISA_BACKEND=sim runs on emulators
     print(copyr)
     #open device with given VISA name
     try:
-        rm = visa.ResourceManager()     #get resource manager
+        rm = backend.resourceManager()     #get resource manager
     except Exception:
         print('Getting visa resource manager failed !')
         sys.exit(2)
@@ -316,7 +390,7 @@ if __name__ == '__main__':      #if run from cmd line
 
         src.enableOutputs(5, True)  #enable channels 1 and 3
                     
-        time.sleep(1)
+        clock.sleep(1)
         volt = src.readVoltage(1)
         curr = src.readCurrent(1)
         resl = 'V=%f, I=%f' % (volt, curr)
@@ -1,80 +1,432 @@
-import sys, time
-import visa
-import cdaq34972, csrc2722
-import rudp
+import sys, time, threading
+import clock, meters
+import cdaq34972, csrc2722      #re-exported, scripts do from error import *
+try:
+    import rudp                 #re-exported, SCU communication
+except ImportError:             #not installed, error.rudp raises on use
+    pass
 from testlog import*
 
+def __getattr__(name):
+    """
+    Module attribute missing - rudp imported when it is used, so the
+    ImportError tells what is missing
+    """
+    if name == 'rudp':
+        import rudp
+        return rudp
+    raise AttributeError("module 'error' has no attribute '%s'" % name)
 
 
+
+class TestAborted(Exception):
+    """
+    Raised when the error count reaches the limit set in Errors,
+    the rest of the test is not worth running
+    """
+    pass
+
 class Errors:
     """
     Class for maintaining error counter among imported modules
     """
-    def __init__(self):
+    def __init__(self, maxErrors = 0):
+        """
+        Input:  maxErrors - abort the test on this error, 0 never abort
+        """
         self.errorCount = 0      #clear counter at start
+        self.maxErrors = maxErrors
+        self.lock = threading.Lock()    #counter shared by DUT threads
 
-    def bumpError(self):
-        self.errorCount += 1
+    def bumpError(self, local = None):
+        """
+        Counts an error, raises TestAborted if max error count reached
+        Input:  local - error count of the DUT context counting the error,
+                        max error count checked on it, None - checked
+                        on the shared count
+        """
+        with self.lock:
+            self.errorCount += 1
+            count = self.errorCount
+        if local != None:
+            count = local
+        if self.maxErrors != 0 and count >= self.maxErrors:
+            raise TestAborted('%d errors - test aborted !' % count)
 
     def getErrorCount(self):
-        return self.errorCount
+        with self.lock:
+            return self.errorCount
 
-def chkLimits(name, value, Min, Max, unit = 'V', Hex = False):
+    def setMaxErrors(self, maxErrors):
+        """
+        Input:  maxErrors - abort the test on this error, 0 never abort
+        """
+        self.maxErrors = maxErrors
+
+class TestGroups:
+    """
+    Groups of tests with dependencies. A group is run only if all its
+    prerequisite groups passed, otherwise it is skipped and the skip logged.
+    Group fails if it counted an error in its TestContext.
+    """
+    def __init__(self, ctx = None):
+        """
+        Input:  ctx - TestContext providing log and error counter,
+                      None - default context set by setHandles()
+        """
+        self.ctx = ctx
+        self.requires = {}      #{group : prerequisite groups}
+        self.results = {}       #{group : 'PASS', 'FAIL' or 'SKIP'}
+
+    def declare(self, name, requires = ()):
+        """
+        Declare a group and its prerequisites
+        Input:  name - group name
+                requires - names of groups which have to pass before
+        Return: none
+        """
+        self.requires[name] = tuple(requires)
+
+    def run(self, name, test, *args):
+        """
+        Run the group unless a prerequisite failed or was skipped
+        Input:  name - group name
+                test - function performing the tests of the group
+                args - parameters passed to the function
+        Return: True if group passed, False if failed or skipped
+        """
+        ctx = self.ctx
+        if ctx == None:
+            ctx = Default
+        for req in self.requires.get(name, ()):
+            result = self.results.get(req, 'NOT RUN')
+            if result != 'PASS':
+                ctx.log.logText('    %s SKIPPED - prerequisite %s %s !'
+                            % (name, req, result))
+                self.results[name] = 'SKIP'
+                return False
+        errors = ctx.failures
+        self.results[name] = 'FAIL'     #stays so if TestAborted raised
+        test(*args)
+        if ctx.failures == errors:
+            self.results[name] = 'PASS'
+            return True
+        return False
+
+    def passed(self, name):
+        """
+        Input:  name - group name
+        Return: True if the group was run and passed
+        """
+        return self.results.get(name) == 'PASS'
+
+class TestContext:
     """
-    Checks value against provided limits.
-    If out of limits, logs the message, bumps errorCount
-    Input:  name - signal name for logging
-            value - value to be tested
-            Min, Max - limits
-            Hex - if True limits displayed in hex, float otherwise (by default)
-    Return: True if OK, False if out of limits
+    Handles and settings of one DUT test. Each DUT tested in its own
+    thread gets its own context so several fixtures or multi-up panels
+    can be tested concurrently from one process.
     """
+    def __init__(self, dmm, src, brd, log, err):
+        """
+        Input:  dmm - 34972A DAQ, 3706 or 34411A DMM, also wrapped by
+                      arbiter.Arbiter, or meters.Meter
+                src - U2722A source meter
+                brd - SCU communication handle
+                log - class for logging
+                err - error counter, can be shared among contexts,
+                      errors of this DUT are counted in failures too
+        """
+        self.dmm = dmm
+        self.src = src
+        self.brd = brd
+        self.log = log
+        self.err = err
+        self.adaptive = None    #two-pass measurement off, see setAdaptive()
+        self.ranges = None      #range cache off, see setRangeCache()
+        self.settleTimes = {}   #{signal name : settle time}
+        self.pointTimes = {}    #{signal name : time of switchAndCheck()}
+        self.startTime = clock.time()
+        self.tracer = None      #timeline off, see setTracer()
+        self.meter = None       #adapter of dmm, see getMeter()
+        self.failures = 0       #errors of this context, see bumpError()
+
+    def chkLimits(self, name, value, Min, Max, unit = 'V', Hex = False):
+        """
+        Checks value against provided limits.
+        If out of limits, logs the message, bumps errorCount
+        Input:  name - signal name for logging
+                value - value to be tested
+                Min, Max - limits
+                Hex - if True limits displayed in hex, float otherwise (by default)
+        Return: True if OK, False if out of limits
+        """
 
-    #global Log
-    if not Min < value < Max:
+        if not Min < value < Max:
+            if Hex:
+                line = "%s:0x%X OUT OF LIMITS (0x%X, 0x%X). Test Failed !" %(name, value,  Min, Max)
+            else:
+                line = "%s:%F %s OUT OF LIMITS (%F, %f). Test Failed !" %(name, value, unit, Min, Max)
+            self.log.logError(line)
+            if self.tracer != None:
+                self.tracer.check(name, value, False)
+            self.bumpError()
+            return False
+        if self.tracer != None:
+            self.tracer.check(name, value, True)
         if Hex:
-            line = "%s:0x%X OUT OF LIMITS (0x%X, 0x%X). Test Failed !" %(name, value,  Min, Max)
+            self.log.logText('    '+'%s:0x%X expected range from:0x%X To: 0x%X. Test PASS !'% (name, value, Min, Max))
         else:
-            line = "%s:%F %s OUT OF LIMITS (%F, %f). Test Failed !" %(name, value, unit, Min, Max)
-        Log.logError(line)
-        Err.bumpError()
-        return False
-    if Hex:
-        Log.logText('    '+'%s:0x%X expected range from:0x%X To: 0x%X. Test PASS !'% (name, value, Min, Max))
-    else:
-        Log.logText('    '+'%s:%F %s expected range From:%F %s To: %F %s. Test PASS !'% (name, value, unit, Min,unit, Max, unit))
-    return True
+            self.log.logText('    '+'%s:%F %s expected range From:%F %s To: %F %s. Test PASS !'% (name, value, unit, Min,unit, Max, unit))
+        return True
+
+    def bumpError(self):
+        """
+        Counts an error of this DUT in failures and in the shared counter,
+        raises TestAborted if this DUT reached the max error count
+        """
+        self.failures += 1
+        self.err.bumpError(self.failures)
+
+    def inGuardBand(self, value, loLim, hiLim):
+        """
+        Checks if a fast reading is too close to a limit to be trusted
+        Input:  value - fast pass reading
+                loLim, hiLim - limits
+        Return: True if reading within guard band of any limit, False otherwise
+        """
+        band = self.adaptive[2] * (hiLim - loLim)
+        return abs(value - loLim) <= band or abs(value - hiLim) <= band
+
+    def getMeter(self):
+        """
+        Meter adapter of the DMM, created again when the DMM is changed
+        Return: meters.Meter instance
+        """
+        if self.meter == None or (self.meter is not self.dmm and
+                                  self.meter.driver is not self.dmm):
+            self.meter = meters.meterFor(self.dmm)
+        return self.meter
+
+    def measurePoint(self, switch, name, loLim, hiLim, mod, nplc, read):
+        """
+        Measure a point with fixed range from the range cache and in
+        two-pass mode if they are set by setRangeCache() and setAdaptive().
+        Overload reading on a fixed range falls back to autorange.
+        The DMM is configured through its meters.Meter adapter.
+        Input:  switch - channel or scan list as string
+                name - signal name, key to the range cache
+                loLim, hiLim - limits
+                mod - measured function with autorange, SCPI name,
+                      None - function and range the switch is configured
+                      for
+                nplc - NPLC to configure, None - NPLC the switch is
+                       configured for, DMM not configured unless range
+                       cache or two-pass mode requires it. The switch
+                       is left at this NPLC after a two-pass reading.
+                read - function doing the reading
+        Return: measured value
+        """
+        meter = self.getMeter()
+        current = meter.current(switch)
+        if current == None:         #not configured by this process yet
+            current = ('VOLT:DC', 'AUTO', 1)
+        rng = 'AUTO'
+        if mod == None:             #keep function and range set by the test
+            (mod, rng) = current[:2]
+        if nplc == None:
+            nplc = current[2] if current[2] != None else 1
+            configure = self.ranges != None or self.adaptive != None
+        else:
+            configure = True
+        if self.ranges != None:
+            rng = self.ranges.getRange(name, meter.steps(mod), loLim, hiLim)
+        fast = nplc if self.adaptive == None else self.adaptive[0]
+        if configure:
+            meter.setup(mod, rng, fast, switch)
+        try:
+            v = read()
+            if self.ranges != None and rng != 'AUTO' and \
+               abs(v) >= meter.overload():      #range mismatch
+                self.ranges.forget(name)
+                rng = 'AUTO'
+                meter.setup(mod, rng, fast, switch)
+                v = read()
+            if self.ranges != None and abs(v) < meter.overload():
+                if rng == 'AUTO':       #remember where autorange settled
+                    rng = meter.readRange(switch, mod)
+                self.ranges.learn(name, rng, v)
+            if self.adaptive != None and self.inGuardBand(v, loLim, hiLim):
+                #marginal reading - measure precisely
+                meter.setup(mod, rng, self.adaptive[1], switch)
+                v = read()
+        finally:
+            if self.adaptive != None:       #back to the channel NPLC
+                meter.setup(mod, rng, nplc, switch)
+        return v
+
+    def measureAndCheckSwich(self, switch, name, loLim, hiLim,
+                             mod = 'VOLT:DC'):
+        """
+        Configure scan list, measure, check against limits.
+        With two-pass mode set by setAdaptive() the reading is done with
+        fast NPLC first and repeated with slow NPLC only if it is close to
+        a limit. With range cache set by setRangeCache() fixed range is
+        configured.
+        Input:  switch - scan list as string
+                name - signal name for logging
+                loLim, hiLim - limits
+                mod - measured function with autorange, default
+                      'VOLT:DC', None - function and range the scan list
+                      is configured for, 'VOLT:DC' if not configured yet
+        Return: measured value
+        """
+        meter = self.getMeter()
+        v = self.measurePoint(switch, name, loLim, hiLim, mod, 1,
+                              lambda: meter.measure(None))
+        #self.log.logValue(name, v, unit)
+        self.chkLimits(name, v, loLim, hiLim)
+        return v
+
+    def switchAndCheck(self, sw, name, loLim, hiLim, unit = 'V', delay = 0,
+                       mod = 'VOLT:DC'):
+        """
+        Close a switch, measure with actual scallist, check against limits.
+        If out of limits, logs the message, bumps errorCount
+        With two-pass mode set by setAdaptive() the switch is configured
+        for fast NPLC and re-measured with slow NPLC only if the reading is
+        close to a limit. With range cache set by setRangeCache() the
+        switch is configured for fixed range.
+        Input:  sw - switch number
+                name - signal name for logging
+                loLim, hiLim - limits
+                unit - unit of measured value
+                delay - waiting between closing switch and reading, default 0
+                mod - function configured with autorange in two-pass or
+                      range cache mode, default 'VOLT:DC', None - function
+                      and range the switch is configured for, 'VOLT:DC'
+                      if not configured yet
+        Return: measured value if OK, exception if fails
+        """
+
+        startTime = clock.time()
+        meter = self.getMeter()
+        v = self.measurePoint(str(sw), name, loLim, hiLim, mod, None,
+                              lambda: meter.measure(sw, delay))
+        self.pointTimes[name] = clock.time() - startTime
+        if getattr(meter.driver, 'lastSettle', None) != None:
+            self.settleTimes[name] = meter.driver.lastSettle
+        #self.log.logValue(name, v, unit)
+        self.chkLimits(name, v, loLim, hiLim)
+        return v
+
+    def logSettleTimes(self, count = 10):
+        """
+        Logs signals with the longest settle times recorded by
+        switchAndCheck() when the DMM uses adaptive settling
+        Input:  count - number of slowest signals to log
+        Return: none
+        """
+        times = self.settleTimes
+        names = sorted(times, key = times.get, reverse = True)
+        self.log.logText('    Slowest settling signals:')
+        for name in names[:count]:
+            self.log.logText('       %-16s = %.3f s' % (name, times[name]))
+
+    def elapsed(self):
+        """
+        Time since the context was created, simulated if the clock
+        module uses virtual clock
+        Return: time in s
+        """
+        return clock.time() - self.startTime
+
+    def setAdaptive(self, fastNplc = .02, slowNplc = 10, guard = .1):
+        """
+        Enable two-pass measurement in switchAndCheck() and
+        measureAndCheckSwich(). Points are measured with fast NPLC and
+        re-measured with slow NPLC only if the fast reading falls within
+        the guard band of loLim or hiLim.
+        Input:  fastNplc - NPLC of the first pass
+                slowNplc - NPLC of re-measurement of marginal readings
+                guard - guard band as a fraction of (hiLim - loLim),
+                        None switches the two-pass mode off
+        Return: none
+        """
+        if guard == None:
+            self.adaptive = None
+        else:
+            self.adaptive = (fastNplc, slowNplc, guard)
+
+    def setRangeCache(self, cache):
+        """
+        Use learned ranges instead of autorange in switchAndCheck() and
+        measureAndCheckSwich(). Ranges are learned on the first run,
+        the cache has to be saved by the caller at the end of the test.
+        Input:  cache - rangecache.RangeCache instance, None to autorange
+        Return: none
+        """
+        self.ranges = cache
+
+    def setTracer(self, tracer):
+        """
+        Put limit checks on the timeline
+        Input:  tracer - timeline.Tracer instance, None to stop tracing
+        Return: none
+        """
+        self.tracer = tracer
+
+# Module level interface working with the default context
+# ========================================================
+
+Default = TestContext(None, None, None, None, None)
+
+def chkLimits(name, value, Min, Max, unit = 'V', Hex = False):
+    """
+    TestContext.chkLimits() of the default context
+    """
+    return Default.chkLimits(name, value, Min, Max, unit, Hex)
 
 def measureAndCheckSwich(switch, name, loLim, hiLim,mod = 'VOLT:DC' ):
+    """
+    TestContext.measureAndCheckSwich() of the default context
+    """
+    return Default.measureAndCheckSwich(switch, name, loLim, hiLim, mod)
+
+def switchAndCheck(sw, name, loLim, hiLim, unit = 'V', delay = 0,
+                   mod = 'VOLT:DC'):
+    """
+    TestContext.switchAndCheck() of the default context
+    """
+    return Default.switchAndCheck(sw, name, loLim, hiLim, unit, delay, mod)
+
+def logSettleTimes(count = 10):
+    """
+    TestContext.logSettleTimes() of the default context
+    """
+    Default.logSettleTimes(count)
 
-    DMM.configScan(switch, mod)
-    v = DMM.read()
-    #Log.logValue(name, v, unit)
-    chkLimits(name, v, loLim, hiLim)
-    return v
+def setAdaptive(fastNplc = .02, slowNplc = 10, guard = .1):
+    """
+    TestContext.setAdaptive() of the default context
+    """
+    Default.setAdaptive(fastNplc, slowNplc, guard)
 
-def switchAndCheck(sw, name, loLim, hiLim, unit = 'V', delay = 0):
+def setRangeCache(cache):
     """
-    Close a switch, measure with actual scallist, check against limits.
-    If out of limits, logs the message, bumps errorCount
-    DMM and Log provided as globals
-    Input:  sw - switch number
-            name - signal name for logging
-            loLim, hiLim - limits
-            unit - unit of measured value
-            delay - waiting between closing switch and reading, default 0
-    Return: measured value if OK, exception if fails
+    TestContext.setRangeCache() of the default context
     """
+    Default.setRangeCache(cache)
 
-    v = DMM.readSwitch(sw, delay)
-    #Log.logValue(name, v, unit)
-    chkLimits(name, v, loLim, hiLim)
-    return v
+def setTracer(tracer):
+    """
+    TestContext.setTracer() of the default context
+    """
+    Default.setTracer(tracer)
 
 def setHandles(dmm, src, brd, log, err):
     """
-    Provide needed class instances to the module for easy access
-    These parameters can't be changed within the module
+    Provide needed class instances to the module for easy access,
+    they are used by the default context of module level functions
     Input:  dmm - 34972A DAQ
             src - U2722A source meter
             brd - SCU communication handle
@@ -87,4 +439,11 @@ def setHandles(dmm, src, brd, log, err):
     SRC = src
     BRD = brd
     Log = log
-    Err = err
\ No newline at end of file
+    Err = err
+    Default.dmm = dmm
+    Default.src = src
+    Default.brd = brd
+    Default.log = log
+    Default.err = err
+    Default.failures = 0
+    Default.startTime = clock.time()
@@ -0,0 +1,300 @@
+"""
+Common meter interface over Daq34972, Daq3706 and Dvm34411 drivers and
+a dispatcher spreading a measurement list over all meters wired to the
+fixture. Each meter knows its wiring {signal name : switch}, the
+dispatcher gives every point to the least loaded meter reaching it and
+runs the meters concurrently.
+Use: meters = [meters.Daq34972Meter(daq, {'VCC' : 101, 'VREF' : 102}),
+               meters.Daq3706Meter(k3706, {'VCC' : 1001, 'V3V3' : 1002})]
+     disp = meters.Dispatcher(meters)
+     disp.check([meters.Point('VCC', 4.8, 5.2),
+                 meters.Point('V3V3', 3.2, 3.4)], ctx)
+meters.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'meters.py (C) J.M.,rev.18-Oct-26'
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import clock
+
+class Point:
+    """
+    One signal to be measured and checked
+    """
+    def __init__(self, name, loLim = None, hiLim = None, func = 'VOLT:DC',
+                 rng = 'AUTO', nplc = 1, delay = 0, unit = 'V'):
+        """
+        Input:  name - signal name, key of meter wiring
+                loLim, hiLim - limits, None no check
+                func - SCPI function name 'VOLT:DC', 'VOLT:AC', 'CURR:DC',
+                       'CURR:AC', 'RES', 'FRES', 'FREQ', 'PER', 'TEMP'
+                rng - range as float or 'AUTO'
+                nplc - integration time
+                delay - waiting after switch closed
+                unit - unit for logging
+        """
+        self.name = name
+        self.loLim = loLim
+        self.hiLim = hiLim
+        self.func = func
+        self.rng = rng
+        self.nplc = nplc
+        self.delay = delay
+        self.unit = unit
+
+class Meter:
+    """
+    Common part of the meter adapters. Subclasses adapt a driver by
+    configure(func, rng, nplc, switch) setting function, range and NPLC
+    used for the switch and measure(switch, delay) reading the switch,
+    None reading without switching. Configuration is not cached here,
+    the driver records what it has set.
+    """
+    def __init__(self, driver, wiring = None):
+        """
+        Input:  driver - opened driver instance
+                wiring - {signal name : switch number}
+        """
+        self.driver = driver
+        self.wiring = wiring if wiring != None else {}
+
+    def reaches(self, name):
+        """
+        Returns: True if the signal is wired to the meter
+        """
+        return name in self.wiring
+
+    def current(self, switch):
+        """
+        Returns: (func, rng, nplc) configured for the switch with SCPI
+                 function name, None if not known
+        """
+        return (self.driver.func, self.driver.rng, self.driver.nplc)
+
+    def steps(self, func):
+        """
+        Returns: fixed ranges of the function ascending, () if none
+        """
+        return self.driver.rangeSteps.get(func.upper(), ())
+
+    def overload(self):
+        """
+        Returns: reading returned if out of range
+        """
+        return self.driver.overload
+
+    def readRange(self, switch, func):
+        """
+        Returns: range the switch is measured with, e.g. the one
+                 autorange settled on
+        """
+        if switch != None:
+            switch = str(switch)
+        return self.driver.readRange(switch, func)
+
+    def setup(self, func, rng, nplc, switch):
+        """
+        Configures the switch unless it is configured so already
+        Returns: True if OK, False if parameters invalid
+        """
+        if self.current(switch) == (func.upper(), rng, nplc):
+            return True
+        return self.configure(func, rng, nplc, switch)
+
+    def measurePoint(self, point):
+        """
+        Configures the meter if needed and reads the point
+        Input:  point - Point instance
+        Returns: float reading, False if failed
+        """
+        switch = self.wiring[point.name]
+        if not self.setup(point.func, point.rng, point.nplc, switch):
+            return False
+        return self.measure(switch, point.delay)
+
+class Daq34972Meter(Meter):
+    """
+    34972A DAQ, configured per channel
+    """
+    def configure(self, func, rng, nplc, switch):
+        return self.driver.configScan(str(switch), func, rng, nplc)
+
+    def measure(self, switch, delay = 0):
+        if switch == None:
+            return self.driver.read()
+        return self.driver.readSwitch(switch, delay)
+
+    def current(self, switch):
+        if switch == None:
+            return None
+        configs = set([self.driver.channelConfig.get(channel) for channel
+                       in self.driver.listChannels(str(switch))])
+        if len(configs) != 1:       #channels configured differently
+            return None
+        return configs.pop()
+
+class Daq3706Meter(Meter):
+    """
+    Keithley 3706 system switch with DMM, one DMM configuration
+    """
+    def configure(self, func, rng, nplc, switch):
+        if func.upper() not in self.driver.scpiFunctions:
+            print('Daq3706Meter.configure() illegal function !')
+            return False
+        return self.driver.configDmm(func, rng, nplc)
+
+    def measure(self, switch, delay = 0):
+        if switch == None:
+            return self.driver.read()
+        return self.driver.readSwitch(switch, delay)
+
+    def current(self, switch):
+        funcs = [scpi for (scpi, tsp) in self.driver.scpiFunctions.items()
+                 if tsp == self.driver.func]
+        if len(funcs) != 1:
+            return None
+        rng = self.driver.rng
+        if rng == 'auto':
+            rng = 'AUTO'
+        return (funcs[0], rng, self.driver.nplc)
+
+class Dvm34411Meter(Meter):
+    """
+    34411A DMM without switches, wiring switches are None
+    """
+    def configure(self, func, rng, nplc, switch):
+        return self.driver.config(func, rng, nplc)
+
+    def measure(self, switch, delay = 0):
+        return self.driver.read()
+
+# adapters of driver classes
+adapters = {'Daq34972' : Daq34972Meter, 'Daq3706' : Daq3706Meter,
+            'Dvm34411' : Dvm34411Meter}
+
+def meterFor(driver, wiring = None):
+    """
+    Adapter of a driver
+    Input:  driver - Daq34972, Daq3706 or Dvm34411 instance, a wrapper
+                     keeping it in its driver attribute like
+                     arbiter.Arbiter, or Meter returned as it is
+            wiring - {signal name : switch number}
+    Returns: Meter instance calling the driver through the wrapper,
+             raises TypeError if no adapter
+    """
+    if isinstance(driver, Meter):
+        return driver
+    inner = driver
+    while inner != None:
+        for cls in type(inner).__mro__:
+            if cls.__name__ in adapters:
+                return adapters[cls.__name__](driver, wiring)
+        inner = getattr(inner, '__dict__', {}).get('driver')    #unwrap
+    print('meters.meterFor() no meter for ' + type(driver).__name__ + ' !')
+    raise TypeError(type(driver).__name__)
+
+class Dispatcher:
+    """
+    Spreads measurement lists over meters, one thread per meter
+    """
+    def __init__(self, meters):
+        """
+        Input:  meters - list of Meter instances
+        """
+        self.meters = list(meters)
+
+    def assign(self, points):
+        """
+        Gives each point to the least loaded meter reaching it, points
+        reachable by fewer meters assigned first
+        Input:  points - list of Point instances
+        Returns: list of point lists, one per meter
+        """
+        queues = [[] for meter in self.meters]
+        candidates = []
+        for point in points:
+            reach = [i for (i, meter) in enumerate(self.meters)
+                     if meter.reaches(point.name)]
+            if not reach:
+                print('Dispatcher.assign() no meter wired to ' + point.name
+                      + ' !')
+                raise ValueError(point.name)
+            candidates.append((len(reach), point, reach))
+        candidates.sort(key = lambda item: item[0])
+        for (count, point, reach) in candidates:
+            best = min(reach, key = lambda i: len(queues[i]))
+            queues[best].append(point)
+        return queues
+
+    def run(self, points):
+        """
+        Measures the points concurrently
+        Input:  points - list of Point instances
+        Returns: {signal name : reading}
+        """
+        queues = self.assign(points)
+        def measureQueue(meter, queue):
+            return [(point.name, meter.measurePoint(point))
+                    for point in queue]
+        results = {}
+        with ThreadPoolExecutor(max_workers = len(self.meters)) as pool:
+            futures = [pool.submit(measureQueue, meter, queue)
+                       for (meter, queue) in zip(self.meters, queues)
+                       if queue]
+            for future in futures:
+                results.update(future.result())
+        clock.sync()            #after the slowest meter
+        return results
+
+    def check(self, points, ctx = None):
+        """
+        Measures the points and checks them against limits in list order
+        Input:  points - list of Point instances
+                ctx - error.TestContext, None - default context
+        Returns: {signal name : reading}
+        """
+        if ctx == None:
+            import error        #not at the top, error imports meters
+            ctx = error.Default
+        results = self.run(points)
+        for point in points:
+            if point.loLim != None and point.hiLim != None:
+                ctx.chkLimits(point.name, results[point.name], point.loLim,
+                              point.hiLim, point.unit)
+        return results
+
+
+# Self test - two simulated DAQs share a measurement list
+# =======================================================
+if __name__ == '__main__':
+    import visasim, cdaq34972, cdaq3706, arbiter
+    print(copyr)
+    sim = visasim.ResourceManager(verbose = False)
+    daq = cdaq34972.Daq34972(sim, '34972A')
+    k3706 = cdaq3706.Daq3706(sim, 'K3706')
+    daq.open()
+    k3706.open()
+    k3706.scanSlots()
+    wiringA = {}
+    wiringB = {}
+    points = []
+    for i in range(8):
+        name = 'V%d' % i
+        sim.devices['34972A'].setSignal(101 + i, i + .5)
+        sim.devices['K3706'].setSignal(1001 + i, i + .5)
+        wiringA[name] = 101 + i
+        wiringB[name] = 1001 + i
+        points.append(Point(name, i, i + 1.))
+    disp = Dispatcher([meterFor(arbiter.Arbiter(daq), wiringA),
+                       Daq3706Meter(k3706, wiringB)])
+    queues = disp.assign(points)
+    results = disp.run(points)
+    daq.close()
+    k3706.close()
+    print([len(queue) for queue in queues], results)
+    if [len(queue) for queue in queues] != [4, 4] or \
+       [results[p.name] for p in points] != [i + .5 for i in range(8)]:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
@@ -5,8 +5,8 @@ metex.py (C) J.M.,rev.28-Oct-15
 copyr = 'metex.py (C) J.M.,rev.28-Oct-15'
 port = 'COM1'       #default port for selftest
 
-import sys, time
-import serial
+import sys
+import clock
 
 class Metex:
     """
@@ -28,6 +28,7 @@ class Metex:
         Output: True if OK, raises exception if failed
         """
         try:
+            import serial       #pyserial loaded only when a port is opened
             self.handle = serial.Serial(self.port, baudrate = 1200,
                    bytesize = 7, timeout = self.timeout,
                    rtscts = False, dsrdtr = False)
@@ -83,9 +84,9 @@ class Metex:
         Return: reply as bytes
                 'timeout' if expected '\n' didn't come within specified time
         """
-        startTime = time.time()
+        startTime = clock.time()
         response = b''      #empty
-        while time.time() < startTime + self.timeout:
+        while clock.time() < startTime + self.timeout:
             resl = self.handle.read()   #read character
             response = response + resl
             if resl == b'\r':
@@ -133,7 +134,7 @@ if __name__ == '__main__':      #self test
                 print('Reading failed - terminated !')
                 break
             print('%d %.3f' % (curTime, volt))
-            time.sleep(stepTime)        
+            clock.sleep(stepTime)        
             curTime += stepTime
     except Exception:
         raise       #leave default handler to process exception
@@ -0,0 +1,161 @@
+"""
+Persistent cache of DMM ranges learned for test points.
+Fixed range saves conversions spent by autoranging on every reading.
+The cache is kept in a text file, one line per test point:
+    station;point name;range;max abs reading
+rangecache.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'rangecache.py (C) J.M.,rev.18-Oct-26'
+
+import os, sys
+
+
+class RangeCache:
+    """
+    Ranges learned from autorange or derived from limits and history,
+    keyed by station and test point name
+    """
+    def __init__(self, station, fileName = 'rangecache.txt'):
+        """
+        Input:  station - station name, part of the key
+                fileName - cache file path
+        """
+        self.station = station
+        self.fileName = fileName
+        self.ranges = {}        #{point name : learned range}
+        self.history = {}       #{point name : max abs reading}
+        self.others = []        #lines of other stations kept in the file
+        self.changed = False
+
+    def load(self):
+        """
+        Reads the cache file, missing file means empty cache
+        Input:  none
+        Return: True if OK, False if file not found
+        """
+        self.ranges = {}
+        self.history = {}
+        self.others = []
+        try:
+            cacheFile = open(self.fileName, 'r')
+        except OSError:
+            print('RangeCache.load() ' + self.fileName + ' not found !')
+            return False
+        for line in cacheFile:
+            line = line.strip('\n')
+            items = line.split(';')
+            if len(items) != 4:
+                continue            #skip damaged lines
+            if items[0] != self.station:
+                self.others.append(line)
+                continue
+            try:
+                if items[2] != '':
+                    self.ranges[items[1]] = float(items[2])
+                self.history[items[1]] = float(items[3])
+            except ValueError:
+                print('RangeCache.load() bad line: ' + line)
+        cacheFile.close()
+        self.changed = False
+        return True
+
+    def save(self):
+        """
+        Writes the cache file if anything changed
+        Input:  none
+        Return: True if OK, raises exception if fails
+        """
+        if not self.changed:
+            return True
+        try:
+            cacheFile = open(self.fileName, 'w')
+            for line in self.others:
+                cacheFile.write(line + '\n')
+            for name in sorted(self.history):
+                rng = self.ranges.get(name)
+                if rng == None:
+                    rng = ''
+                cacheFile.write('%s;%s;%s;%s\n' % (self.station, name,
+                                                   rng, self.history[name]))
+            cacheFile.close()
+        except Exception:
+            print('RangeCache.save() writing ' + self.fileName + ' failed !')
+            raise
+        self.changed = False
+        return True
+
+    def getRange(self, name, steps = (), loLim = None, hiLim = None):
+        """
+        Range to be configured for a test point. The learned range is
+        preferred, otherwise the smallest range covering the limits and
+        max reading recorded is derived from the ranges available.
+        Input:  name - test point name
+                steps - ranges available for the function, ascending
+                loLim, hiLim - limits, None if not known
+        Return: range as float, 'AUTO' if nothing known
+        """
+        rng = self.ranges.get(name)
+        if rng != None:
+            return rng
+        need = self.history.get(name)
+        for lim in (loLim, hiLim):
+            if lim != None and (need == None or abs(lim) > need):
+                need = abs(lim)
+        if need == None:
+            return 'AUTO'
+        for step in steps:
+            if need <= step:
+                return step
+        return 'AUTO'
+
+    def learn(self, name, rng, value = None):
+        """
+        Records the range autorange settled on and the reading
+        Input:  name - test point name
+                rng - range as float, None if only the reading is recorded
+                value - reading, None if not available
+        Return: none
+        """
+        if rng != None and self.ranges.get(name) != rng:
+            self.ranges[name] = rng
+            self.changed = True
+        if value != None:
+            value = abs(value)
+            if value > self.history.get(name, -1.):
+                self.history[name] = value
+                self.changed = True
+        elif name not in self.history:
+            self.history[name] = 0.
+            self.changed = True
+
+    def forget(self, name):
+        """
+        Drops learned range of a point, e.g. after overload reading
+        Input:  name - test point name
+        Return: none
+        """
+        if name in self.ranges:
+            self.ranges.pop(name)
+            self.changed = True
+
+
+# Self test
+# ==========
+if __name__ == '__main__':
+    print(copyr)
+    fileName = 'rangecache_test.txt'
+    cache = RangeCache('STATION1', fileName)
+    cache.load()
+    cache.learn('VCC', 10., 4.98)
+    cache.learn('VREF', None, 1.25)
+    cache.save()
+    cache = RangeCache('STATION1', fileName)
+    cache.load()
+    steps = (.1, 1., 10., 100., 300.)
+    print(cache.getRange('VCC', steps, 4.5, 5.5))       #learned 10.
+    print(cache.getRange('VREF', steps))                #history 10.
+    print(cache.getRange('V3V3', steps, 3.0, 3.6))      #limits 10.
+    print(cache.getRange('UNKNOWN', steps))             #AUTO
+    os.remove(fileName)
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,196 @@
+"""
+Parser of IEEE-488.2 block and ASCII responses to NumPy arrays.
+Definite-length blocks '#<n><length><data>', indefinite-length blocks
+'#0<data>' ended by termination, binary REAL,32 and REAL,64 data in
+normal (big endian) or swapped byte order and comma separated ASCII
+lists are converted by NumPy directly from the response buffer.
+Responses may be str as read by VISA or bytes as read by scpisock.
+Use: rdgs = scpiparse.parse(dmm.handle.ask('R? 10'))    #ASCII in block
+     wave = scpiparse.parse(raw, 'REAL,32', 'SWAP')
+scpiparse.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'scpiparse.py (C) J.M.,rev.18-Oct-26'
+
+import sys, warnings
+import numpy
+
+# numpy type of (data format, byte order) of FORM:DATA and FORM:BORD
+dtypes = {('REAL,32', 'NORM') : '>f4', ('REAL,32', 'SWAP') : '<f4',
+          ('REAL,64', 'NORM') : '>f8', ('REAL,64', 'SWAP') : '<f8'}
+
+def toBytes(response):
+    """
+    Returns: response as bytes, str encoded 1:1 by latin-1
+    """
+    if isinstance(response, str):
+        return response.encode('latin-1')
+    return bytes(response)
+
+def blockRange(response):
+    """
+    Finds data of a block
+    Input:  response - str or bytes starting by '#', leading white
+                       space allowed
+    Returns: (start, end) of block data in the response,
+             raises ValueError if the header or length is bad
+    """
+    start = len(response) - len(response.lstrip())
+    if response[start:start + 1] not in ('#', b'#'):
+        raise ValueError('block: # expected')
+    digits = response[start + 1:start + 2]
+    if isinstance(digits, bytes):
+        digits = digits.decode('latin-1')
+    if not digits.isdigit():
+        raise ValueError('block: length digits expected')
+    digits = int(digits)
+    if digits == 0:                 #indefinite, ends by termination
+        end = len(response)
+        if end > start + 2 and response[end - 1:end] in ('\n', b'\n'):
+            end -= 1
+        return (start + 2, end)
+    length = response[start + 2:start + 2 + digits]
+    if isinstance(length, bytes):
+        length = length.decode('latin-1')
+    if len(length) != digits or not length.isdigit():
+        raise ValueError('block: bad length')
+    begin = start + 2 + digits
+    end = begin + int(length)
+    if end > len(response):
+        raise ValueError('block: %d bytes expected, %d received' %
+                         (int(length), len(response) - begin))
+    return (begin, end)
+
+def blockData(response):
+    """
+    Returns: data of a block, the response if it is not a block
+             raises ValueError if the block is bad
+    """
+    if response.lstrip()[:1] not in ('#', b'#'):
+        return response
+    (start, end) = blockRange(response)
+    return response[start:end]
+
+def parseAscii(text):
+    """
+    Converts comma separated numbers
+    Input:  text - str or bytes like '+1.0E+00,-2.5E-03'
+    Returns: float64 array, raises ValueError if not all numbers
+    """
+    if isinstance(text, bytes):
+        text = text.decode('latin-1')
+    text = text.strip()
+    if text == '':
+        return numpy.empty(0)
+    with warnings.catch_warnings():     #incomplete parse checked below
+        warnings.simplefilter('ignore')
+        values = numpy.fromstring(text, dtype = float, sep = ',')
+    if len(values) != text.count(',') + 1:
+        raise ValueError('ASCII list: not a number in ' + text[:40])
+    return values
+
+def parseReal(data, dataFormat = 'REAL,64', byteOrder = 'NORM'):
+    """
+    Converts binary floats
+    Input:  data - block data as str or bytes
+            dataFormat - 'REAL,32' or 'REAL,64'
+            byteOrder - 'NORM' big endian, 'SWAP' little endian
+    Returns: float64 array, raises ValueError if data length is bad
+    """
+    dtype = dtypes.get((dataFormat.upper().replace(' ', ''),
+                        byteOrder.upper()[:4]))
+    if dtype == None:
+        raise ValueError('unknown format %s %s' % (dataFormat, byteOrder))
+    data = toBytes(data)
+    if len(data) % int(dtype[2]) != 0:
+        raise ValueError('%s: %d bytes not whole numbers' % (dataFormat,
+                                                            len(data)))
+    return numpy.frombuffer(data, dtype).astype(float)
+
+def parse(response, dataFormat = 'ASCII', byteOrder = 'NORM'):
+    """
+    Converts a response of block or ASCII list to numbers
+    Input:  response - str or bytes
+            dataFormat - 'ASCII', 'REAL,32' or 'REAL,64' set by FORM:DATA
+            byteOrder - 'NORM' or 'SWAP' set by FORM:BORD
+    Returns: float64 array, raises ValueError if format is bad
+    """
+    data = blockData(response)
+    if dataFormat.upper() in ('ASCII', 'ASC'):
+        return parseAscii(data)
+    return parseReal(data, dataFormat, byteOrder)
+
+def makeBlock(data, digits = None):
+    """
+    Wraps data to a block
+    Input:  data - bytes
+            digits - number of length digits, None smallest, 0 indefinite
+    Returns: bytes block
+    """
+    if digits == 0:
+        return b'#0' + data + b'\n'
+    length = str(len(data))
+    if digits != None:
+        length = length.zfill(digits)
+    return ('#%d%s' % (len(length), length)).encode('latin-1') + data
+
+
+# Self test - random blocks and damaged responses
+# ===============================================
+if __name__ == '__main__':
+    import random
+    import time as systime
+    print(copyr)
+    rnd = random.Random(1)
+    cases = 0
+    for i in range(2000):
+        values = numpy.array([rnd.uniform(-1e6, 1e6)
+                              for j in range(rnd.randint(0, 40))])
+        (dataFormat, byteOrder) = rnd.choice(list(dtypes) + [('ASCII', '')])
+        if dataFormat == 'ASCII':
+            data = ','.join(['%+.16E' % value for value in values])
+            data = data.encode('latin-1')
+        else:
+            values = values.astype(dtypes[(dataFormat, byteOrder)])
+            data = values.tobytes()
+        digits = rnd.choice((None, 0, 9))
+        if dataFormat != 'ASCII' and digits == 0 and b'\n' in data[-1:]:
+            digits = None           #indefinite block can't end by '\n'
+        response = makeBlock(data, digits)
+        if rnd.random() < .5:
+            response = response.decode('latin-1')       #as read by VISA
+        result = parse(response, dataFormat, byteOrder)
+        if not numpy.array_equal(result, values.astype(float)):
+            print('Done with error - %s %s %r !' % (dataFormat, byteOrder,
+                                                    response[:20]))
+            sys.exit(2)
+        cases += 1
+        damaged = bytearray(toBytes(response))      #must fail cleanly
+        for j in range(rnd.randint(1, 3)):
+            if len(damaged) == 0:
+                break
+            pos = rnd.randrange(len(damaged))
+            if rnd.random() < .5:
+                del damaged[pos:]
+            else:
+                damaged[pos] = rnd.randrange(256)
+        try:
+            parse(bytes(damaged), dataFormat, byteOrder)
+        except ValueError:
+            pass
+    values = numpy.arange(100000, dtype = '<f4')
+    response = makeBlock(values.tobytes())
+    startTime = systime.perf_counter()
+    result = parse(response, 'REAL,32', 'SWAP')
+    binTime = systime.perf_counter() - startTime
+    response = makeBlock(','.join(['%+.8E' % value for value in values])
+                         .encode('latin-1'))
+    startTime = systime.perf_counter()
+    result = parse(response)
+    asciiTime = systime.perf_counter() - startTime
+    print('%d blocks, 1e5 values REAL,32 %.2f ms, ASCII %.1f ms' %
+          (cases, binTime * 1e3, asciiTime * 1e3))
+    if not numpy.array_equal(result, values):
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
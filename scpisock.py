@@ -0,0 +1,206 @@
+"""
+Raw SCPI over TCP socket transport bypassing VISA for LAN instruments
+(34972A, 34411A, 3706A, HMP4030 listen on port 5025). Handles have
+the write/ask/read interface of VISA handles, so drivers use it through
+its ResourceManager unchanged. Nagle disabled, responses assembled in a
+reused receive buffer, IEEE-488.2 definite-length blocks may contain
+termination bytes.
+Use: rm = scpisock.ResourceManager()    #or backend.resourceManager('socket')
+     dvm = cdaq34972.Daq34972(rm, 'TCPIP0::192.168.1.10::5025::SOCKET')
+scpisock.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'scpisock.py (C) J.M.,rev.18-Oct-26'
+
+import sys, re, socket
+
+port = 5025                 #default raw SCPI port
+chunkSize = 65536           #bytes received at once
+
+addressPattern = re.compile(r'(?:TCPIP\d*::)?([^:]+)(?:::|:)?(\d+)?',
+                            re.IGNORECASE)
+
+def parseAddress(visaName, defaultPort = port):
+    """
+    Input:  visaName - 'TCPIP0::host::5025::SOCKET', 'host:port' or 'host'
+    Returns: (host, port)
+    """
+    match = addressPattern.match(visaName)
+    if match == None:
+        print('scpisock: bad address ' + visaName + ' !')
+        raise ValueError(visaName)
+    if match.group(2) == None:
+        return (match.group(1), defaultPort)
+    return (match.group(1), int(match.group(2)))
+
+class SocketDevice:
+    """
+    Connection to one instrument
+    """
+    def __init__(self, host, port, timeout = 5., termination = '\n'):
+        """
+        Input:  host, port - instrument address
+                timeout - in s for connect and each read
+                termination - appended to commands, ends responses
+        """
+        self.host = host
+        self.port = port
+        self.term_chars = termination
+        self.buffer = bytearray()           #received, not yet returned
+        self.chunk = bytearray(chunkSize)   #reused by recv_into()
+        self.scanned = 0    #buffer bytes searched for termination
+        try:
+            self.sock = socket.create_connection((host, port), timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception:
+            print('scpisock: connecting %s:%d failed !' % (host, port))
+            raise
+        self.timeout = timeout
+
+    @property
+    def timeout(self):
+        return self.sock.gettimeout()
+
+    @timeout.setter
+    def timeout(self, value):
+        self.sock.settimeout(value)
+
+    def write(self, cmd):
+        """
+        Sends a command, termination added if missing
+        """
+        if not cmd.endswith(self.term_chars):
+            cmd += self.term_chars
+        self.sock.sendall(cmd.encode('latin-1'))
+
+    def receive(self):
+        """
+        Appends received bytes to the buffer
+        """
+        view = memoryview(self.chunk)
+        count = self.sock.recv_into(view)
+        if count == 0:
+            raise IOError('scpisock: %s:%d connection closed !'
+                          % (self.host, self.port))
+        self.buffer += view[:count]
+
+    def responseEnd(self):
+        """
+        Returns: length of the first complete response in the buffer
+                 including termination, 0 if not complete yet
+        """
+        term = self.term_chars.encode('latin-1')
+        buf = self.buffer
+        if buf[:1] == b'#':                 #IEEE-488.2 block
+            if len(buf) < 2:
+                return 0
+            digits = buf[1] - 48
+            if 1 <= digits <= 9:            #definite length
+                if len(buf) < 2 + digits:
+                    return 0
+                end = 2 + digits + int(buf[2:2 + digits])
+                if len(buf) < end + len(term):
+                    return 0
+                if buf[end:end + len(term)] == term:
+                    end += len(term)
+                return end
+        pos = buf.find(term, max(self.scanned - len(term) + 1, 0))
+        if pos == -1:
+            self.scanned = len(buf)
+            return 0
+        return pos + len(term)
+
+    def readRaw(self):
+        """
+        Returns: one response as bytes without termination
+        """
+        while True:
+            end = self.responseEnd()
+            if end != 0:
+                break
+            self.receive()
+        response = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        self.scanned = 0
+        term = self.term_chars.encode('latin-1')
+        if response.endswith(term):
+            response = response[:-len(term)]
+        return response
+
+    def read(self):
+        """
+        Returns: one response as string without termination
+        """
+        return self.readRaw().decode('latin-1')
+
+    def ask(self, cmd):
+        self.write(cmd)
+        return self.read()
+
+    def close(self):
+        self.sock.close()
+
+class ResourceManager:
+    """
+    Creates socket connections instead of VISA sessions
+    """
+    def __init__(self, defaultPort = port):
+        self.defaultPort = defaultPort
+        self.devices = []
+
+    def get_instrument(self, visaName, timeout = 5., **kwargs):
+        """
+        Input:  visaName - 'TCPIP0::host::5025::SOCKET', 'host:port', 'host'
+                timeout - in s
+                kwargs - other VISA attributes, ignored
+        Returns: SocketDevice
+        """
+        (host, devPort) = parseAddress(visaName, self.defaultPort)
+        dev = SocketDevice(host, devPort, timeout)
+        self.devices.append(dev)
+        return dev
+
+    def close(self):
+        for dev in self.devices:
+            dev.close()
+        self.devices = []
+
+
+# Self test - latency against a local stand-in server
+# ===================================================
+if __name__ == '__main__':
+    import threading, socketserver
+    import time as systime
+    print(copyr)
+    block = b'#213' + b'bin\nary\x00\x01\x02\x03\n\x0b'  #13 data bytes
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                cmd = line.strip().upper()
+                if cmd == b'*IDN?':
+                    self.wfile.write(b'Stand-in,SCPI,0,1.0\n')
+                elif cmd == b'BLOCK?':
+                    self.wfile.write(block + b'\n')
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    rm = ResourceManager()
+    dev = rm.get_instrument('TCPIP0::127.0.0.1::%d::SOCKET'
+                            % server.server_address[1])
+    count = 1000
+    startTime = systime.perf_counter()
+    for i in range(count):
+        idn = dev.ask('*IDN?')
+    latency = (systime.perf_counter() - startTime) / count
+    dev.write('BLOCK?')
+    data = dev.readRaw()
+    idn2 = dev.ask('*IDN?')
+    rm.close()
+    server.shutdown()
+    print('%s, %.1f us per query' % (idn, latency * 1e6))
+    if idn != 'Stand-in,SCPI,0,1.0' or data != block or idn2 != idn:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,207 @@
+"""
+Pipelined test sequencer. Steps are driver calls with explicit
+dependencies and settle times. Steps of one instrument execute in order
+in its own queue thread, independent steps of different instruments
+overlap, e.g. the DAQ is configured while the supply settles. Readings
+with limits are checked by TestContext.chkLimits() in step order.
+Use: seq = sequencer.Sequencer(ctx)
+     seq.add('SET5V', src.configVoltSrc, 1, 5., .1, settle = .2)
+     seq.add('CFG', dmm.configScan, '101', 'VOLT:DC', 10, 1)
+     seq.add('VCC', dmm.readSwitch, 101, after = ('SET5V', 'CFG'),
+             limits = (4.8, 5.2))
+     seq.run()
+     print(seq.criticalPath())
+sequencer.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'sequencer.py (C) J.M.,rev.18-Oct-26'
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import clock
+import error
+
+class Step:
+    """
+    One driver call of the sequence
+    """
+    def __init__(self, name, instrument, function, args, after, settle,
+                 limits, unit):
+        self.name = name
+        self.instrument = instrument
+        self.function = function
+        self.args = args
+        self.after = tuple(after)
+        self.settle = settle    #wait after the step before dependent steps
+        self.limits = limits    #(loLim, hiLim) or None
+        self.unit = unit
+        self.result = None
+        self.status = 'NOT RUN' #'PASS', 'FAIL', 'SKIP'
+        self.start = None       #clock time
+        self.finish = None
+        self.future = None
+
+class Sequencer:
+    """
+    Step list with dependencies executed in per instrument queues
+    """
+    def __init__(self, ctx = None):
+        """
+        Input:  ctx - error.TestContext receiving limit checks,
+                      None - default context set by error.setHandles()
+        """
+        self.ctx = ctx
+        self.steps = []
+        self.byName = {}
+
+    def add(self, name, function, *args, after = (), settle = 0.,
+            limits = None, unit = 'V', instrument = None):
+        """
+        Appends a step
+        Input:  name - step name, used as signal name by chkLimits()
+                function - driver method called with args
+                after - names of steps which have to finish and settle
+                        before this step starts
+                settle - time dependent steps wait after this one
+                limits - (loLim, hiLim) to check the result, None no check
+                unit - unit of the result for logging
+                instrument - queue of the step, default the driver of
+                             a bound method
+        Return: none
+        """
+        if name in self.byName:
+            print('Sequencer.add() duplicate step ' + name + ' !')
+            raise ValueError(name)
+        for req in after:
+            if req not in self.byName:
+                print('Sequencer.add() ' + name + ' requires unknown step '
+                      + req + ' !')
+                raise ValueError(req)
+        if instrument == None:
+            instrument = getattr(function, '__self__', None)
+            instrument = getattr(instrument, 'visaName', instrument)
+        step = Step(name, instrument, function, args, after, settle,
+                    limits, unit)
+        self.steps.append(step)
+        self.byName[name] = step
+
+    def execute(self, step):
+        """
+        Runs a step in its queue thread after its prerequisites settled
+        """
+        readyTime = None
+        for req in step.after:
+            dep = self.byName[req]
+            dep.future.result()
+            if dep.status != 'PASS':
+                step.status = 'SKIP'
+                return
+            if readyTime == None or dep.finish + dep.settle > readyTime:
+                readyTime = dep.finish + dep.settle
+        if readyTime != None:
+            clock.sleep(readyTime - clock.time())
+        step.start = clock.time()
+        try:
+            step.result = step.function(*step.args)
+        except Exception as exc:
+            print('Sequencer: step %s failed: %s !' % (step.name, exc))
+            step.status = 'FAIL'
+            return
+        finally:
+            step.finish = clock.time()
+        step.status = 'PASS' if step.result is not False else 'FAIL'
+
+    def run(self):
+        """
+        Executes all steps, then checks results with limits
+        Input:  none
+        Return: {step name : result}
+        """
+        queues = {}
+        for step in self.steps:
+            if step.instrument not in queues:
+                queues[step.instrument] = ThreadPoolExecutor(max_workers = 1)
+        try:
+            for step in self.steps:     #added in dependency order
+                step.future = queues[step.instrument].submit(self.execute,
+                                                             step)
+            for step in self.steps:
+                step.future.result()
+        finally:
+            for queue in queues.values():
+                queue.shutdown()
+            clock.sync()        #after the last step
+        ctx = self.ctx
+        if ctx == None:
+            ctx = error.Default
+        for step in self.steps:
+            if step.status == 'SKIP':
+                ctx.log.logText('    %s SKIPPED - prerequisite failed !'
+                                % step.name)
+            elif step.limits != None and step.status == 'PASS':
+                if not ctx.chkLimits(step.name, step.result, step.limits[0],
+                                     step.limits[1], step.unit):
+                    step.status = 'FAIL'
+            elif step.status == 'FAIL':
+                ctx.log.logError('%s step failed !' % step.name)
+                ctx.bumpError()
+        return dict([(step.name, step.result) for step in self.steps])
+
+    def criticalPath(self):
+        """
+        Longest chain of executed steps through dependencies and
+        instrument queues, tells which steps to speed up
+        Input:  none
+        Return: (time in s, list of step names)
+        """
+        longest = {}            #{step name : (time, path)}
+        lastOnQueue = {}        #{instrument : previous step}
+        for step in self.steps:
+            if step.start == None:
+                continue
+            duration = step.finish - step.start
+            best = (0., [])
+            before = [(self.byName[req], self.byName[req].settle)
+                      for req in step.after]
+            if step.instrument in lastOnQueue:
+                before.append((lastOnQueue[step.instrument], 0.))
+            for (prev, settle) in before:
+                if prev.name in longest:
+                    (t, path) = longest[prev.name]
+                    if t + settle > best[0]:
+                        best = (t + settle, path)
+            longest[step.name] = (best[0] + duration, best[1] + [step.name])
+            lastOnQueue[step.instrument] = step
+        if not longest:
+            return (0., [])
+        return max(longest.values(), key = lambda item: item[0])
+
+
+# Self test - supply settles while the simulated DAQ is configured
+# ================================================================
+if __name__ == '__main__':
+    import visasim, cdaq34972, csrc2722
+    from testlog import TestLog
+    print(copyr)
+    sim = visasim.ResourceManager(verbose = False)
+    dmm = cdaq34972.Daq34972(sim, '34972A')
+    src = csrc2722.Src2722(sim, 'U2722A')
+    dmm.open()
+    src.open()
+    sim.devices['34972A'].setSignal(101, 4.98)
+    err = error.Errors()
+    ctx = error.TestContext(dmm, src, None, TestLog('SEQ', sys.argv[0]), err)
+    seq = Sequencer(ctx)
+    seq.add('SET5V', src.configVoltSrc, 1, 5., .1, settle = .2)
+    seq.add('OUT', src.enableOutput, 1, True, after = ('SET5V',), settle = .2)
+    seq.add('CFG', dmm.configScan, '101', 'VOLT:DC', 10, 1)
+    seq.add('VCC', dmm.readSwitch, 101, after = ('OUT', 'CFG'),
+            limits = (4.8, 5.2))
+    print(seq.run())
+    print('Critical path %.3f s: %s' % seq.criticalPath())
+    dmm.close()
+    src.close()
+    if err.getErrorCount() != 0:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
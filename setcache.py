@@ -0,0 +1,127 @@
+"""
+Write-through cache of instrument setpoints. Drivers send setting
+commands through it, a command equal to the last one written for the
+same parameter and channel is not sent again. The cache is cleared
+when the instrument state is not known: open(), close(), *RST, soft
+reset, failed writes and writes bypassing the cache, batches included.
+Output enable commands are not cached, a protection trip switches the
+output off behind the driver.
+Use: self.setpoints = setcache.SetpointCache()      #in driver __init__
+     self.setpoints.write(self.handle, ('VOLT', channel), 'V1 3.000')
+     print(src.setpoints.stats())
+setcache.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'setcache.py (C) J.M.,rev.18-Oct-26'
+
+import sys
+
+def normalize(cmd):
+    """
+    Returns: command without termination, trailing ';' and spaces
+    """
+    return cmd.strip().rstrip(';').strip()
+
+class SetpointCache:
+    """
+    Last command written per (parameter, channel) of one instrument
+    """
+    def __init__(self, enabled = True):
+        """
+        Input:  enabled - False writes every command, statistics kept
+        """
+        self.enabled = enabled
+        self.values = {}        #{(parameter, channel) : command}
+        self.hits = 0           #writes skipped
+        self.misses = 0         #writes sent
+        self.invalidations = 0
+
+    def write(self, handle, key, cmd, clears = False):
+        """
+        Sends the command unless the parameter already holds it
+        Input:  handle - device handle
+                key - (parameter, channel), channel None if global
+                cmd - setting command
+                clears - True if the command may change other
+                         parameters, they are forgotten when written
+        Returns: True if written, False if skipped,
+                 raises exception if failed, the cache is cleared
+        """
+        if self.holds(key, cmd):
+            self.hits += 1
+            return False
+        try:
+            handle.write(cmd)
+        except Exception:
+            self.invalidate()
+            raise
+        if clears:
+            self.values = {}
+        self.values[key] = normalize(cmd)
+        self.misses += 1
+        return True
+
+    def holds(self, key, cmd):
+        """
+        Returns: True if the parameter holds the command, a write of it
+                 would be skipped
+        """
+        return self.enabled and self.values.get(key) == normalize(cmd)
+
+    def invalidate(self, channel = None):
+        """
+        Forgets the setpoints, e.g. after *RST or an error
+        Input:  channel - forget only parameters of the channel,
+                          None all
+        Return: none
+        """
+        if channel == None:
+            self.values = {}
+        else:
+            self.values = dict([(key, value) for (key, value)
+                                in self.values.items() if key[1] != channel])
+        self.invalidations += 1
+
+    def stats(self):
+        """
+        Returns: {'hits', 'misses', 'invalidations', 'hitRate'}
+        """
+        total = self.hits + self.misses
+        return {'hits' : self.hits, 'misses' : self.misses,
+                'invalidations' : self.invalidations,
+                'hitRate' : float(self.hits) / total if total else 0.}
+
+
+# Self test - repeated setpoints on a simulated supply
+# ====================================================
+if __name__ == '__main__':
+    import clock, visasim, cpl303
+    print(copyr)
+    clock.setClock(clock.VirtualClock())
+    sim = visasim.ResourceManager(verbose = False)
+    src = cpl303.Pl303(sim, 'PL303')
+    src.open()
+    for i in range(5):
+        src.setVoltage(1, 5.)
+        src.setCurLimit(1, .1)
+        src.enableOutput(1, True)
+    src.setVoltage(1, 3.3)
+    cache = src.setpoints.stats()
+    srcSim = sim.devices['PL303']
+    srcSim.chan[1]['out'] = False           #tripped behind the cache
+    src.enableOutput(1, True)
+    tripped = srcSim.chan[1]['out']
+    with src.batch() as b:
+        b.write('V1 2.0')
+    src.setVoltage(1, 3.3)                  #batch bypassed the cache
+    volt = srcSim.chan[1]['volt']
+    src.softReset()                         #writes *RST setpoints back
+    src.enableOutput(1, True)
+    print(cache)
+    if cache['hits'] != 8 or cache['misses'] != 3 or not tripped or \
+       volt != 3.3 or srcSim.chan[1]['volt'] != 0. or \
+       not srcSim.chan[1]['out']:
+        print('Done with error !')
+        sys.exit(2)
+    src.close()
+    print('OK')
+    sys.exit(0)
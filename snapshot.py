@@ -0,0 +1,200 @@
+"""
+Named configuration snapshots of instruments for fast switching of test
+profiles. Writes done by a configuration function are captured once;
+models with setup memory store the result by *SAV and recall it by a
+single *RCL, others keep the captured commands on the host and recall
+them by one batched write. Driver attributes (configured function,
+NPLC, ...) are restored with the instrument setup.
+Use: prof = snapshot.Profiles(dmm)
+     prof.capture('VOLTS', dmm.configScan, '101:110', 'VOLT:DC', 10, 1)
+     prof.capture('OHMS', dmm.configScan, '101:110', 'RES', 1e4, 1)
+     prof.recall('VOLTS')
+snapshot.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'snapshot.py (C) J.M.,rev.18-Oct-26'
+
+import sys, copy
+
+# driver attributes holding configuration, saved and restored with
+# the instrument setup; runtime state (settling, closed switches, ...)
+# is not touched by recall()
+configAttributes = ('func', 'rng', 'nplc', 'channelConfig', 'function',
+                    'maxV')
+
+def joinCommands(commands, separator = None):
+    """
+    Joins commands to one message
+    Input:  commands - list of command strings
+            separator - None for SCPI: commands joined by ';' and
+                        prefixed by ':' to start from the root of the
+                        command tree except common '*' commands,
+                        otherwise the string used to join
+    Returns: message string
+    """
+    units = [cmd.strip().rstrip(';').strip() for cmd in commands]
+    units = [unit for unit in units if unit != '']
+    if separator != None:
+        return separator.join(units)
+    message = []
+    for unit in units:
+        if message and unit[0] not in '*:':
+            unit = ':' + unit
+        message.append(unit)
+    return ';'.join(message)
+
+class Recorder:
+    """
+    Handle wrapper capturing written commands, queries pass through
+    """
+    def __init__(self, handle):
+        self.__dict__['handle'] = handle
+        self.__dict__['commands'] = []
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.handle, name, value)
+
+    def write(self, cmd):
+        self.commands.append(cmd)
+        self.handle.write(cmd)
+
+class Profile:
+    """
+    One captured configuration
+    """
+    def __init__(self, name, slot, message, attributes):
+        self.name = name
+        self.slot = slot            #*SAV location, None if host batch
+        self.message = message      #batched commands if host batch
+        self.attributes = attributes
+
+class Profiles:
+    """
+    Named configurations of one opened driver
+    """
+    def __init__(self, driver, useMemory = True):
+        """
+        Input:  driver - opened driver instance
+                useMemory - use instrument memory if the driver lists
+                            memorySlots, False always batch on host
+        """
+        self.driver = driver
+        self.profiles = {}      #{name : Profile}
+        self.useMemory = useMemory
+        if not hasattr(driver, 'freeSlots'):    #shared by all Profiles
+            driver.freeSlots = list(getattr(driver, 'memorySlots', ()))
+
+    def capture(self, name, configure, *args):
+        """
+        Runs configuration function and stores the configuration
+        Input:  name - profile name
+                configure - driver method or function configuring the
+                            instrument, called with args
+        Returns: result of configure(), profile not stored if False
+        """
+        driver = self.driver
+        if getattr(driver, 'setpoints', None) != None:
+            driver.setpoints.invalidate()   #every setting is recorded
+        recorder = Recorder(driver.handle)
+        driver.handle = recorder
+        try:
+            result = configure(*args)
+        finally:
+            driver.handle = recorder.handle
+        if result is False:
+            print('Profiles.capture() ' + name + ' configuration failed !')
+            return result
+        attributes = copy.deepcopy(dict([(key, value) for (key, value)
+                     in vars(driver).items() if key in configAttributes]))
+        old = self.profiles.get(name)
+        if old != None and old.slot != None:
+            slot = old.slot
+        elif self.useMemory and len(driver.freeSlots) != 0:
+            slot = driver.freeSlots.pop(0)
+        else:
+            slot = None
+        try:
+            if slot != None:
+                driver.handle.write('*SAV %d' % slot)
+                message = None
+            else:
+                message = joinCommands(recorder.commands,
+                                       getattr(driver, 'batchSeparator', None))
+        except Exception:
+            print('Profiles.capture() storing ' + name + ' failed !')
+            raise
+        self.profiles[name] = Profile(name, slot, message, attributes)
+        return result
+
+    def recall(self, name):
+        """
+        Brings the instrument and driver to a captured configuration
+        Input:  name - profile name
+        Returns: True if OK, False if not captured
+        """
+        profile = self.profiles.get(name)
+        if profile == None:
+            print('Profiles.recall() unknown profile ' + name + ' !')
+            return False
+        try:
+            if profile.slot != None:
+                self.driver.handle.write('*RCL %d' % profile.slot)
+            elif profile.message != '':
+                self.driver.handle.write(profile.message)
+        except Exception:
+            print('Profiles.recall() ' + name + ' failed !')
+            raise
+        self.driver.__dict__.update(copy.deepcopy(profile.attributes))
+        if getattr(self.driver, 'setpoints', None) != None:
+            self.driver.setpoints.invalidate()  #written bypassing the cache
+        return True
+
+
+# Self test - switches profiles of simulated DAQ and supply
+# ========================================================
+if __name__ == '__main__':
+    import clock, visasim, cdaq34972, cpl303
+    print(copyr)
+    clock.setClock(clock.VirtualClock())
+    sim = visasim.ResourceManager(verbose = False)
+    dmm = cdaq34972.Daq34972(sim, '34972A')
+    src = cpl303.Pl303(sim, 'PL303')
+    dmm.open()
+    src.open()
+    dmmProf = Profiles(dmm)
+    srcProf = Profiles(src)
+    dmmProf.capture('VOLTS', dmm.configScan, '101:110', 'VOLT:DC', 10, 1)
+    dmmProf.capture('OHMS', dmm.configScan, '101:110', 'RES', 1e4, 10)
+    otherProf = Profiles(dmm)       #takes slots not used by dmmProf
+    otherProf.capture('AC', dmm.configScan, '101:110', 'VOLT:AC', 10, 1)
+    def supply(volt):
+        src.setVoltage(1, volt)
+        src.setCurLimit(1, .1)
+        return src.enableOutput(1, True)
+    srcProf.capture('5V', supply, 5.)
+    srcProf.capture('3V3', supply, 3.3)
+    startTime = clock.time()
+    dmmProf.recall('VOLTS')
+    srcProf.recall('5V')
+    print('Recall %.4f s' % (clock.time() - startTime))
+    dmmSim = sim.devices['34972A']
+    srcSim = sim.devices['PL303']
+    dmm.settle = (.01, 1., .02)     #runtime state kept by recall()
+    dmmProf.recall('OHMS')
+    if dmmSim.config[101][0] != 'RES' or dmm.nplc != 10 or \
+       dmm.settle == None or dmm.channelConfig[110][0] != 'RES' or \
+       otherProf.profiles['AC'].slot in (1, 2):
+        print('Done with error !')
+        sys.exit(2)
+    dmmProf.recall('VOLTS')
+    if dmmSim.config[101][0] != 'VOLT:DC' or dmm.nplc != 1 or \
+       srcSim.chan[1]['volt'] != 5. or dmmSim.errors or srcSim.errors:
+        print('Done with error !')
+        sys.exit(2)
+    print(srcProf.profiles['5V'].message)
+    dmm.close()
+    src.close()
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,286 @@
+"""
+Long-lived station service keeping instrument sessions open across
+boards. Drivers are opened once, between boards what the previous
+board changed is undone by the driver softReset(), verified by the
+instrument; full *RST if the board wrote configuration the soft reset
+can't undo or the soft reset can not be verified.
+Use: st = station.Station(visa.ResourceManager())
+     st.add('dmm', cdaq34972.Daq34972, '34972A')
+     st.add('src', csrc2722.Src2722, 'U2722A')
+     st.add('k3706', cdaq3706.Daq3706, 'K3706',
+            setup = cdaq3706.Daq3706.scanSlots)
+     st.bringUp()       #opens and identifies all instruments concurrently
+     for board in boards:
+         dmm = st.get('dmm')
+         ... test the board ...
+         st.nextBoard()
+     st.close()
+station.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'station.py (C) J.M.,rev.18-Oct-26'
+
+import sys, threading
+from concurrent.futures import ThreadPoolExecutor
+import clock
+import businstr
+
+# model expected in *IDN? response of instruments of each driver class
+models = {'Daq34972' : '34972A', 'Dvm34411' : '34411A', 'Daq3706' : '3706',
+          'Src2722' : 'U2722A', 'SrcHameg' : 'HMP', 'Hmp4030' : 'HMP4030',
+          'Pl303' : 'PL303', 'Gen33220' : '33220A'}
+
+class Session:
+    """
+    Device handle wrapper remembering mnemonics of commands changing
+    the instrument state since the last reset
+    """
+    def __init__(self, handle):
+        self.__dict__['handle'] = handle
+        self.__dict__['changed'] = set()
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.handle, name, value)   #VISA attributes like timeout
+
+    def track(self, cmd):
+        for name in businstr.mnemonic(cmd).split(';'):
+            if name != '' and not name.endswith('?') and \
+               not name.startswith('print('):
+                self.changed.add(name)
+
+    def write(self, cmd):
+        self.track(cmd)
+        self.handle.write(cmd)
+
+    def ask(self, cmd):
+        self.track(cmd)
+        return self.handle.ask(cmd)
+
+class SessionManager:
+    """
+    Resource manager wrapper handing out Session handles
+    """
+    def __init__(self, rm):
+        self.rm = rm
+
+    def __getattr__(self, name):
+        return getattr(self.rm, name)
+
+    def get_instrument(self, visaName, **kwargs):
+        return Session(self.rm.get_instrument(visaName, **kwargs))
+
+class Entry:
+    """
+    Instrument of the station
+    """
+    def __init__(self, driverClass, visaName, args, model, setup):
+        self.driverClass = driverClass
+        self.visaName = visaName
+        self.args = args
+        if model == None:
+            model = models.get(driverClass.__name__)
+        self.model = model      #expected in *IDN?, None not verified
+        self.setup = setup      #function called with driver after open
+        self.driver = None      #created and opened by Station.get()
+        self.idn = None
+        self.lock = threading.Lock()    #serializes opening
+        self.resets = {'soft' : 0, 'full' : 0}
+
+class Station:
+    """
+    Pool of opened drivers handed out to board tests
+    """
+    def __init__(self, rm):
+        """
+        Input:  rm - resource manager, e.g. visa.ResourceManager()
+        """
+        self.rm = SessionManager(rm)
+        self.entries = {}       #{name : Entry}
+
+    def add(self, name, driverClass, visaName, *args, model = None,
+            setup = None):
+        """
+        Registers an instrument, opened at first get() or by bringUp()
+        Input:  name - instrument name in the station
+                driverClass - driver class, e.g. cdaq34972.Daq34972
+                visaName - VISA address
+                args - further constructor parameters
+                model - string expected in *IDN? response, default by
+                        driver class
+                setup - function called with the opened driver, e.g.
+                        cdaq3706.Daq3706.scanSlots
+        Return: none
+        """
+        self.entries[name] = Entry(driverClass, visaName, args, model, setup)
+
+    def get(self, name):
+        """
+        Returns: opened driver instance, opened and reset at first use
+        """
+        entry = self.entries.get(name)
+        if entry == None:
+            print('Station.get() unknown instrument ' + name + ' !')
+            raise KeyError(name)
+        with entry.lock:
+            if entry.driver == None:
+                driver = entry.driverClass(self.rm, entry.visaName,
+                                           *entry.args)
+                driver.open()
+                if entry.setup != None:
+                    entry.setup(driver)
+                driver.handle.changed.clear()
+                entry.driver = driver
+        return entry.driver
+
+    def identify(self, name):
+        """
+        Opens an instrument and verifies its model by *IDN?
+        Input:  name - instrument name
+        Returns: (time to ready in s, *IDN? response)
+                 raises exception if open failed or model differs
+        """
+        entry = self.entries[name]
+        startTime = clock.time()
+        driver = self.get(name)
+        try:
+            idn = driver.handle.ask('*IDN?').strip()
+        except Exception:
+            print('Station: ' + name + ' *IDN? failed !')
+            raise
+        entry.idn = idn
+        if entry.model != None and entry.model.upper() not in idn.upper():
+            print('Station: %s expected %s, found %s !' % (name, entry.model,
+                                                           idn))
+            raise IOError(name + ' is not ' + entry.model)
+        return (clock.time() - startTime, idn)
+
+    def bringUp(self, workers = None):
+        """
+        Opens, resets and identifies all instruments concurrently, the
+        station is ready after the slowest instrument, not the sum
+        Input:  workers - threads used, default one per instrument
+        Returns: {instrument name : (time to ready in s, *IDN? response)}
+                 raises IOError listing instruments which failed
+        """
+        if workers == None:
+            workers = max(len(self.entries), 1)
+        report = {}
+        failed = []
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            futures = [(name, pool.submit(self.identify, name))
+                       for name in self.entries]
+            for (name, future) in futures:
+                try:
+                    report[name] = future.result()
+                except Exception as exc:
+                    print('Station.bringUp() %s failed: %s !' % (name, exc))
+                    failed.append(name)
+        clock.sync()            #ready after the slowest instrument
+        for (name, (ready, idn)) in sorted(report.items()):
+            print('    %-12s ready in %6.3f s  %s' % (name, ready, idn))
+        if failed:
+            raise IOError('Station.bringUp() failed: ' + ', '.join(failed))
+        return report
+
+    def resetInstrument(self, name):
+        """
+        Brings one opened instrument to the state after open(), soft reset
+        if only commands the driver can undo were written and the reset
+        is verified, *RST on the opened session otherwise
+        Input:  name - instrument name
+        Returns: 'soft', 'full' or None if not opened
+        """
+        entry = self.entries[name]
+        driver = entry.driver
+        if driver == None:
+            return None
+        changed = set(driver.handle.changed)
+        try:
+            clean = driver.softReset(changed)
+        except Exception:
+            clean = False
+        if clean:
+            kind = 'soft'
+        else:
+            undoable = set(getattr(driver, 'transient', ())) | \
+                       set(getattr(driver, 'rstValues', ()))
+            if not [m for m in changed if m not in undoable]:
+                print('Station: ' + name + ' soft reset failed, *RST used !')
+            driver.reset()
+            kind = 'full'
+        driver.handle.changed.clear()
+        entry.resets[kind] += 1
+        return kind
+
+    def nextBoard(self):
+        """
+        Prepares all opened instruments for the next board
+        Input:  none
+        Returns: {instrument name : (reset kind, time in s)}
+        """
+        report = {}
+        for name in self.entries:
+            startTime = clock.time()
+            kind = self.resetInstrument(name)
+            if kind != None:
+                report[name] = (kind, clock.time() - startTime)
+        return report
+
+    def close(self):
+        """
+        Closes all opened instruments with full reset
+        Return: none
+        """
+        for entry in self.entries.values():
+            if entry.driver != None:
+                try:
+                    entry.driver.close()
+                except Exception:
+                    print('Station.close() closing ' + entry.visaName +
+                          ' failed !')
+                entry.driver = None
+
+
+# Self test - three boards on simulated instruments
+# =================================================
+if __name__ == '__main__':
+    import visasim, cdaq34972, csrc2722, cgen33220
+    print(copyr)
+    clock.setClock(clock.VirtualClock())
+    sim = visasim.ResourceManager(verbose = False)
+    st = Station(sim)
+    st.add('dmm', cdaq34972.Daq34972, '34972A')
+    st.add('src', csrc2722.Src2722, 'U2722A')
+    st.add('gen', cgen33220.Gen33220, '33220A')
+    st.bringUp()
+    for board in range(3):
+        startTime = clock.time()
+        dmm = st.get('dmm')
+        src = st.get('src')
+        st.get('gen')
+        src.configVoltSrc(1, 5., .1)
+        src.enableOutput(1, True)
+        dmm.configScan('101', 'VOLT:DC', 10, 1)
+        dmm.controlSwitch(101, True)
+        dmm.read()
+        handle = dmm.handle
+        report = st.nextBoard()
+        print('Board %d %.3f s %s' % (board, clock.time() - startTime,
+                                      report))
+        chan = sim.devices['U2722A'].chan[1]
+        if chan['out'] or chan['volt'] != 0. or chan['mode'] != 'VOLT' or \
+           sim.devices['34972A'].closed or report['dmm'][0] != 'full' or \
+           report['src'][0] != 'soft' or dmm.handle is not handle:
+            print('Done with error !')
+            sys.exit(2)
+    st.get('dmm').controlSwitch(102, True)  #no configuration written
+    report = st.nextBoard()
+    print('Switching only %s' % report)
+    if report['dmm'][0] != 'soft' or sim.devices['34972A'].closed:
+        print('Done with error !')
+        sys.exit(2)
+    st.close()
+    print('OK')
+    sys.exit(0)
@@ -21,6 +21,7 @@ class TestLog():
         self.fileName = self.rootName + '_0000' + extension
         self.path = mainPath
         self.extension = extension
+        self.tracer = None  # timeline off, see setTracer()
 
     def openLog(self):
         """
@@ -127,6 +128,8 @@ class TestLog():
         """
         line = '**** Error: ' + line
         print(line)  # display on screen
+        if self.tracer != None:
+            self.tracer.logLine(line)
         if self.file != None:
             line = line + '\n'
             try:
@@ -140,6 +143,8 @@ class TestLog():
         Simply displays and puts to log file a line of text        
         """
         print(line)
+        if self.tracer != None:
+            self.tracer.logLine(line)
         if self.file != None:
             line = line + '\n'
             try:
@@ -154,6 +159,8 @@ class TestLog():
         """
         line = '       '+'%-16s = %f %s' % (name, v, unit)
         print(line)
+        if self.tracer != None:
+            self.tracer.logLine(line)
         if self.file != None:
             line = line + '\n'
             try:
@@ -162,6 +169,12 @@ class TestLog():
                 print('Writing to log failed !')
                 raise
 
+    def setTracer(self, tracer):
+        """
+        Put logged lines on the timeline, None stops tracing
+        """
+        self.tracer = tracer
+
     def flushLog(self):
         """
         Flushes file buffers
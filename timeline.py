@@ -0,0 +1,187 @@
+"""
+Timeline tracer of test runs exporting Chrome/Perfetto trace-event JSON
+(open in chrome://tracing or ui.perfetto.dev). One track per instrument
+shows its commands and the sleeps following them, one track per test
+thread shows chkLimits() results and log lines.
+Use: tracer = timeline.Tracer('run.json')
+     rm = businstr.InstrumentedManager(visa.ResourceManager(),
+                                       stats = tracer)
+     ctx.setTracer(tracer), log.setTracer(tracer)
+     ... test ...
+     rm.close() or tracer.close() writes the file
+timeline.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'timeline.py (C) J.M.,rev.18-Oct-26'
+
+import sys, json, threading
+import clock
+import businstr
+
+class Tracer:
+    """
+    Collects trace events, can be used as statistics of
+    businstr.InstrumentedManager
+    """
+    def __init__(self, fileName = 'trace.json'):
+        """
+        Input:  fileName - exported JSON file
+        """
+        self.fileName = fileName
+        self.events = []
+        self.tracks = {}        #{track name : tid}
+        self.lock = threading.Lock()
+        self.local = threading.local()  #instrument used last by a thread
+        self.startTime = clock.time()
+        clock.addListener(self.sleep)
+
+    def track(self, name):
+        """
+        Returns: tid of the track, new track added with its name
+        """
+        with self.lock:
+            tid = self.tracks.get(name)
+            if tid == None:
+                tid = len(self.tracks) + 1
+                self.tracks[name] = tid
+                self.events.append({'ph' : 'M', 'name' : 'thread_name',
+                                    'pid' : 1, 'tid' : tid,
+                                    'args' : {'name' : name}})
+        return tid
+
+    def scriptTrack(self):
+        """
+        Returns: track name of the calling test thread
+        """
+        thread = threading.current_thread()
+        if thread is threading.main_thread():
+            return 'script'
+        return 'script ' + thread.name
+
+    def timestamp(self, t):
+        """
+        Returns: trace time in us of clock time t
+        """
+        return (t - self.startTime) * 1e6
+
+    def complete(self, track, name, start, duration, args = None):
+        """
+        Adds event with duration
+        Input:  track - track name
+                name - event name
+                start - clock time of the start
+                duration - in s
+                args - dictionary displayed with the event
+        """
+        event = {'ph' : 'X', 'name' : name, 'pid' : 1,
+                 'tid' : self.track(track), 'ts' : self.timestamp(start),
+                 'dur' : duration * 1e6}
+        if args != None:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+
+    def instant(self, track, name, args = None):
+        """
+        Adds event without duration at current time
+        """
+        event = {'ph' : 'i', 's' : 't', 'name' : name, 'pid' : 1,
+                 'tid' : self.track(track),
+                 'ts' : self.timestamp(clock.time())}
+        if args != None:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+
+    def record(self, instrument, cmd, sent, received, latency):
+        """
+        Adds bus transaction, called by businstr.InstrumentedHandle
+        """
+        name = businstr.mnemonic(cmd)
+        if name == '':
+            name = 'read'
+        self.complete(instrument, name, clock.time() - latency, latency,
+                      {'cmd' : cmd, 'sent' : sent, 'received' : received})
+        self.local.instrument = instrument
+
+    def sleep(self, seconds):
+        """
+        Clock listener adding sleep to the track of instrument used last
+        """
+        if seconds <= 0:
+            return
+        track = getattr(self.local, 'instrument', None)
+        if track == None:
+            track = self.scriptTrack()
+        self.complete(track, 'sleep', clock.time(), seconds)
+
+    def check(self, name, value, passed):
+        """
+        Adds limit check result, called by error.TestContext.chkLimits()
+        """
+        self.local.instrument = None
+        self.instant(self.scriptTrack(), name,
+                     {'value' : value, 'pass' : passed})
+
+    def logLine(self, line):
+        """
+        Adds log line, called by testlog.TestLog
+        """
+        self.instant(self.scriptTrack(), 'log', {'text' : line})
+
+    def export(self, path = None):
+        """
+        Writes trace JSON to fileName or given path
+        """
+        if path == None:
+            path = self.fileName
+        with self.lock:
+            events = list(self.events)
+        try:
+            outFile = open(path, 'w')
+            json.dump({'traceEvents' : events, 'displayTimeUnit' : 'ms'},
+                      outFile)
+            outFile.close()
+        except Exception:
+            print('Tracer.export() writing ' + path + ' failed !')
+            raise
+
+    def close(self):
+        """
+        Stops tracing sleeps and exports the trace
+        """
+        clock.removeListener(self.sleep)
+        self.export()
+
+
+# Self test - traces simulated 34972A and U2722A
+# ==============================================
+if __name__ == '__main__':
+    import os
+    import visasim, cdaq34972, csrc2722
+    print(copyr)
+    clock.setClock(clock.VirtualClock())
+    fileName = 'timeline_test.json'
+    tracer = Tracer(fileName)
+    rm = businstr.InstrumentedManager(visasim.ResourceManager(verbose = False),
+                                      stats = tracer)
+    dvm = cdaq34972.Daq34972(rm, '34972A')
+    src = csrc2722.Src2722(rm, 'U2722A')
+    dvm.open()
+    src.open()
+    dvm.configScan('101', 'VOLT:DC', 10, 1)
+    src.configVoltSrc(1, 5., .1)
+    for i in range(3):
+        volt = dvm.readSwitch(101)
+        tracer.check('VCC', volt, True)
+    src.close()
+    dvm.close()
+    rm.close()
+    trace = json.load(open(fileName))
+    os.remove(fileName)
+    print('%d events on %d tracks' % (len(trace['traceEvents']),
+                                      len(tracer.tracks)))
+    if len(tracer.tracks) != 3:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
@@ -0,0 +1,307 @@
+"""
+Record/replay transport mimicking interface of the VISA library.
+Record mode wraps a real resource manager and logs every write, ask
+and read with time, response and duration. Replay mode serves recorded
+responses instead of instruments with original or scaled timing.
+Use: replace the 'import visa' command with 'import visarec as visa'
+     and set visarec.mode, visarec.logName before ResourceManager()
+     is created, or create ResourceManager(logName, mode) directly.
+Log line: time, VISA name, operation (O, C, W, A, R), command,
+          response, duration separated by tabs
+visarec.py (C) J.M.,rev.18-Oct-26
+"""
+copyr = 'visarec.py (C) J.M.,rev.18-Oct-26'
+
+import sys, bisect
+import clock
+
+logName = 'visarec.log'     #default log file
+mode = 'replay'             #default mode, 'record' or 'replay'
+scale = 1.                  #replay timing scale, 0 - no waiting
+strict = False              #replay requires the same command sequence
+
+def escape(text):
+    """
+    Makes string safe for one line of the log
+    """
+    text = text.replace('\\', '\\\\').replace('\t', '\\t')
+    return text.replace('\n', '\\n').replace('\r', '\\r')
+
+def unescape(text):
+    """
+    Inverse of escape()
+    """
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            i += 1
+            c = {'t' : '\t', 'n' : '\n', 'r' : '\r'}.get(text[i], text[i])
+        out.append(c)
+        i += 1
+    return ''.join(out)
+
+class Record:
+    """
+    One logged operation
+    """
+    def __init__(self, t, visaName, op, cmd, response, duration):
+        self.t = t
+        self.visaName = visaName
+        self.op = op
+        self.cmd = cmd
+        self.response = response
+        self.duration = duration
+
+class ResourceManager:
+    """
+    Resource manager recording traffic of a real one or replaying it
+    """
+    def __init__(self, fileName = None, recMode = None, rm = None,
+                 timeScale = None, clk = clock, exact = None):
+        """
+        Input:  fileName - log file, default module logName
+                recMode - 'record' or 'replay', default module mode
+                rm - resource manager to be recorded, default
+                     vendor VISA loaded by backend
+                timeScale - replay timing scale, default module scale
+                clk - object with time() and sleep(), default clock module
+                exact - replay requires the same command sequence,
+                        default module strict
+        """
+        if fileName == None:
+            fileName = logName
+        if recMode == None:
+            recMode = mode
+        if timeScale == None:
+            timeScale = scale
+        if exact == None:
+            exact = strict
+        self.strict = exact
+        self.fileName = fileName
+        self.mode = recMode
+        self.scale = timeScale
+        self.clock = clk
+        self.rm = rm
+        self.records = {}       #{visa name : list of Record} for replay
+        self.logFile = None
+        if self.mode == 'record':
+            if self.rm == None:
+                import backend
+                self.rm = backend.resourceManager('visa')
+            try:
+                self.logFile = open(self.fileName, 'w')
+            except Exception:
+                print('visarec: opening ' + self.fileName + ' failed !')
+                raise
+            self.startTime = self.clock.time()
+        else:
+            self.load()
+
+    def load(self):
+        """
+        Reads the log for replay
+        """
+        try:
+            logFile = open(self.fileName, 'r')
+        except Exception:
+            print('visarec: ' + self.fileName + ' not found !')
+            raise
+        for line in logFile:
+            items = line.rstrip('\n').split('\t')
+            if len(items) != 6:
+                continue
+            rec = Record(float(items[0]), unescape(items[1]), items[2],
+                         unescape(items[3]), unescape(items[4]),
+                         float(items[5]))
+            self.records.setdefault(rec.visaName, []).append(rec)
+        logFile.close()
+
+    def log(self, visaName, op, cmd, response, startTime):
+        """
+        Writes one line of the log in record mode
+        """
+        duration = self.clock.time() - startTime
+        line = '%.6f\t%s\t%s\t%s\t%s\t%.6f\n' % (startTime - self.startTime,
+                escape(visaName), op, escape(cmd), escape(response), duration)
+        self.logFile.write(line)
+
+    def get_instrument(self, visaName, **kwargs):
+        """
+        Opens a device, recording or replaying
+        Input:      visa name
+                    kwargs - VISA attributes passed to recorded manager
+        Returns:    device class
+        """
+        if self.mode == 'record':
+            startTime = self.clock.time()
+            handle = self.rm.get_instrument(visaName, **kwargs)
+            self.log(visaName, 'O', '', '', startTime)
+            return RecordingDevice(self, visaName, handle)
+        if visaName not in self.records:
+            raise IOError('visarec: ' + visaName + ' not recorded !')
+        return ReplayDevice(self, visaName, self.records[visaName])
+
+    def close(self):
+        """
+        Closes the log and recorded resource manager
+        """
+        if self.logFile != None:
+            self.logFile.close()
+            self.logFile = None
+        if self.rm != None:
+            self.rm.close()
+
+class RecordingDevice:
+    """
+    Wraps a real device handle, logs its traffic
+    """
+    def __init__(self, rm, visaName, handle):
+        self.__dict__['recRm'] = rm
+        self.__dict__['visaName'] = visaName
+        self.__dict__['handle'] = handle
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.handle, name, value)   #VISA attributes like timeout
+
+    def write(self, cmd):
+        startTime = self.recRm.clock.time()
+        self.handle.write(cmd)
+        self.recRm.log(self.visaName, 'W', cmd, '', startTime)
+
+    def read(self):
+        startTime = self.recRm.clock.time()
+        response = self.handle.read()
+        self.recRm.log(self.visaName, 'R', '', response, startTime)
+        return response
+
+    def ask(self, cmd):
+        startTime = self.recRm.clock.time()
+        response = self.handle.ask(cmd)
+        self.recRm.log(self.visaName, 'A', cmd, response, startTime)
+        return response
+
+    def close(self):
+        startTime = self.recRm.clock.time()
+        self.handle.close()
+        self.recRm.log(self.visaName, 'C', '', '', startTime)
+
+class ReplayDevice:
+    """
+    Serves recorded responses of one device. In strict mode the command
+    sequence has to match the recording. Otherwise queries are matched to
+    the next recorded query with the same command and other operations
+    take typical recorded duration, so changed drivers can be replayed.
+    """
+    def __init__(self, rm, visaName, records):
+        self.rm = rm
+        self.visaName = visaName
+        self.records = records
+        self.pos = 0            #next record to be replayed
+        self.index = {}         #{(operation, command) : record positions}
+        durations = {}
+        for (i, rec) in enumerate(records):
+            durations.setdefault(rec.op, []).append(rec.duration)
+            self.index.setdefault((rec.op, rec.cmd), []).append(i)
+        self.typical = {}       #{operation : median duration}
+        for (op, values) in durations.items():
+            values.sort()
+            self.typical[op] = values[len(values) // 2]
+        self.wait(self.next('O', ''))
+
+    def wait(self, rec):
+        """
+        Spends scaled duration of the record
+        """
+        self.rm.clock.sleep(rec.duration * self.rm.scale)
+
+    def next(self, op, cmd):
+        """
+        Finds record matching the operation
+        Input:  op - operation 'O', 'C', 'W', 'A', 'R'
+                cmd - command sent
+        Returns: Record, made up with typical duration if write or close
+                 not recorded
+        """
+        if self.rm.strict:
+            if self.pos >= len(self.records):
+                raise IOError('visarec: ' + self.visaName + ' replay end !')
+            rec = self.records[self.pos]
+            if rec.op != op or rec.cmd != cmd:
+                raise IOError('visarec: %s expected %s "%s", got %s "%s" !'
+                              % (self.visaName, rec.op, rec.cmd, op, cmd))
+            self.pos += 1
+            return rec
+        positions = self.index.get((op, cmd))
+        if positions:               #next one forward, wrap around
+            i = bisect.bisect_left(positions, self.pos)
+            found = positions[i % len(positions)]
+            self.pos = (found + 1) % len(self.records)
+            return self.records[found]
+        if op in ('A', 'R'):
+            raise IOError('visarec: %s query "%s" not recorded !'
+                          % (self.visaName, cmd))
+        return Record(0., self.visaName, op, cmd, '',
+                      self.typical.get(op, self.typical.get('W', 0.)))
+
+    def write(self, cmd):
+        self.wait(self.next('W', cmd))
+
+    def read(self):
+        rec = self.next('R', '')
+        self.wait(rec)
+        return rec.response
+
+    def ask(self, cmd):
+        rec = self.next('A', cmd)
+        self.wait(rec)
+        return rec.response
+
+    def close(self):
+        self.wait(self.next('C', ''))
+
+# Self test - records visasim traffic and replays it
+# ==================================================
+if __name__ == '__main__':
+    import os
+    import visasim
+    print(copyr)
+    fileName = 'visarec_test.log'
+    sim = visasim.ResourceManager(verbose = False)
+    rm = ResourceManager(fileName, 'record', sim, clk = sim.clock)
+    dev = rm.get_instrument('34972A')
+    dev.write('CONF:VOLT:DC 10,(@101)')
+    dev.write('ROUT:CLOS (@101)')
+    recorded = dev.ask('READ?')
+    dev.close()
+    rm.close()
+    recTime = sim.clock.time()
+
+    clk = visasim.VirtualClock()
+    rm = ResourceManager(fileName, 'replay', timeScale = 1., clk = clk)
+    dev = rm.get_instrument('34972A')
+    dev.write('CONF:VOLT:DC 10,(@101)')
+    dev.write('ROUT:CLOS (@101)')
+    replayed = dev.ask('READ?')
+    dev.close()
+    rm.close()
+    print('Recorded %s in %.4f s, replayed %s in %.4f s'
+          % (recorded, recTime, replayed, clk.time()))
+    rm = ResourceManager(fileName, 'replay', clk = visasim.VirtualClock())
+    dev = rm.get_instrument('34972A')       #changed order, wraps around
+    reordered = [dev.ask('READ?'), dev.ask('READ?')]
+    dev.write('ROUT:CLOS (@101)')
+    dev.write('CONF:VOLT:DC 10,(@101)')
+    dev.write('ROUT:OPEN (@101)')           #not recorded
+    dev.close()
+    rm.close()
+    os.remove(fileName)
+    if recorded != replayed or reordered != [recorded, recorded]:
+        print('Done with error !')
+        sys.exit(2)
+    print('OK')
+    sys.exit(0)
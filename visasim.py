@@ -4,37 +4,141 @@ instruments available. Mimics interface of the VISA library.
 Prints actions done in VISA.
 Use: replace the 'import visa' command in module you want to debug
      with 'import visasim as visa' command
-visasim.py (C) J.M.,rev.23-Jan-15
+Devices account time spent on the bus, in integration, relay settling
+and reset according to their timing model on a virtual clock, so
+throughput of drivers can be benchmarked without instruments and
+without real waiting. Total simulated time is rm.clock.time(), the
+clock is shared with drivers if clock.setClock(VirtualClock()) is done
+before the resource manager is created.
+SocketServer runs the emulators as a multi-client asyncio TCP server,
+one port per instrument, with configurable network latency and jitter,
+so socket transports are developed and measured without instruments:
+     python visasim.py 5025=34972A 5026=U2722A --latency=.0005
+visasim.py (C) J.M.,rev.18-Oct-26
 """
 
-copyr = 'visasim.py (C) J.M.,rev.23-Jan-15'
+copyr = 'visasim.py (C) J.M.,rev.18-Oct-26'
+
+import sys, re, copy, random, threading, asyncio
+import clock
+from clock import VirtualClock
+
+class Timing:
+    """
+    Timing model of a simulated instrument.
+    Message time = busLatency + byteTime * message length,
+    reading takes nplc / lineFreq integration time,
+    relay switching and *RST keep the device busy for relayTime and
+    rstTime, the next message waits until the device is ready.
+    """
+    def __init__(self, busLatency = .001, byteTime = 1e-6, lineFreq = 50.,
+                 relayTime = .005, rstTime = .3):
+        """
+        Input:  busLatency - time of one message transaction in s
+                byteTime - transfer time of one byte in s
+                lineFreq - power line frequency in Hz for NPLC
+                relayTime - relay switching and settling time in s
+                rstTime - duration of *RST in s
+        """
+        self.busLatency = busLatency
+        self.byteTime = byteTime
+        self.lineFreq = lineFreq
+        self.relayTime = relayTime
+        self.rstTime = rstTime
+
+    def messageTime(self, message):
+        """
+        Input:  message - string transferred
+        Returns: transfer time in s
+        """
+        return self.busLatency + self.byteTime * len(message)
+
+    def integrationTime(self, nplc):
+        """
+        Input:  nplc - integration time in power line cycles
+        Returns: integration time in s
+        """
+        return nplc / self.lineFreq
+
+# patterns of commands the timing model depends on
+nplcCmd = re.compile(r'NPLC\s+([-+0-9.eE]+)|dmm\.nplc\s*=\s*([-+0-9.eE]+)')
+relayCmd = re.compile(r'ROUT:(CLOS|OPEN)|channel\.(close|open)', re.IGNORECASE)
+readCmd = re.compile(r'READ\?|MEAS|dmm\.measure', re.IGNORECASE)
 
 class ResourceManager:
     """
     Creates/deletes device instances
     Keeps list of assigned devices    
     """
-    def __init__(self):
+    def __init__(self, clk = None, timing = None, verbose = True):
         """
         Initializes counter of assigned handles and list of devices
+        Input:      clk - clock accounting simulated time, default the
+                          active clock if virtual, new VirtualClock otherwise
+                    timing - default Timing of devices, default Timing()
+                    verbose - False suppresses printing of actions
         Returns ResourceManager class instance
         """
         self.devices = {}    #dictionary of assigned handles and visa names
-        print('Resource manager created.')
+        if clk == None:
+            clk = clock.getClock()
+            if not isinstance(clk, VirtualClock):
+                clk = VirtualClock()
+        if timing == None:
+            timing = Timing()
+        self.clock = clk
+        self.timing = timing
+        self.timings = {}    #{visa name : Timing} of individual devices
+        self.models = {}     #{visa name : emulator class} set explicitly
+        self.verbose = verbose
+        self.show('Resource manager created.')
+
+    def show(self, line):
+        """
+        Prints the action if verbose
+        """
+        if self.verbose:
+            print(line)
+
+    def setTiming(self, visaName, timing):
+        """
+        Set timing model of a device, used by devices created afterwards
+        Input:      visaName - visa name of the device
+                    timing - Timing class instance
+        Returns:    none
+        """
+        self.timings[visaName] = timing
+
+    def setModel(self, visaName, model):
+        """
+        Set emulator class of a device whose VISA name doesn't tell
+        the model, like 'ASRL10'
+        Input:      visaName - visa name of the device
+                    model - emulator class, e.g. HmpSim
+        Returns:    none
+        """
+        self.models[visaName] = model
             
-    def get_instrument(self, visaName):
+    def get_instrument(self, visaName, **kwargs):
         """
         Creates device class instance, adds it to the dictionary.
-        Device type could be defined here by input() if device simulation
-        is required. Individual device classes can be subclassed then using
-        the Device class as a base. They can overload generic responses of
-        the base class with something more sophisticated.
+        Emulator of the instrument model is selected by setModel() or by
+        a model number in the VISA name, generic Device returning fixed
+        strings otherwise.
         Input:      visa name
+                    kwargs - VISA attributes like timeout, ignored
         Returns:    device class
         """
-        dev = Device(self, visaName)    #creaste device instance
+        model = self.models.get(visaName)
+        if model == None:
+            model = Device
+            for (key, cls) in models:
+                if key in visaName.upper():
+                    model = cls
+                    break
+        dev = model(self, visaName)     #creaste device instance
         self.devices[visaName] = dev    #add to dictionary
-        print(visaName + ' instrument created.')
+        self.show(visaName + ' instrument created.')
         return dev
     
     def close_instrument(self, visaName):
@@ -44,14 +148,14 @@ class ResourceManager:
         Returns:    none
         """
         self.devices.pop(visaName)          #remove dictionary item
-        print(visaName + ' instrument closed.')
+        self.show(visaName + ' instrument closed.')
         
     def close(self):
         """
         rm.close()  kills all issued devices
         """
         self.devices = {}    #garbage collector should delete device instances
-        print('Resource manager closed.')
+        self.show('Resource manager closed.')
 
 class Device:
     """
@@ -67,6 +171,9 @@ class Device:
         """
         self.visaName = visaName
         self.rm = rm
+        self.timing = rm.timings.get(visaName, rm.timing)
+        self.nplc = 1.          #integration time of readings
+        self.busyUntil = 0.     #time the device finishes relays or reset
         
     def close(self):
         """
@@ -74,19 +181,49 @@ class Device:
         """
         self.rm.close_instrument(self.visaName)
         
+    def transfer(self, message):
+        """
+        Spends simulated time of a message transfer, waits until the
+        device finishes relay switching or reset first
+        Input:  message - string transferred
+        """
+        clk = self.rm.clock
+        clk.sleep(self.busyUntil - clk.time())
+        clk.sleep(self.timing.messageTime(message))
+
+    def process(self, cmd):
+        """
+        Spends simulated time of command execution: reset, relay
+        switching, integration of readings. Keeps track of NPLC.
+        Input:  cmd - command string received
+        """
+        clk = self.rm.clock
+        for match in nplcCmd.finditer(cmd):
+            self.nplc = float(match.group(1) or match.group(2))
+        if '*RST' in cmd.upper():
+            self.nplc = 1.
+            self.busyUntil = clk.time() + self.timing.rstTime
+        if relayCmd.search(cmd):
+            self.busyUntil = clk.time() + self.timing.relayTime
+        for match in readCmd.finditer(cmd):
+            clk.sleep(self.timing.integrationTime(self.nplc))
+
     def write(self, cmd):
         """
         Processes command strings sent to device via VISA interface.
         Only prints the received command now for debugging.
         """
-        print(self.visaName + ': written "' + cmd + '"')
+        self.transfer(cmd)
+        self.process(cmd)
+        self.rm.show(self.visaName + ': written "' + cmd + '"')
         
     def read(self):
         """
         Emulates reading from a device via VISA interface.
         Only returns some string now
         """
-        print(self.visaName + ': read "+1.2E3"')
+        self.transfer('+1.2E3')
+        self.rm.show(self.visaName + ': read "+1.2E3"')
         return '+1.2E3'
     
     def ask(self, cmd):
@@ -96,12 +233,1003 @@ class Device:
         Only prints the received command now for debugging and
         returns some string
         """
-        print(self.visaName + ': asked "' + cmd + '", returned "+2.34"')
+        self.transfer(cmd)
+        self.process(cmd)
+        self.transfer('+2.34')
+        self.rm.show(self.visaName + ': asked "' + cmd + '", returned "+2.34"')
         return '+2.34'
     
-# Self test
+# Emulators of individual instruments
+# ===================================
+
+unitPattern = re.compile(r'\s*([^\s(]+)\s*(.*)', re.DOTALL)
+overload = 9.9e37       #reading returned if out of range
+
+def header(text):
+    """
+    Normalizes SCPI header: upper case, optional leading SENS or SOUR
+    node dropped, nodes shortened to 4 characters, '?' kept
+    Input:  text - header as received
+    Returns: normalized header
+    """
+    query = text.endswith('?')
+    nodes = text.upper().rstrip('?').lstrip(':').split(':')
+    nodes = [node[:4] for node in nodes]
+    if len(nodes) > 1 and nodes[0] in ('SENS', 'SOUR'):
+        nodes = nodes[1:]
+    head = ':'.join(nodes)
+    if query:
+        head += '?'
+    return head
+
+def channels(params):
+    """
+    Separates channel list '(@101,103:105)' from parameters
+    Input:  params - parameter string
+    Returns: (list of channel numbers, parameters without channel list)
+    """
+    start = params.find('(@')
+    if start == -1:
+        return [], params.strip()
+    end = params.find(')', start)
+    chans = []
+    for item in params[start + 2:end].split(','):
+        item = item.strip()
+        if item == '':
+            continue
+        if ':' in item:
+            (fromCh, toCh) = item.split(':')
+            chans.extend(range(int(fromCh), int(toCh) + 1))
+        else:
+            chans.append(int(item))
+    rest = (params[:start] + params[end + 1:]).strip().strip(',').strip()
+    return chans, rest
+
+def number(param, default = 0.):
+    """
+    Converts SCPI numeric parameter to float
+    Input:  param - parameter string, MIN, MAX, DEF give default
+    Returns: float
+    """
+    param = param.strip().strip(',').strip()
+    try:
+        return float(param)
+    except ValueError:
+        return default
+
+def block(data):
+    """
+    Wraps data to IEEE-488.2 definite length block
+    Input:  data - string
+    Returns: '#' + number of length digits + length + data
+    """
+    length = str(len(data))
+    return '#' + str(len(length)) + length + data
+
+def autoRange(steps, value):
+    """
+    Range autorange settles on - the lowest one with 20% overrange
+    Input:  steps - ranges available, ascending
+            value - measured value
+    Returns: range
+    """
+    for step in steps:
+        if abs(value) <= step * 1.2:
+            return step
+    return steps[-1]
+
+class ScpiDevice(Device):
+    """
+    Base of SCPI instrument emulators. Splits messages to commands,
+    keeps output and error queues. Subclasses process the commands
+    in command() and call ScpiDevice.command() for unknown ones.
+    """
+    idn = 'Simulated,SCPI device,0,1.0'
+    memorySlots = ()            #*SAV/*RCL locations of the model
+    notState = ('visaName', 'rm', 'timing', 'busyUntil', 'output', 'errors',
+                'signals', 'defaultSignal', 'loads', 'memory')
+
+    def __init__(self, rm, visaName):
+        Device.__init__(self, rm, visaName)
+        self.output = []        #responses waiting for read()
+        self.errors = []        #SCPI error queue
+        self.signals = {}       #{channel : simulated input value}
+        self.defaultSignal = 1.
+        self.memory = {}        #{location : state stored by *SAV}
+        self.reset()
+
+    def saveState(self, params):
+        """
+        *SAV - stores copy of emulated state
+        """
+        location = int(number(params, -1))
+        if location not in self.memorySlots:
+            self.errors.append('-222,"Data out of range"')
+            return
+        self.memory[location] = copy.deepcopy(dict(
+            [(key, value) for (key, value) in self.__dict__.items()
+             if key not in self.notState]))
+
+    def recallState(self, params):
+        """
+        *RCL - restores state stored by *SAV
+        """
+        location = int(number(params, -1))
+        if location not in self.memory:
+            self.errors.append('-222,"Data out of range"')
+            return
+        self.__dict__.update(copy.deepcopy(self.memory[location]))
+
+    def reset(self):
+        """
+        Brings the emulated state to power-on defaults, overloaded
+        """
+        pass
+
+    def setSignal(self, channel, value):
+        """
+        Sets simulated value measured on a channel
+        Input:  channel - channel number, 0 for single input meters
+                value - float in SI
+        """
+        self.signals[channel] = value
+
+    def execute(self, message):
+        """
+        Processes all commands of a message separated by ';'
+        Input:  message - string received
+        Returns: list of responses of queries
+        """
+        replies = []
+        for unit in message.split(';'):
+            match = unitPattern.match(unit)
+            if match == None:
+                continue
+            reply = self.command(header(match.group(1)),
+                                 match.group(2).strip())
+            if reply != None:
+                replies.append(reply)
+        return replies
+
+    def command(self, head, params):
+        """
+        Processes common commands, unknown ones go to the error queue
+        Input:  head - normalized header
+                params - parameter string
+        Returns: response string of a query, None otherwise
+        """
+        if head == '*RST':
+            self.reset()
+        elif head == '*CLS':
+            self.errors = []
+        elif head == '*IDN?':
+            return self.idn
+        elif head == '*OPC?':
+            return '1'
+        elif head == '*OPC' or head == '*WAI':
+            pass
+        elif head == '*SAV':
+            self.saveState(params)
+        elif head == '*RCL':
+            self.recallState(params)
+        elif head == 'SYST:ERR?':
+            if len(self.errors) == 0:
+                return '+0,"No error"'
+            return self.errors.pop(0)
+        else:
+            self.errors.append('-113,"Undefined header;' + head + '"')
+        return None
+
+    def write(self, cmd):
+        """
+        Processes command strings sent to device via VISA interface,
+        responses of queries are queued for read()
+        """
+        Device.write(self, cmd)
+        replies = self.execute(cmd.strip())
+        if len(replies) != 0:
+            self.output.append(';'.join(replies))
+
+    def read(self):
+        """
+        Returns the oldest queued response
+        """
+        if len(self.output) == 0:
+            self.rm.show(self.visaName + ': read timeout !')
+            raise IOError(self.visaName + ': read timeout, no response !')
+        reply = self.output.pop(0)
+        self.transfer(reply)
+        self.rm.show(self.visaName + ': read "' + reply + '"')
+        return reply
+
+    def ask(self, cmd):
+        """
+        Sends a query and returns its response
+        """
+        self.write(cmd)
+        return self.read()
+
+class DmmSim(ScpiDevice):
+    """
+    Common part of Agilent DMM emulators: function configuration,
+    triggering and reading memory (DATA:POIN?, R?)
+    """
+    rangeSteps = {'CURR:DC' : (.01, .1, 1.),
+                  'CURR:AC' : (.01, .1, 1.),
+                  'FRES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+                  'RES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+                  'VOLT:DC' : (.1, 1., 10., 100., 300.),
+                  'VOLT:AC' : (.1, 1., 10., 100., 300.)}
+
+    def reset(self):
+        self.config = {}        #{channel : [function, range, nplc]}
+        self.scanList = []
+        self.closed = set()
+        self.trigSource = 'IMM'
+        self.trigCount = 1
+        self.sampCount = 1
+        self.sampSource = 'IMM'
+        self.sampTime = 0.
+        self.initiated = False
+        self.trigTime = None    #time the sampling was triggered
+        self.total = 0          #samples to be taken after trigger
+        self.taken = 0          #samples removed from memory
+
+    def channel(self):
+        """
+        Returns: channel measured now
+        """
+        if len(self.closed) != 0:
+            return min(self.closed)
+        if len(self.scanList) != 0:
+            return self.scanList[0]
+        return 0
+
+    def channelConfig(self, channel):
+        """
+        Returns: [function, range, nplc] of the channel, created if needed
+        """
+        if channel not in self.config:
+            self.config[channel] = ['VOLT:DC', 'AUTO', 1.]
+        return self.config[channel]
+
+    def reading(self):
+        """
+        Returns: float reading of the actual channel, overload if fixed
+                 range exceeded
+        """
+        channel = self.channel()
+        value = self.signals.get(channel, self.defaultSignal)
+        (func, rng, nplc) = self.channelConfig(channel)
+        if rng != 'AUTO' and abs(value) > rng * 1.2:
+            return overload
+        return value
+
+    def range(self, channel):
+        """
+        Returns: range used by the channel, autorange resolved
+        """
+        (func, rng, nplc) = self.channelConfig(channel)
+        if rng != 'AUTO':
+            return rng
+        steps = self.rangeSteps.get(func, (1.,))
+        return autoRange(steps, self.signals.get(channel, self.defaultSignal))
+
+    def trigger(self):
+        """
+        Starts taking samples into reading memory
+        """
+        self.trigTime = self.rm.clock.time()
+        self.total = self.sampCount * self.trigCount
+        self.taken = 0
+        self.initiated = False
+
+    def points(self):
+        """
+        Returns: number of readings in memory at actual simulated time
+        """
+        if self.trigTime == None:
+            return 0
+        integration = self.timing.integrationTime(self.nplc)
+        period = integration
+        if self.sampSource == 'TIM':
+            period = max(period, self.sampTime)
+        elapsed = self.rm.clock.time() - self.trigTime - integration
+        if elapsed < 0:
+            return 0
+        done = int(elapsed / period + 1e-9) + 1
+        return min(done, self.total) - self.taken
+
+    def command(self, head, params):
+        (chans, params) = channels(params)
+        if head.startswith('CONF:'):
+            func = head[5:]
+            if func == 'DIG:BYTE':
+                func = 'DIG'
+            rng = params.split(',')[0].strip().upper()
+            if rng in ('AUTO', 'DEF', ''):
+                rng = 'AUTO'
+            else:
+                rng = number(rng)
+            for ch in chans:
+                self.config[ch] = [func, rng, 1.]
+            self.scanList = chans
+        elif head.endswith(':NPLC'):
+            if len(chans) == 0:
+                chans = self.scanList
+            for ch in chans:
+                self.channelConfig(ch)[2] = number(params, 1.)
+        elif head.endswith(':RANG?'):
+            if len(chans) == 0:
+                chans = [self.channel()]
+            return '%+.8E' % self.range(chans[0])
+        elif head.endswith(':BAND'):
+            pass
+        elif head == 'ROUT:CLOS':
+            self.closed.update(chans)
+        elif head == 'ROUT:OPEN':
+            self.closed.difference_update(chans)
+        elif head == 'ROUT:OPEN:ALL':
+            self.closed = set()
+        elif head == 'ROUT:CLOS?':
+            closed = [('1' if ch in self.closed else '0') for ch in chans]
+            return ','.join(closed)
+        elif head == 'TRIG:SOUR':
+            self.trigSource = params.upper()
+        elif head == 'TRIG:COUN':
+            self.trigCount = int(number(params, 1))
+        elif head == 'SAMP:COUN':
+            self.sampCount = int(number(params, 1))
+        elif head == 'SAMP:SOUR':
+            self.sampSource = params.upper()[:3]
+        elif head == 'SAMP:TIM':
+            self.sampTime = number(params)
+        elif head == 'INIT:IMM' or head == 'INIT':
+            self.initiated = True
+            if self.trigSource[:3] == 'IMM':
+                self.trigger()
+        elif head == '*TRG':
+            if self.initiated and self.trigSource == 'BUS':
+                self.trigger()
+        elif head == 'DATA:POIN?':
+            return '%d' % self.points()
+        elif head == 'R?':
+            count = min(int(number(params, 1e9)), self.points())
+            self.taken += count
+            data = ','.join(['%+.8E' % self.reading()] * count)
+            return block(data)
+        elif head == 'READ?' or head == 'MEAS?' or head == 'FETC?':
+            return '%+.8E' % self.reading()
+        else:
+            return ScpiDevice.command(self, head, params)
+        return None
+
+class Daq34972Sim(DmmSim):
+    """
+    Agilent 34972A data acquisition unit with multiplexer cards
+    """
+    idn = 'Agilent Technologies,34972A,MY00000000,1.17-1.12-02-02'
+    memorySlots = (1, 2, 3, 4, 5)
+
+class Dvm34411Sim(DmmSim):
+    """
+    Agilent 34411A DMM, single input channel 0
+    """
+    idn = 'Agilent Technologies,34411A,MY00000000,2.35-2.35-0.09-46-09'
+    memorySlots = (1, 2, 3, 4)
+    rangeSteps = {'CAP' : (1e-9, 1e-8, 1e-7, 1e-6, 1e-5),
+                  'CURR:DC' : (1e-4, 1e-3, .01, .1, 1., 3.),
+                  'CURR:AC' : (1e-4, 1e-3, .01, .1, 1., 3.),
+                  'FRES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+                  'RES' : (100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9),
+                  'VOLT:DC' : (.1, 1., 10., 100., 1000.),
+                  'VOLT:AC' : (.1, 1., 10., 100., 750.)}
+
+    def channel(self):
+        return 0
+
+    def command(self, head, params):
+        config = self.channelConfig(0)
+        if head == 'FUNC:ON' or head == 'FUNC':
+            config[0] = header(params.strip('"'))
+        elif head == 'FUNC?' or head == 'FUNC:ON?':
+            return '"' + config[0] + '"'
+        elif head.endswith(':RANG') or head.endswith(':RANG:AUTO'):
+            if head.endswith(':AUTO') or params.upper().endswith('AUTO'):
+                config[1] = 'AUTO'
+            else:
+                config[1] = number(params, 'AUTO')
+        elif head.endswith(':NPLC'):
+            config[2] = number(params, 1.)
+        elif head.endswith(':ZERO:AUTO') or head == 'FORM:DATA':
+            pass
+        else:
+            return DmmSim.command(self, head, params)
+        return None
+
+class Daq3706Sim(Device):
+    """
+    Keithley 3706A switch mainframe with DMM controlled by TSP statements
+    """
+    idn = 'Keithley Instruments Inc.,Model 3706A,00000000,01.56a'
+    cardIdn = {'3720' : '3720,Dual 1x30 Multiplexer,01.00g,00000000',
+               '3721' : '3721,Dual 1x20 Multiplexer,01.00g,00000000',
+               '3722' : '3722,Dual 1x48 High Density Multiplexer,01.00g,00000000',
+               '3723' : '3723,Dual 1x30 High Speed Multiplexer,01.00g,00000000'}
+    statement = re.compile(r'\s*(?:(\*\w+\??)'     #common command
+                           r'|print\((.*?)\)(?=\s|$)'
+                           r'|([\w.\[\]]+)\s*=\s*("[^"]*"|\S+)'
+                           r'|([\w.\[\]]+)\((.*?)\)(?=\s|$)'
+                           r'|(\S+))', re.DOTALL)
+    rangeSteps = {'dcvolts' : (.1, 1., 10., 100., 300.),
+                  'acvolts' : (.1, 1., 10., 100., 300.),
+                  'dccurrent' : (1e-5, 1e-4, 1e-3, .01, .1, 1., 3.),
+                  'accurrent' : (1e-3, .01, .1, 1., 3.),
+                  'twowireohms' : (1., 10., 100., 1e3, 1e4, 1e5, 1e6, 1e7,
+                                   1e8)}
+
+    def __init__(self, rm, visaName, slots = ('3722',)):
+        """
+        Input:  slots - card types in slots from slot 1, others empty
+        """
+        Device.__init__(self, rm, visaName)
+        self.slots = list(slots) + ['Empty Slot'] * (6 - len(slots))
+        self.output = []
+        self.signals = {}
+        self.defaultSignal = 1.
+        self.reset()
+
+    def reset(self):
+        self.closed = set()
+        self.dmm = {'func' : 'dcvolts', 'range' : 'auto', 'nplc' : 1.,
+                    'measurecount' : 1}
+
+    def setSignal(self, channel, value):
+        """
+        Sets simulated value measured on a channel
+        Input:  channel - channel number like 1001
+                value - float in SI
+        """
+        self.signals[channel] = value
+
+    def reading(self):
+        """
+        Returns: reading of the lowest closed channel, overload if fixed
+                 range exceeded
+        """
+        channel = 0
+        if len(self.closed) != 0:
+            channel = min(self.closed)
+        value = self.signals.get(channel, self.defaultSignal)
+        rng = self.dmm['range']
+        if rng != 'auto' and abs(value) > rng * 1.2:
+            return overload
+        return value
+
+    def range(self):
+        """
+        Returns: range used by DMM, autorange resolved
+        """
+        rng = self.dmm['range']
+        if rng != 'auto':
+            return rng
+        channel = 0
+        if len(self.closed) != 0:
+            channel = min(self.closed)
+        steps = self.rangeSteps.get(self.dmm['func'], (1.,))
+        return autoRange(steps, self.signals.get(channel, self.defaultSignal))
+
+    def evaluate(self, expr):
+        """
+        Evaluates expression of a print() statement
+        Input:  expr - TSP expression
+        Returns: printed string
+        """
+        expr = expr.strip()
+        match = re.match(r'slot\[(\d)\]\.idn$', expr)
+        if match:
+            slotType = self.slots[int(match.group(1)) - 1]
+            return self.cardIdn.get(slotType, slotType)
+        if expr.startswith('dmm.measure('):
+            return '%.9e' % self.reading()
+        if expr == 'dmm.range':
+            return '%.9e' % self.range()
+        if expr.startswith('dmm.'):
+            value = self.dmm.get(expr[4:])
+            if value != None:
+                return str(value)
+        if expr == 'errorqueue.count':
+            return '0'
+        if expr.startswith('channel.getclose('):
+            if len(self.closed) == 0:
+                return 'nil'
+            return ';'.join([str(ch) for ch in sorted(self.closed)])
+        return 'nil'
+
+    def assign(self, target, value):
+        """
+        Executes assignment statement
+        """
+        if not target.startswith('dmm.'):
+            return              #script variables and beeper ignored
+        value = value.strip('"')
+        if target == 'dmm.func':
+            self.dmm['func'] = value
+        elif value == 'auto' or value == 'dmm.AUTO':
+            self.dmm[target[4:]] = 'auto'
+        else:
+            self.dmm[target[4:]] = number(value, value)
+
+    def call(self, function, args):
+        """
+        Executes function call statement
+        """
+        args = args.strip().strip('"')
+        if function == 'channel.close':
+            for ch in args.split(','):
+                self.closed.add(int(ch))
+        elif function == 'channel.open':
+            if args == 'allslots':
+                self.closed = set()
+            else:
+                for ch in args.split(','):
+                    self.closed.discard(int(ch))
+        elif function == 'reset':
+            self.reset()
+
+    def execute(self, message):
+        """
+        Processes all TSP statements of a message
+        Input:  message - string received
+        Returns: list of printed lines
+        """
+        replies = []
+        pos = 0
+        message = message.strip()
+        while pos < len(message):
+            match = self.statement.match(message, pos)
+            if match == None or match.end() == pos:
+                break
+            pos = match.end()
+            (common, printed, target, value, function, args,
+             unknown) = match.groups()
+            if common != None:
+                if common.upper() == '*RST':
+                    self.reset()
+                elif common.upper() == '*IDN?':
+                    replies.append(self.idn)
+                elif common.upper() == '*OPC?':
+                    replies.append('1')
+            elif printed != None:
+                replies.append(self.evaluate(printed))
+            elif target != None:
+                self.assign(target, value)
+            elif function != None:
+                self.call(function, args)
+        return replies
+
+    def write(self, cmd):
+        Device.write(self, cmd)
+        self.output.extend(self.execute(cmd))
+
+    def read(self):
+        if len(self.output) == 0:
+            self.rm.show(self.visaName + ': read timeout !')
+            raise IOError(self.visaName + ': read timeout, no response !')
+        reply = self.output.pop(0)
+        self.transfer(reply)
+        self.rm.show(self.visaName + ': read "' + reply + '"')
+        return reply
+
+    def ask(self, cmd):
+        self.write(cmd)
+        return self.read()
+
+class SupplySim(ScpiDevice):
+    """
+    Common part of power supply emulators: channel setpoints and
+    output values on a resistive load
+    """
+    nrOfChannels = 3
+
+    def reset(self):
+        self.chan = {}
+        for i in range(1, self.nrOfChannels + 1):
+            self.chan[i] = {'volt' : 0., 'curr' : .1, 'out' : False,
+                            'mode' : 'VOLT', 'vlim' : 20., 'ilim' : .1}
+        if not hasattr(self, 'loads'):
+            self.loads = {}     #{channel : load resistance}, kept on *RST
+
+    def setLoad(self, channel, ohms):
+        """
+        Sets simulated load resistance of a channel, default 1 kOhm
+        """
+        self.loads[channel] = ohms
+
+    def outputs(self, channel):
+        """
+        Returns: (voltage, current) on the load of the channel
+        """
+        st = self.chan[channel]
+        if not st['out'] or not self.enabled():
+            return (0., 0.)
+        load = self.loads.get(channel, 1e3)
+        if st['mode'] == 'VOLT':
+            volt = st['volt']
+            curr = volt / load
+            if abs(curr) > st['ilim']:          #current limit
+                curr = st['ilim'] * (1 if curr > 0 else -1)
+                volt = curr * load
+        else:
+            curr = st['curr']
+            volt = curr * load
+            if abs(volt) > st['vlim']:          #voltage limit
+                volt = st['vlim'] * (1 if volt > 0 else -1)
+                curr = volt / load
+        return (volt, curr)
+
+    def enabled(self):
+        """
+        Returns: True if outputs are not disabled globally
+        """
+        return True
+
+class Src2722Sim(SupplySim):
+    """
+    Agilent U2722A source measure unit, channels addressed by (@n)
+    """
+    idn = 'Agilent Technologies,U2722A,MY00000000,1.07'
+    
+    def command(self, head, params):
+        (chans, params) = channels(params)
+        if len(chans) == 0:
+            chans = [1]
+        if chans[0] not in self.chan:
+            self.errors.append('-222,"Data out of range"')
+            return None
+        st = self.chan[chans[0]]
+        if head == 'VOLT':
+            st['volt'] = number(params)
+            st['mode'] = 'VOLT'
+        elif head == 'CURR':
+            st['curr'] = number(params)
+            st['mode'] = 'CURR'
+        elif head == 'CURR:LIM':
+            st['ilim'] = number(params)
+        elif head == 'VOLT:LIM':
+            st['vlim'] = number(params)
+        elif head == 'VOLT:RANG' or head == 'CURR:RANG':
+            st[head] = params
+        elif head == 'OUTP':
+            st['out'] = params.upper() in ('1', 'ON')
+        elif head == 'OUTP?':
+            return '1' if st['out'] else '0'
+        elif head == 'VOLT?':
+            return '%+.6E' % st['volt']
+        elif head == 'CURR?':
+            return '%+.6E' % st['curr']
+        elif head == 'MEAS:VOLT?':
+            return '%+.6E' % self.outputs(chans[0])[0]
+        elif head == 'MEAS:CURR?':
+            return '%+.6E' % self.outputs(chans[0])[1]
+        else:
+            return ScpiDevice.command(self, head, params)
+        return None
+
+class HmpSim(SupplySim):
+    """
+    Hameg HMP4030/HMP2030 power supply, channel selected by INST OUTn
+    """
+    idn = 'HAMEG,HMP4030,000000000,HW50020001/SW2.30'
+    memorySlots = (1, 2, 3, 4, 5, 6, 7, 8, 9)
+
+    def reset(self):
+        SupplySim.reset(self)
+        self.selected = 1
+        self.general = False
+        for st in self.chan.values():
+            st['ilim'] = st['curr']
+
+    def enabled(self):
+        return self.general
+
+    def command(self, head, params):
+        st = self.chan[self.selected]
+        if head == 'INST' or head == 'INST:NSEL':
+            match = re.search(r'(\d+)', params)
+            if match and int(match.group(1)) in self.chan:
+                self.selected = int(match.group(1))
+            else:
+                self.errors.append('-222,"Data out of range"')
+        elif head == 'INST?' or head == 'INST:NSEL?':
+            return 'OUTP%d' % self.selected
+        elif head == 'VOLT':
+            st['volt'] = number(params)
+        elif head == 'CURR':
+            st['curr'] = number(params)
+            st['ilim'] = st['curr']     #current setpoint is the limit
+        elif head == 'VOLT:PROT':
+            st['vlim'] = number(params)
+        elif head == 'OUTP:SEL':
+            st['out'] = params.upper() in ('1', 'ON')
+        elif head == 'OUTP:SEL?':
+            return '1' if st['out'] else '0'
+        elif head == 'OUTP:GEN' or head == 'OUTP':
+            self.general = params.upper() in ('1', 'ON')
+        elif head == 'OUTP:GEN?' or head == 'OUTP?':
+            return '1' if self.general else '0'
+        elif head == 'VOLT?':
+            return '%.3f' % st['volt']
+        elif head == 'CURR?':
+            return '%.4f' % st['curr']
+        elif head == 'MEAS:VOLT?':
+            return '%.3f' % self.outputs(self.selected)[0]
+        elif head == 'MEAS:CURR?':
+            return '%.4f' % self.outputs(self.selected)[1]
+        else:
+            return ScpiDevice.command(self, head, params)
+        return None
+
+class Pl303Sim(SupplySim):
+    """
+    TTI PL303 power supply with its own command set like 'V1 3.0'
+    """
+    idn = 'THURLBY THANDAR,PL303-P,000000,3.02-1.00'
+    plCommand = re.compile(r'(V|I|OVP|OCP|OP)(\d)(O?\?)?\s*(\S*)$')
+
+    def execute(self, message):
+        replies = []
+        for line in message.replace(';', '\n').split('\n'):
+            line = line.strip().upper()
+            if line == '':
+                continue
+            match = self.plCommand.match(line)
+            if match == None:
+                reply = ScpiDevice.command(self, header(line), '')
+                if reply != None:
+                    replies.append(reply)
+                continue
+            (cmd, channel, query, param) = match.groups()
+            channel = int(channel)
+            if channel not in self.chan:
+                continue
+            st = self.chan[channel]
+            (volt, curr) = self.outputs(channel)
+            if query == 'O?' and cmd == 'V':
+                replies.append('%.3fV' % volt)
+            elif query == 'O?' and cmd == 'I':
+                replies.append('%.3fA' % curr)
+            elif query == '?' and cmd == 'V':
+                replies.append('V%d %.3f' % (channel, st['volt']))
+            elif query == '?' and cmd == 'I':
+                replies.append('I%d %.3f' % (channel, st['ilim']))
+            elif query == '?' and cmd == 'OP':
+                replies.append('1' if st['out'] else '0')
+            elif query != None:
+                continue
+            elif cmd == 'V':
+                st['volt'] = number(param)
+            elif cmd == 'I':
+                st['ilim'] = number(param)
+            elif cmd == 'OVP':
+                st['vlim'] = number(param)
+            elif cmd == 'OCP':
+                st['ocp'] = number(param)
+            elif cmd == 'OP':
+                st['out'] = param == '1'
+        return replies
+
+class Gen33220Sim(ScpiDevice):
+    """
+    Agilent 33220A function generator
+    """
+    idn = 'Agilent Technologies,33220A,MY00000000,2.02-2.02-22-2'
+    memorySlots = (1, 2, 3, 4)
+
+    def reset(self):
+        self.function = 'SIN'
+        self.frequency = 1e3
+        self.amplitude = .1
+        self.offset = 0.
+        self.enabled = False
+
+    def command(self, head, params):
+        params = params.strip(', ')
+        if head == 'FUNC':
+            self.function = params.upper()[:4]
+        elif head == 'FUNC?':
+            return self.function
+        elif head == 'FREQ':
+            self.frequency = number(params, self.frequency)
+        elif head == 'FREQ?':
+            return '%+.14E' % self.frequency
+        elif head == 'VOLT':
+            self.amplitude = number(params, self.amplitude)
+        elif head == 'VOLT?':
+            return '%+.14E' % self.amplitude
+        elif head == 'VOLT:OFFS':
+            self.offset = number(params, self.offset)
+        elif head == 'VOLT:OFFS?':
+            return '%+.14E' % self.offset
+        elif head == 'OUTP':
+            self.enabled = params.upper() in ('1', 'ON')
+        elif head == 'OUTP?':
+            return '1' if self.enabled else '0'
+        else:
+            return ScpiDevice.command(self, head, params)
+        return None
+
+# emulators selected by a part of the VISA name
+models = (('34972', Daq34972Sim), ('34411', Dvm34411Sim),
+          ('3706', Daq3706Sim), ('2722', Src2722Sim), ('HMP', HmpSim),
+          ('PL303', Pl303Sim), ('33220', Gen33220Sim))
+
+class SocketServer:
+    """
+    Emulators served over TCP like LAN instruments on raw SCPI ports.
+    Each port has one device shared by all its clients, lines received
+    are written to the device and responses sent back to the client
+    which sent the query. Runs its event loop in a background thread
+    after start() or in the calling thread by serveForever().
+    """
+    def __init__(self, instruments, host = '127.0.0.1', latency = 0.,
+                 jitter = 0., rm = None):
+        """
+        Input:  instruments - {port : visa name}, port 0 picks a free one
+                host - address listened on
+                latency - network delay of each response in s
+                jitter - random delay added to latency, 0..jitter s
+                rm - ResourceManager creating the devices, default
+                     new one not printing actions
+        """
+        if rm == None:
+            rm = ResourceManager(verbose = False)
+        self.rm = rm
+        self.instruments = dict(instruments)
+        self.host = host
+        self.latency = latency
+        self.jitter = jitter
+        self.ports = {}         #{visa name : port listened on}
+        self.loop = None
+        self.servers = []
+        self.thread = None
+        self.ready = threading.Event()
+
+    def delay(self):
+        """
+        Returns: network delay of one response in s
+        """
+        return self.latency + random.uniform(0., self.jitter)
+
+    def respond(self, dev, line):
+        """
+        Writes a received line to the device
+        Input:  dev - emulator instance
+                line - message without termination
+        Returns: list of responses
+        """
+        if not hasattr(dev, 'output'):      #generic Device
+            if '?' in line:
+                return [dev.ask(line)]
+            dev.write(line)
+            return []
+        dev.write(line)
+        replies = dev.output
+        dev.output = []
+        return replies
+
+    async def handle(self, dev, reader, writer):
+        """
+        Serves one client connection
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('latin-1').strip()
+                if line == '':
+                    continue
+                try:
+                    replies = self.respond(dev, line)
+                except Exception as exc:
+                    print(dev.visaName + ': "' + line + '" failed: ' +
+                          str(exc) + ' !')
+                    continue
+                if replies:
+                    delay = self.delay()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    writer.write(''.join([reply + '\n' for reply in
+                                          replies]).encode('latin-1'))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def startServers(self):
+        """
+        Creates devices and listens on their ports
+        """
+        self.loop = asyncio.get_running_loop()
+        for (port, visaName) in self.instruments.items():
+            dev = self.rm.get_instrument(visaName)
+            def client(reader, writer, dev = dev):
+                return self.handle(dev, reader, writer)
+            server = await asyncio.start_server(client, self.host, port)
+            self.servers.append(server)
+            self.ports[visaName] = server.sockets[0].getsockname()[1]
+        self.ready.set()
+
+    async def main(self):
+        try:
+            await self.startServers()
+        finally:
+            self.ready.set()
+        await asyncio.gather(*[server.serve_forever()
+                               for server in self.servers])
+
+    def serveForever(self):
+        """
+        Serves in the calling thread until interrupted
+        """
+        try:
+            asyncio.run(self.main())
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        """
+        Serves in a background thread
+        Returns: {visa name : port}
+        """
+        self.thread = threading.Thread(target = self.serveForever,
+                                       daemon = True)
+        self.thread.start()
+        self.ready.wait()
+        if len(self.ports) != len(self.instruments):
+            print('SocketServer.start() listening failed !')
+            raise IOError('SocketServer.start() listening failed')
+        return self.ports
+
+    def stop(self):
+        """
+        Stops serving, devices stay in rm.devices for inspection
+        """
+        if self.loop == None:
+            return
+        for server in self.servers:
+            self.loop.call_soon_threadsafe(server.close)
+        if self.thread != None:
+            self.thread.join(5.)
+        self.loop = None
+        self.servers = []
+
+def serve(instruments, host = '127.0.0.1', latency = 0., jitter = 0.):
+    """
+    Serves emulators until interrupted
+    Input:  instruments - {port : visa name}
+            host, latency, jitter - see SocketServer
+    """
+    server = SocketServer(instruments, host, latency, jitter)
+    print('Serving ' + ', '.join(['%s on %d' % (name, port) for
+                                  (port, name) in instruments.items()]))
+    server.serveForever()
+
+# Self test, or serving emulators: python visasim.py 5025=34972A ...
 if __name__ == '__main__':
     print(copyr)
+    args = sys.argv[1:]
+    if args:
+        options = dict([arg[2:].split('=', 1) for arg in args
+                        if arg.startswith('--')])
+        serve(dict([(int(arg.split('=')[0]), arg.split('=', 1)[1])
+                    for arg in args if not arg.startswith('--')]),
+              options.get('host', '127.0.0.1'),
+              float(options.get('latency', 0.)),
+              float(options.get('jitter', 0.)))
+        sys.exit(0)
 
     rm = ResourceManager()              #create resource manager class
 
@@ -112,10 +1240,42 @@ if __name__ == '__main__':
         print(reslt)                        
         reslt = handle.ask('Query')         #ask for data
         print(reslt)
+        handle.write('*RST')                #reset keeps device busy
+        reslt = handle.ask('READ?')         #waits for reset, integrates
+        print('Simulated time %.4f s' % rm.clock.time())
         handle.close()                      #close device
+
+        daq = rm.get_instrument('34972A')   #emulated instrument
+        daq.setSignal(101, 4.98)
+        daq.write('CONF:VOLT:DC 10,(@101)')
+        daq.write('ROUT:CLOS (@101)')
+        print(daq.ask('READ?'))             #4.98
+        print(daq.ask('SYST:ERR?'))         #no error
+        daq.close()
     except:
         raise   #default exception handling
     finally:
         rm.close()                          #close resource manager
+
+    import time as systime
+    import scpisock, cdaq34972              #driver over TCP socket
+    server = SocketServer({0 : '34972A'}, latency = .0002, jitter = .0001)
+    port = server.start()['34972A']
+    server.rm.devices['34972A'].setSignal(102, 1.25)
+    sock = scpisock.ResourceManager()
+    dmm = cdaq34972.Daq34972(sock, 'TCPIP0::127.0.0.1::%d::SOCKET' % port)
+    other = sock.get_instrument('127.0.0.1:%d' % port)  #second client
+    dmm.open()
+    dmm.configScan('102', 'VOLT:DC', 10, 1)
+    startTime = systime.perf_counter()
+    reading = dmm.read()
+    idn = other.ask('*IDN?')
+    print('%s over TCP in %.1f ms, %s' % (reading, (systime.perf_counter() -
+                                          startTime) * 1e3, idn))
+    dmm.close()
+    sock.close()
+    server.stop()
+    if reading != 1.25 or not idn.startswith('Agilent'):
+        print('Done with error !')
+        sys.exit(2)
     print('OK')
-    